@@ -1,92 +1,233 @@
-import pandas as pd
 import numpy as np
-import ta
-from ta.trend import SMAIndicator, EMAIndicator, MACD, ADXIndicator
-from ta.momentum import RSIIndicator, StochasticOscillator
-from ta.volatility import BollingerBands, AverageTrueRange
-from datetime import datetime
+
+import kernels
+
+# Nota: `ta` (y pandas, que trae consigo) se importa dentro de cada productor,
+# en el primer análisis, para no demorar el arranque del bot.
+# Los indicadores con recurrencias o ventanas (EMA, RSI, estocástico, MACD,
+# ATR, ADX) usan los kernels de kernels.py, con los mismos valores que `ta`.
 
 class MarketAnalyzer:
+    # Columnas que usa determine_market_state
+    MARKET_STATE_FEATURES = ('EMA_20', 'EMA_50', 'ATR', 'ADX')
+
     def __init__(self):
         pass
 
-    def compute_indicators(self, df):
-        """Calcula todos los indicadores técnicos necesarios."""
-        if df.empty:
-            return df
+    def register_features(self, graph):
+        """Registra los indicadores como productores del FeatureGraph."""
+        graph.register('sma_200', ['SMA_200'], self.compute_sma, update_last=self.update_last_sma)
+        graph.register('ema', ['EMA_20', 'EMA_50'], self.compute_ema, update_last=self.update_last_ema)
+        graph.register('rsi', ['RSI'], self.compute_rsi)
+        graph.register('stochastic', ['Stoch_K', 'Stoch_D'], self.compute_stochastic,
+                       update_last=self.update_last_stochastic)
+        graph.register('macd', ['MACD', 'MACD_Signal', 'MACD_Hist', 'EMA_12', 'EMA_26'], self.compute_macd,
+                       update_last=self.update_last_macd)
+        graph.register('bollinger', ['BB_Upper', 'BB_Middle', 'BB_Lower'], self.compute_bollinger,
+                       update_last=self.update_last_bollinger)
+        graph.register('atr', ['ATR'], self.compute_atr, update_last=self.update_last_atr)
+        graph.register('adx', ['ADX'], self.compute_adx)
+
+    def compute_indicators(self, frame):
+        """Calcula todos los indicadores técnicos sobre el CandleFrame (sin grafo)."""
+        if frame.empty:
+            return frame
         
         # --- Tendencia ---
-        # SMA 200
-        sma_200 = SMAIndicator(close=df['Close'], window=200)
-        df['SMA_200'] = sma_200.sma_indicator()
-        
-        # EMA 20
-        ema_20 = EMAIndicator(close=df['Close'], window=20)
-        df['EMA_20'] = ema_20.ema_indicator()
-        
-        # EMA 50
-        ema_50 = EMAIndicator(close=df['Close'], window=50)
-        df['EMA_50'] = ema_50.ema_indicator()
+        self.compute_sma(frame)
+        self.compute_ema(frame)
         
         # --- Osciladores ---
-        # RSI 14
-        rsi = RSIIndicator(close=df['Close'], window=14)
-        df['RSI'] = rsi.rsi()
+        self.compute_rsi(frame)
+        self.compute_stochastic(frame)
+        self.compute_macd(frame)
         
-        # Estocástico (16, 3, 3) 
-        # Nota: talib.STOCH usa fastk=16, slowk=3, slowd=3
-        # ta.StochasticOscillator recibe window=14 (por defecto), smooth_window=3
-        stoch = StochasticOscillator(high=df['High'], low=df['Low'], close=df['Close'], 
-                                     window=16, smooth_window=3)
-        df['Stoch_K'] = stoch.stoch()
-        df['Stoch_D'] = stoch.stoch_signal() 
+        # --- Bandas de Bollinger ---
+        self.compute_bollinger(frame)
         
-        # MACD (12, 26, 9)
-        macd = MACD(close=df['Close'], window_slow=26, window_fast=12, window_sign=9)
-        df['MACD'] = macd.macd()
-        df['MACD_Signal'] = macd.macd_signal()
-        df['MACD_Hist'] = macd.macd_diff()
+        # --- Volatilidad / Fuerza ---
+        self.compute_atr(frame)
+        self.compute_adx(frame)
         
-        # --- Bandas de Bollinger (20, 2) ---
-        bb = BollingerBands(close=df['Close'], window=20, window_dev=2)
-        df['BB_Upper'] = bb.bollinger_hband()
-        df['BB_Middle'] = bb.bollinger_mavg()
-        df['BB_Lower'] = bb.bollinger_lband()
+        return frame
+
+    def compute_sma(self, frame):
+        from ta.trend import SMAIndicator
+        # SMA 200
+        sma_200 = SMAIndicator(close=frame.series('Close'), window=200)
+        frame.set('SMA_200', sma_200.sma_indicator())
+
+    def compute_ema(self, frame):
+        close = frame['Close']
         
-        # --- Volatilidad ---
-        # ATR 14
-        atr = AverageTrueRange(high=df['High'], low=df['Low'], close=df['Close'], window=14)
-        df['ATR'] = atr.average_true_range()
+        # EMA 20
+        frame.set('EMA_20', kernels.ema(close, 20))
         
-        return df
+        # EMA 50
+        frame.set('EMA_50', kernels.ema(close, 50))
 
-    def determine_market_state(self, df):
+    def compute_rsi(self, frame):
+        # RSI 14 (suavizado de Wilder, como ta.momentum.RSIIndicator)
+        diff = np.diff(frame['Close'], prepend=np.nan)
+        up = np.where(diff > 0, diff, 0.0)
+        down = np.where(diff < 0, -diff, 0.0)
+        ema_up = kernels.ewm(up, 1 / 14, 14)
+        ema_down = kernels.ewm(down, 1 / 14, 14)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(ema_down == 0, 100, 100 - (100 / (1 + ema_up / ema_down)))
+        frame.set('RSI', rsi)
+
+    def compute_stochastic(self, frame):
+        # Estocástico (16, 3, 3) 
+        # Nota: talib.STOCH usa fastk=16, slowk=3, slowd=3
+        # (ta.StochasticOscillator con window=16, smooth_window=3)
+        lowest = kernels.rolling_min(frame['Low'], 16)
+        highest = kernels.rolling_max(frame['High'], 16)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stoch_k = 100 * (frame['Close'] - lowest) / (highest - lowest)
+        frame.set('Stoch_K', stoch_k)
+        frame.set('Stoch_D', kernels.rolling_mean(stoch_k, 3))
+
+    def compute_macd(self, frame):
+        # MACD (12, 26, 9), mismo cálculo que ta.trend.MACD pero guardando las EMAs
+        # como estado para poder actualizar la vela en formación
+        close = frame['Close']
+        ema_12 = kernels.ema(close, 12)
+        ema_26 = kernels.ema(close, 26)
+        macd = ema_12 - ema_26
+        macd_signal = kernels.ema(macd, 9)
+        frame.set('EMA_12', ema_12)
+        frame.set('EMA_26', ema_26)
+        frame.set('MACD', macd)
+        frame.set('MACD_Signal', macd_signal)
+        frame.set('MACD_Hist', macd - macd_signal)
+
+    def compute_bollinger(self, frame):
+        from ta.volatility import BollingerBands
+        # Bandas de Bollinger (20, 2)
+        bb = BollingerBands(close=frame.series('Close'), window=20, window_dev=2)
+        frame.set('BB_Upper', bb.bollinger_hband())
+        frame.set('BB_Middle', bb.bollinger_mavg())
+        frame.set('BB_Lower', bb.bollinger_lband())
+
+    def compute_atr(self, frame):
+        # ATR 14 (promedio de Wilder del rango verdadero, como ta.volatility.AverageTrueRange)
+        true_range = kernels.true_range(frame['High'], frame['Low'], frame['Close'])
+        frame.set('ATR', kernels.wilder(true_range, 14))
+
+    def compute_adx(self, frame):
+        # ADX 14 (fuerza de tendencia, lo usa determine_market_state)
+        frame.set('ADX', kernels.adx(frame['High'], frame['Low'], frame['Close'], 14))
+
+    # --- Vela en formación ---
+    # Cada update_last_* recalcula solo la última fila a partir de los valores
+    # ya calculados de la fila anterior (sin recorrer el histórico cerrado).
+    # Devuelven False si no hay estado suficiente (warm-up) y se recalcula completo.
+
+    @staticmethod
+    def _ema_step(frame, column, value, window):
+        if len(frame) < 2:
+            return None
+        prev = frame[column][-2]
+        if np.isnan(prev):
+            return None
+        alpha = 2.0 / (window + 1)
+        return alpha * value + (1 - alpha) * prev
+
+    def update_last_sma(self, frame):
+        close = frame['Close']
+        if len(close) < 200:
+            return False
+        frame.set_last('SMA_200', close[-200:].mean())
+        return True
+
+    def update_last_ema(self, frame):
+        close = frame['Close'][-1]
+        ema_20 = self._ema_step(frame, 'EMA_20', close, 20)
+        ema_50 = self._ema_step(frame, 'EMA_50', close, 50)
+        if ema_20 is None or ema_50 is None:
+            return False
+        frame.set_last('EMA_20', ema_20)
+        frame.set_last('EMA_50', ema_50)
+        return True
+
+    def update_last_stochastic(self, frame):
+        if len(frame) < 16 + 2:
+            return False
+        lowest = frame['Low'][-16:].min()
+        highest = frame['High'][-16:].max()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stoch_k = 100 * (frame['Close'][-1] - lowest) / (highest - lowest)
+        frame.set_last('Stoch_K', stoch_k)
+        frame.set_last('Stoch_D', frame['Stoch_K'][-3:].mean())
+        return True
+
+    def update_last_macd(self, frame):
+        close = frame['Close'][-1]
+        ema_12 = self._ema_step(frame, 'EMA_12', close, 12)
+        ema_26 = self._ema_step(frame, 'EMA_26', close, 26)
+        if ema_12 is None or ema_26 is None:
+            return False
+        macd = ema_12 - ema_26
+        macd_signal = self._ema_step(frame, 'MACD_Signal', macd, 9)
+        if macd_signal is None:
+            return False
+        frame.set_last('EMA_12', ema_12)
+        frame.set_last('EMA_26', ema_26)
+        frame.set_last('MACD', macd)
+        frame.set_last('MACD_Signal', macd_signal)
+        frame.set_last('MACD_Hist', macd - macd_signal)
+        return True
+
+    def update_last_bollinger(self, frame):
+        close = frame['Close']
+        if len(close) < 20:
+            return False
+        window = close[-20:]
+        mavg = window.mean()
+        mstd = window.std()  # ddof=0, igual que ta
+        frame.set_last('BB_Upper', mavg + 2 * mstd)
+        frame.set_last('BB_Middle', mavg)
+        frame.set_last('BB_Lower', mavg - 2 * mstd)
+        return True
+
+    def update_last_atr(self, frame):
+        if len(frame) < 14 + 2:
+            return False
+        prev_atr = frame['ATR'][-2]
+        if prev_atr == 0 or np.isnan(prev_atr):
+            return False
+        high = frame['High'][-1]
+        low = frame['Low'][-1]
+        prev_close = frame['Close'][-2]
+        true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        frame.set_last('ATR', (prev_atr * 13 + true_range) / 14)
+        return True
+
+    def determine_market_state(self, frame):
         """
         Determina si el mercado está en TENDENCIA o LATERAL/RANGO.
         Retorna: 'TRENDING_UP', 'TRENDING_DOWN', 'SIDEWAYS', 'VOLATILE'
         """
-        if len(df) < 50:
+        if len(frame) < 50:
             return 'UNKNOWN'
         
-        last = df.iloc[-1]
+        close = frame['Close'][-1]
+        ema_20 = frame['EMA_20'][-1]
+        ema_50 = frame['EMA_50'][-1]
         
-        # Filtro ADX para fuerza de tendencia
-        adx_ind = ADXIndicator(high=df['High'], low=df['Low'], close=df['Close'], window=14)
-        # Calculamos ADX para toda la serie para obtener el último valor
-        # Nota: Es eficiente hacerlo una vez, pero aquí se recalcula. 
-        # Idealmente mover al compute_indicators si se usa mucho.
-        adx_series = adx_ind.adx()
-        adx = adx_series.iloc[-1]
+        # Filtro ADX para fuerza de tendencia (calculado por el FeatureGraph)
+        adx = frame['ADX'][-1]
         
         # Lógica básica de tendencia con EMAs y ADX
         # Asegurarse que EMA_20 y EMA_50 existen y no son NaN
-        if pd.isna(last['EMA_20']) or pd.isna(last['EMA_50']):
+        if np.isnan(ema_20) or np.isnan(ema_50):
              return 'UNKNOWN'
 
         if adx > 25:
-            if last['EMA_20'] > last['EMA_50'] and last['Close'] > last['EMA_50']:
+            if ema_20 > ema_50 and close > ema_50:
                 return 'TRENDING_UP'
-            elif last['EMA_20'] < last['EMA_50'] and last['Close'] < last['EMA_50']:
+            elif ema_20 < ema_50 and close < ema_50:
                 return 'TRENDING_DOWN'
         
         # Lógica de lateralización
@@ -94,17 +235,10 @@ class MarketAnalyzer:
             return 'SIDEWAYS'
             
         # Detección de volatilidad alta (si ATR sube mucho respecto a su media)
-        if 'ATR' in df.columns:
-            atr_avg = df['ATR'].rolling(20).mean().iloc[-1]
-            if last['ATR'] > atr_avg * 1.5:
+        if 'ATR' in frame:
+            atr = frame['ATR']
+            atr_avg = atr[-20:].mean()
+            if atr[-1] > atr_avg * 1.5:
                 return 'VOLATILE'
             
         return 'SIDEWAYS' # Default
-
-    def check_news(self):
-        """
-        Placeholder para análisis fundamental.
-        """
-        # TODO: Implementar scraping de calendario económico
-        # print(f"[{datetime.now()}] [INFO] Verificando noticias... (Placeholder: Sin noticias de alto impacto)")
-        return 'NEUTRAL'
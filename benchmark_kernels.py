@@ -0,0 +1,221 @@
+"""
+Paridad y velocidad de los kernels de kernels.py.
+
+Verifica sobre velas sintéticas (precios redondeados a 5 decimales, con
+empates y mesetas como en las velas reales):
+    1. Bucle (interpretado o compilado con numba) == fallback NumPy
+    2. Indicadores de MarketAnalyzer == librería `ta` (la implementación anterior)
+    3. Extremos locales == pandas rolling(center=True)
+    4. MarketStructure incremental (de a una vela) == una sola actualización
+y mide el tiempo de cada kernel sobre un histórico largo con cada backend.
+
+Uso:
+    python benchmark_kernels.py                  # 100.000 velas
+    python benchmark_kernels.py --bars 1000000 --repeat 5
+    BOT_JIT=0 python benchmark_kernels.py        # solo el fallback NumPy
+Devuelve código 1 si alguna comparación falla.
+"""
+import sys
+import time
+import argparse
+
+import numpy as np
+
+import kernels
+from candle_frame import CandleFrame
+from analysis import MarketAnalyzer
+from market_structure import MarketStructure
+
+RTOL = 1e-9
+ATOL = 1e-9
+
+
+def synthetic_candles(bars, seed=0):
+    rng = np.random.default_rng(seed)
+    close = np.round(1.08 + np.cumsum(rng.normal(0, 0.0005, bars)), 5)
+    # Mesetas: tramos con el precio quieto (empates en máximos/mínimos)
+    for start in rng.integers(0, max(bars - 20, 1), bars // 500):
+        close[start:start + 10] = close[start]
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.round(np.maximum(open_, close) + np.abs(rng.normal(0, 0.0003, bars)), 5)
+    low = np.round(np.minimum(open_, close) - np.abs(rng.normal(0, 0.0003, bars)), 5)
+    return {'Timestamp': 1_700_000_000 + np.arange(bars, dtype=np.int64) * 300,
+            'Open': open_, 'High': high, 'Low': low, 'Close': close}
+
+
+def kernel_calls(candles):
+    """nombre -> argumentos de cada kernel sobre las velas."""
+    high, low, close = candles['High'], candles['Low'], candles['Close']
+    true_range = kernels.true_range(high, low, close)
+    return {
+        'ewm': (close, 2.0 / 21, 20),
+        'wilder': (true_range, 14),
+        'adx': (high, low, close, 14),
+        'rolling_max': (high, 16),
+        'rolling_min': (low, 16),
+        'rolling_mean': (close, 3),
+        'local_extremes': (high, 10, True),
+        'swing_points': (high, low, 5),
+    }
+
+
+def _same(a, b):
+    if isinstance(a, tuple):
+        return all(_same(x, y) for x, y in zip(a, b))
+    if a.dtype == np.bool_:
+        return np.array_equal(a, b)
+    return np.allclose(a, b, rtol=RTOL, atol=ATOL, equal_nan=True)
+
+
+def check_backends(candles, label):
+    failures = []
+    for name, args in kernel_calls(candles).items():
+        fallback = kernels.FALLBACKS[name](*args)
+        loop = (kernels.COMPILED.get(name) or kernels.LOOPS[name])(*args)
+        if not _same(loop, fallback):
+            failures.append(f"{name} ({label})")
+    return failures
+
+
+def ta_reference(candles):
+    """Los indicadores como se calculaban con `ta`."""
+    import pandas as pd
+    from ta.trend import EMAIndicator, ADXIndicator
+    from ta.momentum import RSIIndicator, StochasticOscillator
+    from ta.volatility import AverageTrueRange
+    high, low, close = (pd.Series(candles[name]) for name in ('High', 'Low', 'Close'))
+    ema_12 = EMAIndicator(close=close, window=12).ema_indicator()
+    ema_26 = EMAIndicator(close=close, window=26).ema_indicator()
+    macd = ema_12 - ema_26
+    stoch = StochasticOscillator(high=high, low=low, close=close, window=16, smooth_window=3)
+    return {
+        'EMA_20': EMAIndicator(close=close, window=20).ema_indicator(),
+        'EMA_50': EMAIndicator(close=close, window=50).ema_indicator(),
+        'RSI': RSIIndicator(close=close, window=14).rsi(),
+        'Stoch_K': stoch.stoch(),
+        'Stoch_D': stoch.stoch_signal(),
+        'EMA_12': ema_12,
+        'MACD': macd,
+        'MACD_Signal': EMAIndicator(close=macd, window=9).ema_indicator(),
+        'ATR': AverageTrueRange(high=high, low=low, close=close, window=14).average_true_range(),
+        'ADX': ADXIndicator(high=high, low=low, close=close, window=14).adx(),
+    }
+
+
+def analyzer_columns(candles):
+    frame = CandleFrame.restore(candles, capacity=len(candles['Close']))
+    analyzer = MarketAnalyzer()
+    for compute in (analyzer.compute_ema, analyzer.compute_rsi, analyzer.compute_stochastic,
+                    analyzer.compute_macd, analyzer.compute_atr, analyzer.compute_adx):
+        compute(frame)
+    return frame
+
+
+def check_ta(candles):
+    failures = []
+    frame = analyzer_columns(candles)
+    for name, expected in ta_reference(candles).items():
+        values = frame[name]
+        # Las columnas float32 del esquema se comparan con la precisión de float32
+        rtol = 1e-5 if values.dtype == np.float32 else RTOL
+        if not np.allclose(values, expected.to_numpy(), rtol=rtol, atol=1e-6, equal_nan=True):
+            failures.append(f"{name} vs ta")
+    return failures
+
+
+def check_local_extremes(candles):
+    import pandas as pd
+    high = candles['High']
+    expected = (pd.Series(high).rolling(10, center=True).max() == high).to_numpy()
+    return [] if np.array_equal(kernels.local_extremes(high, 10), expected) else ['local_extremes vs pandas']
+
+
+def check_structure(candles):
+    timestamps, highs, lows, closes = (candles[name] for name in ('Timestamp', 'High', 'Low', 'Close'))
+    batch = MarketStructure()
+    batch.update(timestamps, highs, lows, closes)
+    incremental = MarketStructure()
+    for end in range(1, len(timestamps) + 1):
+        incremental.update(timestamps[:end], highs[:end], lows[:end], closes[:end])
+    same = ([repr(s) for s in batch.swings] == [repr(s) for s in incremental.swings]
+            and batch.last_break == incremental.last_break and batch.trend == incremental.trend)
+    return [] if same else ['MarketStructure incremental vs batch']
+
+
+def best_time(func, args, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(candles, repeat):
+    rows = []
+    for name, args in kernel_calls(candles).items():
+        row = [name, best_time(kernels.FALLBACKS[name], args, repeat)]
+        compiled = kernels.COMPILED.get(name)
+        if compiled is not None:
+            compiled(*args)  # compilación fuera de la medición
+            row.append(best_time(compiled, args, repeat))
+        rows.append(row)
+    return rows
+
+
+def benchmark_ta(candles, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        ta_reference(candles)
+    ta_time = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        analyzer_columns(candles)
+    return ta_time, (time.perf_counter() - start) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Paridad y velocidad de los kernels")
+    parser.add_argument('--bars', type=int, default=100_000, help="Velas del histórico largo")
+    parser.add_argument('--parity-bars', type=int, default=3000,
+                        help="Velas para comparar el bucle interpretado (sin numba) y la estructura")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(f"Backend: {kernels.BACKEND}")
+    short = synthetic_candles(args.parity_bars, args.seed)
+    long = synthetic_candles(args.bars, args.seed + 1)
+
+    failures = []
+    failures += check_backends(short, f"{args.parity_bars} velas")
+    if kernels.COMPILED:
+        failures += check_backends(long, f"{args.bars} velas")
+    failures += check_ta(long)
+    failures += check_local_extremes(long)
+    failures += check_structure(short)
+    if failures:
+        print("Paridad FALLÓ: " + ', '.join(failures))
+    else:
+        print("Paridad OK (bucle vs fallback NumPy, indicadores vs ta, extremos vs pandas, estructura)")
+
+    print(f"\nKernels sobre {args.bars} velas (mejor de {args.repeat}):")
+    header = f"{'kernel':<16}{'numpy':>12}"
+    if kernels.COMPILED:
+        header += f"{'numba':>12}{'speedup':>10}"
+    print(header)
+    for row in benchmark(long, args.repeat):
+        line = f"{row[0]:<16}{row[1] * 1000:>10.2f}ms"
+        if len(row) > 2:
+            line += f"{row[2] * 1000:>10.2f}ms{row[1] / row[2]:>9.1f}x"
+        print(line)
+
+    ta_time, kernel_time = benchmark_ta(long, args.repeat)
+    print(f"\nIndicadores (EMA, RSI, estocástico, MACD, ATR, ADX) sobre {args.bars} velas:")
+    print(f"  ta:      {ta_time * 1000:10.1f}ms")
+    print(f"  kernels: {kernel_time * 1000:10.1f}ms ({ta_time / kernel_time:.1f}x, backend {kernels.BACKEND})")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
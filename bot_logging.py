@@ -0,0 +1,172 @@
+"""
+Logging estructurado sin bloquear el event loop.
+
+Los módulos del bot usan `logging.getLogger(__name__)`. setup_logging()
+instala en el logger raíz un QueueHandler: el hilo que loguea (el event loop)
+solo encola el registro, y un hilo de fondo (QueueListener) lo escribe en:
+    - archivo JSON-lines con rotación por tamaño (logs/bot.jsonl)
+    - consola (texto legible)
+    - ring buffer en memoria con los últimos eventos (comando /log de Telegram)
+
+Si la cola se llena (consola o disco trabados) los registros se descartan y
+se cuentan; nunca se bloquea al que loguea. Los campos pasados con
+`extra={...}` quedan como claves del JSON.
+"""
+import os
+import sys
+import json
+import queue
+import logging
+import logging.handlers
+from collections import deque
+from datetime import datetime, timezone
+
+# Atributos propios de LogRecord (el resto son campos `extra`)
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_state = {'listener': None, 'ring': None, 'handler': None}
+
+
+def _event(record):
+    event = {
+        'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+        'level': record.levelname,
+        'logger': record.name,
+        'message': record.getMessage(),
+    }
+    for key, value in record.__dict__.items():
+        if key not in _RECORD_ATTRS and not key.startswith('_'):
+            event[key] = value
+    return event
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(_event(record), ensure_ascii=False, default=str)
+
+
+class RingBufferHandler(logging.Handler):
+    """Últimos `capacity` eventos en memoria (se escribe desde el hilo del listener)."""
+
+    def __init__(self, capacity=500):
+        super().__init__()
+        self.events = deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.events.append(_event(record))
+
+    def recent(self, limit=20, level=None, text=None):
+        """
+        Eventos más recientes primero.
+
+        Args:
+            limit: Cantidad máxima
+            level: Nivel mínimo ('WARNING', ...)
+            text: Filtro por substring en el logger o el mensaje (sin distinguir mayúsculas)
+        """
+        minimum = logging.getLevelName(level.upper()) if level else 0
+        text = text.lower() if text else None
+        result = []
+        for event in reversed(list(self.events)):
+            if logging.getLevelName(event['level']) < minimum:
+                continue
+            if text and text not in event['logger'].lower() and text not in event['message'].lower():
+                continue
+            result.append(event)
+            if len(result) >= limit:
+                break
+        return result
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (y cuenta) en lugar de bloquear si la cola está llena."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(path='logs/bot.jsonl', level='INFO', levels=None, max_bytes=5_000_000,
+                  backup_count=5, ring_size=500, queue_size=10000, console=True):
+    """
+    Configura el pipeline de logging (idempotente).
+
+    Args:
+        path: Archivo JSON-lines (None = sin archivo)
+        level: Nivel global
+        levels: Niveles por módulo, p.ej. {"telegram_bot": "WARNING", "execution": "DEBUG"}
+        max_bytes, backup_count: Rotación del archivo
+        ring_size: Eventos que guarda el ring buffer para /log
+        queue_size: Registros en cola como máximo antes de descartar
+        console: Escribir también en stdout
+    """
+    if _state['listener'] is not None:
+        return
+    handlers = []
+    if path:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                            encoding='utf-8')
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-7s %(name)s: %(message)s',
+                                                       datefmt='%H:%M:%S'))
+        handlers.append(console_handler)
+    ring = RingBufferHandler(ring_size)
+    handlers.append(ring)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    for name, module_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(module_level.upper() if isinstance(module_level, str) else module_level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _state.update(listener=listener, ring=ring, handler=queue_handler)
+
+
+def shutdown_logging():
+    """Vacía la cola y detiene el hilo de escritura (al apagar el bot)."""
+    listener = _state['listener']
+    if listener is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    _state.update(listener=None, ring=None, handler=None)
+
+
+def recent_events(limit=20, level=None, text=None):
+    """Eventos del ring buffer (ver RingBufferHandler.recent); [] si no se configuró el logging."""
+    ring = _state['ring']
+    return ring.recent(limit, level, text) if ring is not None else []
+
+
+def dropped_count():
+    handler = _state['handler']
+    return handler.dropped if handler is not None else 0
+
+
+def format_events(events):
+    """Eventos -> texto compacto para Telegram (más viejo arriba)."""
+    if not events:
+        return "Sin eventos."
+    lines = []
+    for event in reversed(events):
+        lines.append(f"{event['time'][11:19]} {event['level'][0]} {event['logger']}: {event['message']}")
+    return '\n'.join(lines)
@@ -0,0 +1,340 @@
+import numpy as np
+from datetime import datetime, timezone
+
+# Esquema fijo de columnas: nombre -> dtype
+# - Precios y niveles de precio en float64 (USDCOP/USDMXN necesitan la precisión)
+# - Osciladores y volatilidad en float32 (rango acotado, no se comparan contra precios)
+# - Flags de patrones en int8 (0, 1, 100, -100)
+SCHEMA = {
+    'Timestamp': np.int64,  # Epoch en segundos (UTC)
+    'Open': np.float64,
+    'High': np.float64,
+    'Low': np.float64,
+    'Close': np.float64,
+
+    # --- Indicadores ---
+    'SMA_200': np.float64,
+    'EMA_20': np.float64,
+    'EMA_50': np.float64,
+    'RSI': np.float32,
+    'Stoch_K': np.float32,
+    'Stoch_D': np.float32,
+    'MACD': np.float32,
+    'MACD_Signal': np.float32,
+    'MACD_Hist': np.float32,
+    'EMA_12': np.float64,  # Estado del MACD (para actualizar la vela en formación)
+    'EMA_26': np.float64,
+    'BB_Upper': np.float64,
+    'BB_Middle': np.float64,
+    'BB_Lower': np.float64,
+    'ATR': np.float32,
+    'ADX': np.float32,
+
+    # --- Patrones de velas ---
+    'CDL_DOJI': np.int8,
+    'CDL_HAMMER': np.int8,
+    'CDL_SHOOTINGSTAR': np.int8,
+    'CDL_ENGULFING': np.int8,
+    'CDL_MORNINGSTAR': np.int8,
+    'CDL_EVENINGSTAR': np.int8,
+
+    # --- Patrones chartistas ---
+    'Pattern_DoubleTop': np.int8,
+    'Pattern_DoubleTop_Neck': np.float64,
+    'Pattern_DoubleBottom': np.int8,
+    'Pattern_DoubleBottom_Neck': np.float64,
+    'Pattern_Triangle': np.int8,
+    'Pattern_Triangle_Upper': np.float64,
+    'Pattern_Triangle_Lower': np.float64,
+    'max_local': np.bool_,
+    'min_local': np.bool_,
+}
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+BASE_COLUMNS = ['Timestamp'] + PRICE_COLUMNS
+
+# Claves que devuelve la API (en minúsculas) -> columna del esquema
+API_KEYS = {'time': 'Timestamp', 'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close'}
+
+
+class CandleFrame:
+    """
+    Contenedor compacto de velas y features para un par.
+
+    Las columnas son arrays NumPy preasignados con el dtype del esquema y se
+    reutilizan en cada ciclo: cargar velas nuevas no crea objetos por columna.
+    Las estrategias siguen recibiendo un DataFrame mediante `to_pandas()`,
+    que envuelve los mismos buffers sin copiarlos.
+    """
+
+    def __init__(self, capacity=512):
+        self.capacity = capacity
+        self.length = 0
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in SCHEMA.items()}
+        self._present = set()
+        self._view = None
+        # True si solo cambió la vela en formación desde el último cálculo de features
+        self.stale_last = False
+
+    def __len__(self):
+        return self.length
+
+    def __contains__(self, name):
+        return name in self._present
+
+    def __getitem__(self, name):
+        """Vista NumPy (sin copia) de una columna calculada."""
+        if name not in self._present:
+            raise KeyError(name)
+        return self._columns[name][:self.length]
+
+    @property
+    def empty(self):
+        return self.length == 0
+
+    @property
+    def columns(self):
+        return [name for name in SCHEMA if name in self._present]
+
+    def _ensure_capacity(self, n):
+        if n <= self.capacity:
+            return
+        capacity = max(n, self.capacity * 2)
+        for name, col in self._columns.items():
+            grown = np.zeros(capacity, dtype=col.dtype)
+            grown[:self.length] = col[:self.length]
+            self._columns[name] = grown
+        self.capacity = capacity
+
+    @property
+    def last_timestamp(self):
+        """Timestamp (epoch s) de la última vela cargada, o None si está vacío."""
+        if self.length == 0:
+            return None
+        return int(self._columns['Timestamp'][self.length - 1])
+
+    @staticmethod
+    def _parse(candles):
+        """
+        Convierte la lista de velas (dicts) de la API en arrays por columna.
+        Lanza KeyError si faltan columnas de precio.
+        """
+        n = len(candles)
+
+        # Normalizar claves (manejar minúsculas/mayúsculas) a partir de la primera vela
+        keys = {API_KEYS[k.lower()]: k for k in candles[0] if k.lower() in API_KEYS}
+        missing = [c for c in PRICE_COLUMNS if c not in keys]
+        if missing:
+            raise KeyError(f"Columnas faltantes {missing}. Las que hay: {list(candles[0].keys())}")
+
+        parsed = {}
+        for name in PRICE_COLUMNS:
+            key = keys[name]
+            parsed[name] = np.fromiter((c[key] for c in candles), dtype=np.float64, count=n)
+
+        if 'Timestamp' in keys:
+            key = keys['Timestamp']
+            parsed['Timestamp'] = np.fromiter((c[key] for c in candles), dtype=np.float64, count=n).astype(np.int64)
+        else:
+            # Fallback si no hay timestamp
+            parsed['Timestamp'] = np.full(n, int(datetime.now(timezone.utc).timestamp()), dtype=np.int64)
+        return parsed
+
+    def load(self, candles):
+        """
+        Carga la lista de velas (dicts) que devuelve la API reemplazando el contenido.
+        Lanza KeyError si faltan columnas de precio.
+        """
+        self.length = 0
+        self._present.clear()
+        self._view = None
+        self.stale_last = False
+
+        n = len(candles)
+        if n == 0:
+            return self
+
+        parsed = self._parse(candles)
+        self._ensure_capacity(n)
+        for name in BASE_COLUMNS:
+            self._columns[name][:n] = parsed[name]
+
+        self.length = n
+        self._present.update(BASE_COLUMNS)
+        return self
+
+    def merge(self, candles, max_length=None):
+        """
+        Actualiza el frame con velas recientes sin volver a descargar el histórico.
+
+        Las velas recibidas reemplazan desde el primer timestamp coincidente en
+        adelante (incluida la vela en formación). Si no cambió nada, las features
+        calculadas se conservan; si cambió algo, se invalidan.
+
+        Returns:
+            Cantidad de velas nuevas o modificadas
+        """
+        if not candles:
+            return 0
+
+        parsed = self._parse(candles)
+        m = len(candles)
+        n = self.length
+        start = int(np.searchsorted(self._columns['Timestamp'][:n], parsed['Timestamp'][0])) if n else 0
+
+        # Sin cambios respecto a lo que ya teníamos: las features siguen siendo válidas
+        if start + m <= n and all(np.array_equal(self._columns[name][start:start + m], parsed[name])
+                                  for name in BASE_COLUMNS):
+            return 0
+
+        # Solo se actualizó la vela en formación: las features del histórico cerrado
+        # siguen valiendo y basta con recalcular la última fila (ver FeatureGraph.refresh_last)
+        if m == 1 and start == n - 1 and self._columns['Timestamp'][start] == parsed['Timestamp'][0]:
+            for name in BASE_COLUMNS:
+                self._columns[name][start] = parsed[name][0]
+            self.stale_last = True
+            self._view = None
+            return 1
+
+        total = start + m
+        self._ensure_capacity(total)
+        for name in BASE_COLUMNS:
+            self._columns[name][start:total] = parsed[name]
+        self.length = total
+
+        # Descartar las velas más viejas si superamos el máximo
+        if max_length and total > max_length:
+            drop = total - max_length
+            for name in BASE_COLUMNS:
+                col = self._columns[name]
+                col[:max_length] = col[drop:total]
+            self.length = max_length
+
+        self._present.intersection_update(BASE_COLUMNS)
+        self._view = None
+        self.stale_last = False
+        return m
+
+    def upsert(self, candles, max_length=None):
+        """
+        Inserta velas en cualquier posición (relleno de huecos), ordenando por
+        timestamp. Ante timestamps repetidos gana la vela recibida. Las features
+        se invalidan.
+
+        Returns:
+            Cantidad de velas nuevas (timestamps que no estaban)
+        """
+        if not candles:
+            return 0
+        parsed = self._parse(candles)
+        n = self.length
+        merged = {name: np.concatenate([self._columns[name][:n], parsed[name]]) for name in BASE_COLUMNS}
+        added = len(np.setdiff1d(parsed['Timestamp'], merged['Timestamp'][:n]))
+
+        self._assign_unique(merged, max_length)
+        return added
+
+    def deduplicate(self, max_length=None):
+        """Ordena por timestamp y deja una vela por timestamp (la última recibida). Invalida las features."""
+        n = self.length
+        self._assign_unique({name: self._columns[name][:n].copy() for name in BASE_COLUMNS}, max_length)
+
+    def _assign_unique(self, arrays, max_length=None):
+        # Orden estable: entre timestamps iguales la última fila es la más nueva
+        order = np.argsort(arrays['Timestamp'], kind='stable')
+        timestamps = arrays['Timestamp'][order]
+        keep = np.ones(len(order), dtype=bool)
+        keep[:-1] = timestamps[1:] != timestamps[:-1]
+        order = order[keep]
+        if max_length:
+            order = order[-max_length:]
+
+        total = len(order)
+        self._ensure_capacity(total)
+        for name in BASE_COLUMNS:
+            self._columns[name][:total] = arrays[name][order]
+        self.length = total
+        self._present.intersection_update(BASE_COLUMNS)
+        self._view = None
+        self.stale_last = False
+
+    def take(self, index):
+        """Conserva solo las filas `index` (en ese orden). Invalida las features."""
+        index = np.asarray(index)
+        n = len(index)
+        for name in BASE_COLUMNS:
+            col = self._columns[name]
+            col[:n] = col[:self.length][index]
+        self.length = n
+        self._present.intersection_update(BASE_COLUMNS)
+        self._view = None
+        self.stale_last = False
+
+    def set(self, name, values):
+        """Guarda una columna calculada convirtiendo al dtype del esquema."""
+        if name not in SCHEMA:
+            raise KeyError(f"Columna fuera del esquema: {name}")
+        self._columns[name][:self.length] = np.asarray(values)
+        self._present.add(name)
+        self._view = None
+
+    def set_last(self, name, value):
+        """Actualiza solo el valor de la última fila de una columna ya calculada."""
+        self._columns[name][self.length - 1] = value
+        self._view = None
+
+    def fill(self, name, value):
+        """Inicializa una columna con un valor constante y devuelve su vista."""
+        if name not in SCHEMA:
+            raise KeyError(f"Columna fuera del esquema: {name}")
+        col = self._columns[name][:self.length]
+        col[:] = value
+        self._present.add(name)
+        self._view = None
+        return col
+
+    def discard(self, *names):
+        """Marca columnas como no calculadas (siguen preasignadas)."""
+        self._present.difference_update(names)
+        self._view = None
+
+    def series(self, name):
+        """pd.Series sobre el buffer de la columna (para la librería `ta`)."""
+        import pandas as pd
+        return pd.Series(self[name], copy=False)
+
+    def to_pandas(self):
+        """
+        Vista pandas de las columnas calculadas, compatible con las estrategias.
+
+        Comparte memoria con los buffers: es válida hasta la próxima `load()`.
+        """
+        if self._view is not None:
+            return self._view
+
+        import pandas as pd
+        data = {}
+        for name in self.columns:
+            if name == 'Timestamp':
+                data[name] = pd.to_datetime(self[name], unit='s', utc=True)
+            else:
+                data[name] = self[name]
+        self._view = pd.DataFrame(data, copy=False)
+        return self._view
+
+    def export(self, last=None):
+        """Columnas calculadas como dict de arrays (copias) para guardar en disco; `last` limita a las últimas N filas."""
+        start = 0 if last is None else max(0, self.length - last)
+        return {name: self[name][start:].copy() for name in self.columns}
+
+    @classmethod
+    def restore(cls, arrays, capacity=512):
+        """Reconstruye un frame a partir de `export()`, conservando las features."""
+        n = len(arrays['Timestamp'])
+        frame = cls(capacity=max(capacity, n))
+        frame.length = n
+        for name, values in arrays.items():
+            if name in SCHEMA:
+                frame._columns[name][:n] = values
+                frame._present.add(name)
+        return frame
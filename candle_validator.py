@@ -0,0 +1,247 @@
+"""
+Validación de calidad de las velas antes de calcular indicadores.
+
+Un hueco, un timestamp duplicado o el fallback de "timestamp = ahora" para
+todas las velas corrompen en silencio SMA_200, las ventanas de los patrones
+chartistas y los swings. check() revisa un buffer completo con una pasada
+vectorizada por condición (microsegundos para ~300 velas):
+    - timestamps crecientes, sin duplicados y alineados al intervalo
+    - espaciado de `interval` (los saltos mayores son huecos)
+    - precios finitos y positivos, High/Low consistentes con Open/Close
+
+CandleValidator repara lo que se puede reparar en el buffer (orden,
+duplicados, High/Low), pide a la API solo los rangos faltantes y marca el par
+como degradado (no se opera) hasta que el buffer vuelve a estar completo. Un
+hueco que el broker no puede rellenar (no tiene velas para ese rango) se
+acepta después de `max_gap_attempts` backfills fallidos: se registra y deja de
+bloquear el par.
+"""
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class QualityReport:
+    __slots__ = ('rows', 'unsorted', 'duplicates', 'misaligned', 'constant', 'invalid', 'bad_ohlc', 'gaps')
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.unsorted = 0     # Saltos hacia atrás en el tiempo
+        self.duplicates = 0   # Timestamps repetidos (consecutivos)
+        self.misaligned = 0   # Timestamps que no son múltiplo del intervalo
+        self.constant = False  # Todas las velas con el mismo timestamp (fallback sin 'time')
+        self.invalid = 0      # Precios no finitos o <= 0
+        self.bad_ohlc = 0     # High/Low que no contienen a Open/Close
+        self.gaps = []        # [(primer timestamp faltante, último faltante, velas faltantes)]
+
+    @property
+    def missing(self):
+        return sum(gap[2] for gap in self.gaps)
+
+    @property
+    def structural(self):
+        """Problemas que se corrigen dentro del buffer (sin pedir velas)."""
+        return bool(self.unsorted or self.duplicates or self.misaligned or self.invalid or self.bad_ohlc)
+
+    @property
+    def ok(self):
+        return not (self.structural or self.constant or self.gaps)
+
+    def summary(self):
+        if self.ok:
+            return 'OK'
+        if self.constant:
+            return 'todas las velas con el mismo timestamp'
+        parts = []
+        for label, value in (('desordenadas', self.unsorted), ('duplicadas', self.duplicates),
+                             ('desalineadas', self.misaligned), ('precios inválidos', self.invalid),
+                             ('OHLC inconsistentes', self.bad_ohlc), ('faltantes', self.missing)):
+            if value:
+                parts.append(f"{value} {label}")
+        if self.gaps:
+            parts.append(f"en {len(self.gaps)} hueco(s)")
+        return ', '.join(parts)
+
+
+def check(timestamps, opens, highs, lows, closes, interval=300):
+    """Valida arrays de velas (orden cronológico esperado). Devuelve un QualityReport."""
+    n = len(timestamps)
+    report = QualityReport(n)
+    if n == 0:
+        return report
+
+    steps = np.diff(timestamps)
+    if n > 1 and not steps.any():
+        report.constant = True
+        return report
+    report.unsorted = int(np.count_nonzero(steps < 0))
+    report.duplicates = int(np.count_nonzero(steps == 0))
+    report.misaligned = int(np.count_nonzero(timestamps % interval))
+
+    prices = np.stack((opens, highs, lows, closes))
+    report.invalid = int(np.count_nonzero(~(np.isfinite(prices) & (prices > 0)).all(axis=0)))
+    body_high = np.maximum(opens, closes)
+    body_low = np.minimum(opens, closes)
+    report.bad_ohlc = int(np.count_nonzero((highs < body_high) | (lows > body_low)))
+
+    # Huecos: solo tienen sentido sobre timestamps ordenados
+    if not report.unsorted:
+        positions = np.flatnonzero(steps > interval)
+        report.gaps = [(int(timestamps[i]) + interval, int(timestamps[i + 1]) - interval,
+                        int(steps[i] // interval) - 1) for i in positions]
+    return report
+
+
+def check_frame(frame, interval=300):
+    return check(frame['Timestamp'], frame['Open'], frame['High'], frame['Low'], frame['Close'], interval)
+
+
+class CandleValidator:
+    def __init__(self, interval=300, backfill_retry=600, max_backfills=5, timeout=10.0, max_gap_attempts=3):
+        """
+        Args:
+            interval: Duración de la vela en segundos
+            backfill_retry: Segundos entre intentos de backfill de un mismo par
+            max_backfills: Huecos que se piden por intento (los más recientes primero)
+            timeout: Timeout de cada pedido de velas
+            max_gap_attempts: Backfills fallidos de un hueco antes de aceptarlo
+        """
+        self.interval = interval
+        self.backfill_retry = backfill_retry
+        self.max_backfills = max_backfills
+        self.timeout = timeout
+        self.max_gap_attempts = max_gap_attempts
+        self.degraded = {}        # par -> motivo
+        self.known_gaps = {}      # par -> {(primer faltante, último faltante)} aceptados
+        self._gap_attempts = {}   # par -> {(primer faltante, último faltante): backfills fallidos}
+        self._last_backfill = {}  # par -> epoch del último intento
+
+    def is_degraded(self, pair):
+        return pair in self.degraded
+
+    def _check(self, pair, frame):
+        """check_frame sin los huecos ya aceptados del par (y olvida los que salieron del buffer)."""
+        report = check_frame(frame, self.interval)
+        known = self.known_gaps.get(pair)
+        if known:
+            first = int(frame['Timestamp'][0]) if not frame.empty else 0
+            known.intersection_update({gap for gap in known if gap[1] >= first})
+            report.gaps = [gap for gap in report.gaps if gap[:2] not in known]
+        return report
+
+    def _count_failed(self, pair, requested, report):
+        """Suma un intento a los huecos pedidos que siguen abiertos; acepta los que agotaron los intentos."""
+        attempts = self._gap_attempts.setdefault(pair, {})
+        still_open = {gap[:2] for gap in report.gaps}
+        for key in list(attempts):
+            if key not in still_open:
+                del attempts[key]
+        for first, last, missing in requested:
+            key = (first, last)
+            if key not in still_open:
+                continue
+            attempts[key] = attempts.get(key, 0) + 1
+            if attempts[key] >= self.max_gap_attempts:
+                del attempts[key]
+                self.known_gaps.setdefault(pair, set()).add(key)
+                log.warning(f"[Data] {pair}: el broker no tiene {missing} vela(s) desde {first} hasta {last} "
+                            f"({self.max_gap_attempts} backfills fallidos). Se acepta el hueco.")
+        report.gaps = [gap for gap in report.gaps if gap[:2] not in self.known_gaps.get(pair, ())]
+
+    def repair(self, frame, report):
+        """Corrige en el buffer orden, duplicados, desalineación, precios inválidos y High/Low."""
+        interval = self.interval
+        if report.misaligned:
+            timestamps = frame['Timestamp']
+            timestamps -= timestamps % interval
+        if report.invalid:
+            prices = np.stack([frame[name] for name in ('Open', 'High', 'Low', 'Close')])
+            valid = (np.isfinite(prices) & (prices > 0)).all(axis=0)
+            # Las velas descartadas quedan como hueco y se piden de nuevo
+            frame.take(np.flatnonzero(valid))
+        if report.unsorted or report.duplicates or report.misaligned:
+            frame.deduplicate()
+        if report.bad_ohlc:
+            opens, highs, lows, closes = (frame[name] for name in ('Open', 'High', 'Low', 'Close'))
+            np.maximum(highs, np.maximum(opens, closes), out=highs)
+            np.minimum(lows, np.minimum(opens, closes), out=lows)
+            frame.discard(*[name for name in frame.columns if name not in ('Timestamp', 'Open', 'High', 'Low', 'Close')])
+
+    async def backfill(self, api, pair, frame, gaps, max_length=None):
+        """
+        Pide solo los rangos faltantes. Con `get_candles_advanced` (velas hasta un
+        timestamp dado) cada hueco es un pedido acotado; si la API solo tiene
+        `get_candles` se pide desde el hueco más viejo hasta ahora.
+
+        Returns:
+            Velas nuevas insertadas
+        """
+        self._last_backfill[pair] = time.time()
+        gaps = gaps[-self.max_backfills:]
+        advanced = getattr(api, 'get_candles_advanced', None)
+        requests = []
+        if callable(advanced):
+            for first, last, missing in gaps:
+                span = (missing + 2) * self.interval
+                requests.append(advanced(pair, self.interval, span, last + 2 * self.interval))
+        else:
+            offset = int(time.time()) - gaps[0][0] + 2 * self.interval
+            requests.append(api.get_candles(pair, self.interval, offset))
+
+        added = 0
+        for request in requests:
+            try:
+                candles = await asyncio.wait_for(request, timeout=self.timeout)
+            except Exception as e:
+                log.warning(f"[Data] Backfill de {pair} falló: {e}")
+                continue
+            if candles:
+                added += frame.upsert(candles, max_length=max_length)
+        return added
+
+    async def ensure(self, api, pair, frame, max_length=None):
+        """
+        Valida el buffer del par, repara y hace backfill si hace falta.
+
+        Returns:
+            (usable, cambió): usable False si el par queda degradado; cambió True si
+            se modificaron velas ya existentes (el contexto incremental debe rehacerse)
+        """
+        report = self._check(pair, frame)
+        if report.ok:
+            if self.degraded.pop(pair, None) is not None:
+                log.info(f"[Data] {pair} reparado")
+            return True, False
+
+        if report.constant:
+            # Sin timestamps reales no hay nada que rescatar: se vacía para descargar el histórico completo
+            frame.load([])
+            self.degraded[pair] = report.summary()
+            log.warning(f"[Data] {pair}: {report.summary()}. Se descarta el buffer.")
+            return False, True
+
+        changed = False
+        if report.structural:
+            log.warning(f"[Data] {pair}: {report.summary()}. Reparando buffer.")
+            self.repair(frame, report)
+            report = self._check(pair, frame)
+            changed = True
+
+        if report.gaps and time.time() - self._last_backfill.get(pair, 0) >= self.backfill_retry:
+            requested = report.gaps[-self.max_backfills:]
+            added = await self.backfill(api, pair, frame, report.gaps, max_length)
+            if added:
+                log.info(f"[Data] {pair}: backfill de {added} vela(s)")
+                report = self._check(pair, frame)
+                changed = True
+            self._count_failed(pair, requested, report)
+
+        if report.ok:
+            self.degraded.pop(pair, None)
+            return True, changed
+        self.degraded[pair] = report.summary()
+        return False, changed
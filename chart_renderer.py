@@ -0,0 +1,317 @@
+"""
+Gráficos de velas anotados para las notificaciones de operaciones.
+
+Cada operación se dibuja con sus velas recientes, la entrada (y la salida al
+cerrar), los indicadores que usa la estrategia (`requires`), los niveles de
+patrones chartistas (necklines, lados del triángulo), los retrocesos de
+Fibonacci del tramo vigente y las zonas S/R más cercanas.
+
+El dibujo (matplotlib, backend Agg) corre en un pool de procesos: el event
+loop solo arma las anotaciones (datos chicos) y espera el PNG sin bloquear
+ni el envío de órdenes ni el barrido. Los renders se cachean por par, vela y
+anotaciones: el mismo gráfico no se dibuja dos veces (tampoco si se pide de
+nuevo mientras se está dibujando). matplotlib es opcional: sin él las
+notificaciones quedan solo en texto.
+"""
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import importlib.util
+import multiprocessing
+from collections import OrderedDict
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Columnas que se dibujan sobre el precio y en el panel de osciladores
+PRICE_OVERLAYS = ('SMA_200', 'EMA_20', 'EMA_50', 'BB_Upper', 'BB_Middle', 'BB_Lower')
+OSCILLATORS = {
+    'Stoch_K': (20, 80), 'Stoch_D': (20, 80),
+    'RSI': (30, 70),
+    'MACD': (0,), 'MACD_Signal': (0,), 'MACD_Hist': (0,),
+}
+# Columna de nivel -> etiqueta (se toma el último valor del patrón en la ventana)
+PATTERN_LEVELS = {
+    'Pattern_DoubleTop_Neck': 'Neckline doble techo',
+    'Pattern_DoubleBottom_Neck': 'Neckline doble suelo',
+    'Pattern_Triangle_Upper': 'Triángulo (superior)',
+    'Pattern_Triangle_Lower': 'Triángulo (inferior)',
+}
+LEVEL_COLORS = {'pattern': '#7e57c2', 'fib': '#ff9800', 'zone': '#607d8b', 'entry': '#1e88e5'}
+UP_COLOR = '#26a69a'
+DOWN_COLOR = '#ef5350'
+
+
+def trade_annotations(pair, arrays, action, strategy, entry_time, entry_price, requires=(), context=None):
+    """
+    Anotaciones de una operación (dict serializable: viaja al proceso que dibuja).
+
+    Args:
+        pair: Par operado
+        arrays: Velas/features (CandleFrame.export)
+        action: 'BUY' o 'SELL'
+        strategy: Nombre de la estrategia
+        entry_time, entry_price: Entrada de la operación (epoch, precio)
+        requires: Columnas que usa la estrategia (se dibujan las que tengan representación)
+        context: PairContext del par (Fibonacci y zonas S/R), opcional
+    """
+    levels = []
+    for column, label in PATTERN_LEVELS.items():
+        values = arrays.get(column)
+        if values is None:
+            continue
+        found = np.flatnonzero(~np.isnan(values))
+        if len(found):
+            levels.append((label, float(values[found[-1]]), 'pattern'))
+
+    if context is not None:
+        leg = context.fibonacci.leg
+        if leg is not None:
+            for ratio, price in leg.retracements.items():
+                levels.append((f"Fib {ratio * 100:.1f}%", float(price), 'fib'))
+        for label, zone in (('Resistencia', context.zones.nearest_above(entry_price)),
+                            ('Soporte', context.zones.nearest_below(entry_price))):
+            if zone is not None:
+                levels.append((f"{label} ({zone.touches} toques)", float(zone.center), 'zone'))
+
+    return {
+        'title': f"{pair} {action} · {strategy}",
+        'action': action,
+        'entry': [int(entry_time), float(entry_price)],
+        'exit': None,
+        'result': None,
+        'overlays': [name for name in PRICE_OVERLAYS if name in requires and name in arrays],
+        'oscillators': [name for name in OSCILLATORS if name in requires and name in arrays],
+        'levels': levels,
+    }
+
+
+def with_exit(annotations, exit_time, exit_price, result):
+    """Copia de las anotaciones de apertura con la salida de la operación."""
+    return dict(annotations, exit=[int(exit_time), float(exit_price)], result=result)
+
+
+def _bar_index(timestamps, epoch):
+    return int(np.clip(np.searchsorted(timestamps, epoch, side='right') - 1, 0, len(timestamps) - 1))
+
+
+def render_png(path, arrays, annotations, size=(10, 6), dpi=100):
+    """
+    Dibuja el gráfico y lo guarda en `path` (corre en el proceso del pool).
+    Usa Figure sin pyplot: no hay estado global entre renders.
+    """
+    from matplotlib.figure import Figure
+
+    timestamps = arrays['Timestamp']
+    opens, highs, lows, closes = (arrays[name] for name in ('Open', 'High', 'Low', 'Close'))
+    x = np.arange(len(timestamps))
+    oscillators = annotations['oscillators']
+
+    fig = Figure(figsize=size, dpi=dpi)
+    if oscillators:
+        grid = fig.add_gridspec(2, 1, height_ratios=(3, 1), hspace=0.05)
+        ax = fig.add_subplot(grid[0])
+        lower = fig.add_subplot(grid[1], sharex=ax)
+    else:
+        ax = fig.add_subplot(1, 1, 1)
+        lower = None
+
+    # Velas: mechas y cuerpos
+    colors = np.where(closes >= opens, UP_COLOR, DOWN_COLOR)
+    ax.vlines(x, lows, highs, colors=colors, linewidth=0.8)
+    bodies = np.abs(closes - opens)
+    ax.bar(x, np.maximum(bodies, (highs - lows).max() * 0.002), bottom=np.minimum(opens, closes),
+           width=0.6, color=colors, edgecolor=colors, linewidth=0.5)
+
+    for name in annotations['overlays']:
+        ax.plot(x, arrays[name], linewidth=1.0, label=name)
+
+    # Eje de precios: las velas con margen; los niveles lejanos no se dibujan
+    low, high = float(lows.min()), float(highs.max())
+    margin = (high - low) * 0.5 or high * 0.001
+    visible = (low - margin, high + margin)
+    for label, price, kind in annotations['levels']:
+        if not visible[0] <= price <= visible[1]:
+            continue
+        low, high = min(low, price), max(high, price)
+        color = LEVEL_COLORS.get(kind, 'gray')
+        ax.axhline(price, color=color, linestyle='--' if kind != 'zone' else ':', linewidth=0.9)
+        ax.annotate(f"{label} {price:.5f}", (1, price), xycoords=('axes fraction', 'data'),
+                    fontsize=7, color=color, va='bottom', ha='right')
+    pad = (high - low) * 0.05 or high * 0.0005
+    ax.set_ylim(low - pad, high + pad)
+
+    # Entrada y salida
+    entry_time, entry_price = annotations['entry']
+    buy = annotations['action'] == 'BUY'
+    entry_bar = _bar_index(timestamps, entry_time)
+    ax.axhline(entry_price, color=LEVEL_COLORS['entry'], linestyle=':', linewidth=0.9)
+    ax.scatter([entry_bar], [entry_price], marker='^' if buy else 'v', s=120, zorder=5,
+               color=UP_COLOR if buy else DOWN_COLOR, edgecolors='black', label=f"Entrada {entry_price:.5f}")
+    if annotations['exit'] is not None:
+        exit_time, exit_price = annotations['exit']
+        exit_bar = _bar_index(timestamps, exit_time)
+        result = annotations['result'] or ''
+        ax.scatter([exit_bar], [exit_price], marker='o', s=80, zorder=5,
+                   color=UP_COLOR if result == 'win' else DOWN_COLOR, edgecolors='black',
+                   label=f"Salida {exit_price:.5f} {result.upper()}")
+        ax.plot([entry_bar, exit_bar], [entry_price, exit_price], color='black', linewidth=0.8, linestyle='--')
+
+    ax.set_title(annotations['title'], fontsize=10)
+    ax.grid(alpha=0.2)
+    ax.legend(loc='upper left', fontsize=7)
+
+    if lower is not None:
+        references = set()
+        for name in oscillators:
+            if name == 'MACD_Hist':
+                lower.bar(x, arrays[name], width=0.6, color='gray', alpha=0.5, label=name)
+            else:
+                lower.plot(x, arrays[name], linewidth=1.0, label=name)
+            references.update(OSCILLATORS[name])
+        for value in references:
+            lower.axhline(value, color='gray', linewidth=0.6, linestyle=':')
+        lower.grid(alpha=0.2)
+        lower.legend(loc='upper left', fontsize=7)
+        ax.tick_params(labelbottom=False)
+
+    # Eje X: hora UTC de las velas (posiciones enteras: los huecos no dejan espacios)
+    bottom = lower if lower is not None else ax
+    ticks = x[::max(1, len(x) // 8)]
+    bottom.set_xticks(ticks)
+    bottom.set_xticklabels([datetime.fromtimestamp(int(timestamps[i]), timezone.utc).strftime('%H:%M')
+                            for i in ticks], fontsize=8)
+
+    # Escritura atómica: un render a medias nunca queda en caché
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fig.savefig(tmp_path, format='png', bbox_inches='tight')
+    os.replace(tmp_path, path)
+    return path
+
+
+class ChartRenderer:
+    def __init__(self, enabled=True, directory='charts', bars=60, workers=1, cache_size=100, timeout=30.0):
+        """
+        Args:
+            enabled: Generar gráficos (requiere matplotlib)
+            directory: Carpeta de los PNG (caché en disco)
+            bars: Velas que se dibujan
+            workers: Procesos del pool de render
+            cache_size: PNG que se conservan (los más viejos se borran)
+            timeout: Segundos máximos por render
+        """
+        self.directory = directory
+        self.bars = bars
+        self.workers = workers
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.enabled = enabled and importlib.util.find_spec('matplotlib') is not None
+        if enabled and not self.enabled:
+            log.info("[Charts] matplotlib no está instalado: notificaciones solo con texto")
+        self._pool = None
+        self._cache = OrderedDict()  # clave -> ruta del PNG (orden de uso)
+        self._pending = {}           # clave -> future del render en curso
+        self._load_cache()
+
+    def _load_cache(self):
+        """Registra los PNG de ejecuciones anteriores (por antigüedad) y poda el exceso."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        paths = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp'):
+                # Render interrumpido (el proceso murió antes del os.replace)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            elif name.endswith('.png'):
+                try:
+                    paths.append((os.path.getmtime(path), name[:-4], path))
+                except OSError:
+                    pass
+        for _, key, path in sorted(paths):
+            self._remember(key, path)
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn: el proceso hijo no hereda el event loop ni los hilos (logging, executor)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def _key(self, pair, arrays, annotations):
+        payload = json.dumps(annotations, sort_keys=True)
+        digest = hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+        return f"{pair}_{int(arrays['Timestamp'][-1])}_{digest}"
+
+    async def render(self, pair, arrays, annotations):
+        """
+        PNG del gráfico (ruta), desde la caché o dibujado en el pool.
+
+        Returns:
+            Ruta del PNG, o None si no hay matplotlib o el render falló
+        """
+        if not self.enabled or arrays is None or not len(arrays['Timestamp']):
+            return None
+        arrays = {name: values[-self.bars:] for name, values in arrays.items()}
+        key = self._key(pair, arrays, annotations)
+        path = os.path.join(self.directory, f"{key}.png")
+
+        # Caché: en memoria y en disco (sobrevive reinicios; la escritura es atómica)
+        if os.path.exists(path):
+            self._remember(key, path)
+            return path
+
+        future = self._pending.get(key)
+        if future is None:
+            os.makedirs(self.directory, exist_ok=True)
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_pool(), render_png, path, arrays, annotations)
+            # El render sigue aunque se venza el timeout: al terminar se registra en la caché
+            future.add_done_callback(lambda done: self._render_done(key, done))
+            self._pending[key] = future
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except BrokenProcessPool:
+            return None
+        except Exception as e:
+            log.warning(f"[Charts] No se pudo dibujar {key}: {e!r}")
+            return None
+
+    def _render_done(self, key, future):
+        self._pending.pop(key, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            # Un worker murió: se descarta el pool y el próximo render crea otro
+            log.error(f"[Charts] Pool de render caído ({error}). Se reinicia.")
+            self._pool = None
+        elif error is None:
+            self._remember(key, future.result())
+
+    def _remember(self, key, path):
+        self._cache[key] = path
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            _, old_path = self._cache.popitem(last=False)
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def close(self):
+        """Detiene el pool de render (al apagar el bot)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,69 @@
+"""
+Configuración de arranque del bot.
+
+Prioridad: variables de entorno > archivo JSON (BOT_CONFIG, por defecto
+bot_config.json) > valores por defecto. Así el bot puede arrancar sin
+prompts interactivos bajo un supervisor o después de un redeploy.
+
+Ejemplo de bot_config.json:
+    {
+        "ssid": "...",
+        "telegram_token": "...",
+        "telegram_chat_id": "...",
+        "snapshot_path": "bot_state.npz",
+        "intrabar_lead": 10,
+        "strategies_path": "strategies.json",
+        "risk": {"max_concurrent": 1, "kelly_fraction": 0.25, "max_daily_loss": 0.1},
+        "news": {"path": "economic_calendar.json", "window_minutes": 30, "min_impact": "high"},
+        "correlation": {"window": 100, "min_periods": 30},
+        "logging": {"path": "logs/bot.jsonl", "level": "INFO", "levels": {"telegram_bot": "WARNING"}},
+        "charts": {"enabled": true, "bars": 60, "workers": 1}
+    }
+"""
+import os
+import json
+
+DEFAULTS = {
+    'ssid': '',
+    'telegram_token': '',
+    'telegram_chat_id': '',
+    'snapshot_path': 'bot_state.npz',
+    'snapshot_every': 5,  # Ciclos entre snapshots periódicos
+    'intrabar_lead': 0,   # Segundos antes del cierre para operar señales provisionales (0 = desactivado)
+    'strategies_path': 'strategies.json',  # Activación/parámetros de estrategias (ver strategy_registry.py)
+    'risk': {},           # Parámetros de RiskManager (ver risk_manager.py)
+    'news': {},           # Parámetros de NewsFilter (ver news_filter.py)
+    'correlation': {},    # Parámetros de CorrelationMatrix (ver correlation.py)
+    'logging': {},        # Parámetros de setup_logging (ver bot_logging.py)
+    'charts': {},         # Parámetros de ChartRenderer (ver chart_renderer.py)
+}
+
+# Clave de configuración -> variable de entorno
+ENV_VARS = {
+    'ssid': 'POCKETOPTION_SSID',
+    'telegram_token': 'TELEGRAM_TOKEN',
+    'telegram_chat_id': 'TELEGRAM_CHAT_ID',
+    'snapshot_path': 'BOT_SNAPSHOT',
+    'snapshot_every': 'BOT_SNAPSHOT_EVERY',
+    'intrabar_lead': 'BOT_INTRABAR_LEAD',
+    'strategies_path': 'BOT_STRATEGIES',
+}
+
+
+def load_config(path=None):
+    """Arma la configuración combinando defaults, archivo JSON y entorno."""
+    config = dict(DEFAULTS)
+
+    path = path or os.environ.get('BOT_CONFIG', 'bot_config.json')
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+
+    for key, env_var in ENV_VARS.items():
+        value = os.environ.get(env_var)
+        if value:
+            config[key] = value
+
+    config['snapshot_every'] = int(config['snapshot_every'])
+    config['intrabar_lead'] = int(config['intrabar_lead'])
+    return config
@@ -0,0 +1,214 @@
+"""
+Matriz de correlación móvil de retornos entre pares.
+
+Los retornos logarítmicos de todos los pares se alinean por timestamp de
+vela y se guardan en un buffer circular de `window` filas (N columnas), con
+una máscara de validez: una vela que falta en un par (hueco, par degradado o
+atrasado) no es un retorno 0, queda fuera de las correlaciones de ese par.
+En lugar de recalcular la matriz N×N en cada barrido se mantienen sumas
+acumuladas por pareja de pares, sobre las filas en que ambos tienen retorno:
+    - cantidad de filas en común (N×N) = Σ m·mᵀ
+    - suma de retornos de i donde j es válido (N×N) = Σ r·mᵀ
+    - suma de cuadrados de i donde j es válido (N×N) = Σ r²·mᵀ
+    - productos cruzados (N×N) = Σ r·rᵀ
+Cada bloque de k velas nuevas entra y las k más viejas salen con productos
+matriciales (k×N), y correlation(a, b) es O(1) sobre esas sumas.
+Cada `window` filas las sumas se recalculan exactas para no acumular error
+de redondeo.
+"""
+import math
+
+import numpy as np
+
+
+class CorrelationMatrix:
+    def __init__(self, pairs=(), window=100, min_periods=30, interval=300):
+        """
+        Args:
+            pairs: Pares iniciales (se pueden agregar más con add_pair)
+            window: Velas de la ventana móvil de retornos
+            min_periods: Velas mínimas en la ventana para informar correlaciones
+            interval: Duración de la vela en segundos (alineación por timestamp)
+        """
+        self.window = window
+        self.min_periods = min_periods
+        self.interval = interval
+        self.pairs = []
+        self.index = {}
+        self.returns = np.zeros((window, 0))
+        self.valid = np.zeros((window, 0))
+        self.counts = np.zeros((0, 0))
+        self.sums = np.zeros((0, 0))
+        self.squares = np.zeros((0, 0))
+        self.cross = np.zeros((0, 0))
+        self.last_close = np.zeros(0)
+        self.count = 0
+        self.pos = 0
+        self.last_timestamp = None
+        self._since_exact = 0
+        for pair in pairs:
+            self.add_pair(pair)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def add_pair(self, pair):
+        """Agrega una columna (sin retornos válidos hasta que llegan velas del par)."""
+        if pair in self.index:
+            return self.index[pair]
+        self.index[pair] = len(self.pairs)
+        self.pairs.append(pair)
+        self.returns = np.hstack([self.returns, np.zeros((self.window, 1))])
+        self.valid = np.hstack([self.valid, np.zeros((self.window, 1))])
+        size = len(self.pairs)
+        for name in ('counts', 'sums', 'squares', 'cross'):
+            grown = np.zeros((size, size))
+            grown[:-1, :-1] = getattr(self, name)
+            setattr(self, name, grown)
+        self.last_close = np.append(self.last_close, np.nan)
+        return self.index[pair]
+
+    def update(self, frames, now=None):
+        """
+        Incorpora las velas cerradas nuevas de todos los pares.
+
+        Args:
+            frames: dict par -> CandleFrame (buffers del bot)
+            now: Epoch actual (las velas que cierran después se excluyen)
+
+        Returns:
+            Filas (velas) agregadas a la ventana
+        """
+        frames = {pair: frame for pair, frame in frames.items() if frame is not None and not frame.empty}
+        if not frames:
+            return 0
+        for pair in frames:
+            self.add_pair(pair)
+
+        interval = self.interval
+        # Última vela cerrada de cada par; el horizonte lo marca el par más al día.
+        # Un par atrasado o degradado no frena a los demás: sus velas faltantes
+        # quedan como retornos inválidos (fuera de sus correlaciones)
+        horizon = None
+        for frame in frames.values():
+            last = int(frame['Timestamp'][-1])
+            if now is not None and last + interval > now:
+                last -= interval
+            horizon = last if horizon is None else max(horizon, last)
+
+        start = horizon - (self.window - 1) * interval
+        if self.last_timestamp is not None:
+            if self.last_timestamp >= horizon:
+                return 0
+            if self.last_timestamp >= start:
+                start = self.last_timestamp + interval
+            else:
+                # Hueco más largo que la ventana: se reconstruye desde los buffers
+                self._reset()
+        grid = np.arange(start, horizon + 1, interval, dtype=np.int64)
+
+        # Cierres de cada par en la grilla (NaN si el par no tiene esa vela)
+        closes = np.full((len(grid) + 1, len(self.pairs)), np.nan)
+        closes[0] = self.last_close
+        for pair, frame in frames.items():
+            timestamps = frame['Timestamp']
+            close = frame['Close']
+            positions = np.searchsorted(timestamps, grid)
+            found = positions < len(timestamps)
+            found[found] = timestamps[positions[found]] == grid[found]
+            closes[1:, self.index[pair]][found] = close[positions[found]]
+
+        # Retorno válido solo entre dos velas consecutivas presentes
+        with np.errstate(invalid='ignore', divide='ignore'):
+            block = np.log(closes[1:] / closes[:-1])
+        valid = np.isfinite(block)
+        block[~valid] = 0.0
+
+        self._push(block, valid.astype(np.float64))
+        self.last_close = closes[-1]
+        self.last_timestamp = int(grid[-1])
+        return len(grid)
+
+    def _reset(self):
+        self.returns[:] = 0.0
+        self.valid[:] = 0.0
+        for matrix in (self.counts, self.sums, self.squares, self.cross):
+            matrix[:] = 0.0
+        self.last_close[:] = np.nan
+        self.count = 0
+        self.pos = 0
+        self._since_exact = 0
+
+    @staticmethod
+    def _stats(returns, valid):
+        """(filas en común, Σ r·mᵀ, Σ r²·mᵀ, Σ r·rᵀ) de un bloque (los inválidos son 0)."""
+        return valid.T @ valid, returns.T @ valid, (returns * returns).T @ valid, returns.T @ returns
+
+    def _push(self, block, valid):
+        k = len(block)
+        if k >= self.window:
+            self.returns[:] = block[-self.window:]
+            self.valid[:] = valid[-self.window:]
+            self.pos = 0
+            self.count = self.window
+            self._exact()
+            return
+
+        rows = (self.pos + np.arange(k)) % self.window
+        # Entran las k filas nuevas y salen las k que se sobrescriben (ceros si la ventana no estaba llena)
+        added = self._stats(block, valid)
+        removed = self._stats(self.returns[rows], self.valid[rows])
+        for name, plus, minus in zip(('counts', 'sums', 'squares', 'cross'), added, removed):
+            setattr(self, name, getattr(self, name) + plus - minus)
+        self.returns[rows] = block
+        self.valid[rows] = valid
+        self.pos = (self.pos + k) % self.window
+        self.count = min(self.count + k, self.window)
+
+        self._since_exact += k
+        if self._since_exact >= self.window:
+            self._exact()
+
+    def _exact(self):
+        self.counts, self.sums, self.squares, self.cross = self._stats(self.returns, self.valid)
+        self._since_exact = 0
+
+    def correlation(self, pair_a, pair_b):
+        """
+        Correlación de retornos entre dos pares sobre las velas que ambos tienen
+        en la ventana (O(1)), o None sin datos suficientes.
+        """
+        i = self.index.get(pair_a)
+        j = self.index.get(pair_b)
+        if i is None or j is None:
+            return None
+        n = self.counts[i, j]
+        if n < self.min_periods:
+            return None
+        var_i = self.squares[i, j] - self.sums[i, j] ** 2 / n
+        var_j = self.squares[j, i] - self.sums[j, i] ** 2 / n
+        if var_i <= 1e-18 or var_j <= 1e-18:
+            return None
+        cov = self.cross[i, j] - self.sums[i, j] * self.sums[j, i] / n
+        return max(-1.0, min(1.0, float(cov / math.sqrt(var_i * var_j))))
+
+    def correlated(self, pair, threshold=0.7):
+        """Pares con |correlación| >= threshold: lista de (par, correlación)."""
+        result = []
+        for other in self.pairs:
+            if other == pair:
+                continue
+            rho = self.correlation(pair, other)
+            if rho is not None and abs(rho) >= threshold:
+                result.append((other, rho))
+        return result
+
+    def matrix(self):
+        """Matriz N×N completa (para reportes); NaN donde no hay datos suficientes."""
+        n = self.counts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = self.squares - self.sums ** 2 / n
+            cov = self.cross - self.sums * self.sums.T / n
+            corr = cov / np.sqrt(var * var.T)
+        corr[(n < self.min_periods) | (var <= 1e-18) | (var.T <= 1e-18) | ~np.isfinite(corr)] = np.nan
+        return np.clip(corr, -1.0, 1.0)
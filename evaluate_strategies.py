@@ -0,0 +1,332 @@
+"""
+Evaluación de robustez de las estrategias sobre velas históricas.
+
+Para cada estrategia del repo (incluidas las desactivadas):
+    1. Backtest vela a vela con la misma ventana que usa el bot (LOOKBACK)
+       y expiración según la duración que devuelve la estrategia.
+    2. Walk-forward: la historia se corta en bloques consecutivos; en cada
+       bloque se decide "activar" con lo visto en los anteriores y se mide el
+       resultado fuera de muestra.
+    3. Monte Carlo: miles de remuestreos de la secuencia de operaciones
+       (vectorizado en NumPy) para el intervalo de confianza del win rate
+       frente al break-even del payout y el riesgo de ruina.
+
+Cada estrategia se evalúa en un proceso aparte.
+
+Uso:
+    python evaluate_strategies.py --data velas_eurusd.csv velas_gbpusd.json
+    python evaluate_strategies.py --snapshot bot_state.npz
+    python evaluate_strategies.py --synthetic 5000          # prueba sin datos
+Formatos: CSV con columnas time,open,high,low,close; JSON con la lista de
+velas de la API; o el snapshot .npz del bot.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from candle_frame import CandleFrame, BASE_COLUMNS
+from feature_graph import FeatureGraph
+from analysis import MarketAnalyzer
+from patterns import PatternRecognizer
+from pair_context import PairContext
+from strategy_registry import discover_strategies
+
+INTERVAL = 300
+LOOKBACK = 300
+
+# Productores que miran velas futuras dentro de la serie (extremos locales
+# centrados): en el backtest se recalculan en cada paso solo con el pasado.
+PER_STEP_PRODUCERS = ('chart_patterns',)
+
+# Remuestreos por bloque (limita la memoria de las matrices de Monte Carlo)
+MC_CHUNK = 1000
+
+
+# --- Datos ---
+
+def _arrays_from_candles(candles):
+    frame = CandleFrame(capacity=len(candles))
+    frame.load(candles)
+    return {name: frame[name].copy() for name in BASE_COLUMNS}
+
+
+def load_dataset(path):
+    """Devuelve {nombre: arrays OHLC} desde un CSV, JSON de la API o snapshot .npz."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    if path.endswith('.npz'):
+        from state_snapshot import load_snapshot
+        frames = load_snapshot(path, INTERVAL, max_age=float('inf'))
+        return {f"{name}:{pair}": {col: frame[col].copy() for col in BASE_COLUMNS}
+                for pair, frame in frames.items()}
+    if path.endswith('.csv'):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            candles = list(csv.DictReader(f))
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            candles = json.load(f)
+    return {name: _arrays_from_candles(candles)}
+
+
+def synthetic_dataset(bars, seed=0, start=1_700_000_000):
+    """Random walk (sin ventaja posible): sirve para verificar que todo da ~50%."""
+    rng = np.random.default_rng(seed)
+    close = 1.08 + np.cumsum(rng.normal(0, 0.0005, bars))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 0.0003, bars))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 0.0003, bars))
+    return {'synthetic': {
+        'Timestamp': start + np.arange(bars, dtype=np.int64) * INTERVAL,
+        'Open': open_, 'High': high, 'Low': low, 'Close': close,
+    }}
+
+
+# --- Estrategias ---
+
+def _instantiate(module_name, class_name):
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+# --- Backtest ---
+
+def backtest(strategy, arrays, lookback=LOOKBACK, interval=INTERVAL):
+    """
+    Recorre la serie vela a vela. Una operación a la vez por estrategia.
+
+    Returns:
+        (outcomes, bars): arrays con 1/0 por operación (empates excluidos) y
+        la posición relativa (0-1) de cada operación en la serie
+    """
+    graph = FeatureGraph()
+    MarketAnalyzer().register_features(graph)
+    PatternRecognizer().register_features(graph)
+    plan = graph.plan(strategy.requires)
+    upfront = [name for name in plan if name not in PER_STEP_PRODUCERS]
+    per_step = [name for name in plan if name in PER_STEP_PRODUCERS]
+
+    n = len(arrays['Timestamp'])
+    full = CandleFrame.restore(arrays, capacity=n)
+    graph.evaluate(full, upfront)
+    columns = {name: full[name] for name in full.columns}
+    df = full.to_pandas() if not per_step else None
+    close = full['Close']
+
+    # La estructura de mercado avanza vela a vela como en el bot (también con operación abierta)
+    context = PairContext()
+    outcomes = []
+    positions = []
+    busy_until = -1
+    warmup = min(lookback, n) // 2
+    for i in range(warmup, n - 1):
+        context.update(full, closed=i + 1)
+        if i <= busy_until:
+            continue
+        start = max(0, i - lookback + 1)
+        if per_step:
+            window = CandleFrame.restore({name: values[start:i + 1] for name, values in columns.items()},
+                                         capacity=i + 1 - start)
+            graph.evaluate(window, per_step)
+            view = window.to_pandas()
+        else:
+            view = df.iloc[start:i + 1]
+
+        action, _, duration = strategy.get_signal(view, context)
+        if action not in ('BUY', 'SELL'):
+            continue
+        expiry = i + max(1, int(duration) // interval)
+        if expiry >= n:
+            break
+        move = close[expiry] - close[i]
+        busy_until = expiry
+        if move == 0:
+            continue
+        outcomes.append(1 if (move > 0) == (action == 'BUY') else 0)
+        positions.append(i / n)
+    return np.array(outcomes, dtype=np.int8), np.array(positions)
+
+
+# --- Estadística ---
+
+def wilson_interval(wins, n, z=1.96):
+    if n == 0:
+        return 0.0, 1.0
+    p = wins / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return center - half, center + half
+
+
+def walk_forward(outcomes, positions, folds, break_even):
+    """
+    Bloques consecutivos; en el bloque k se "activa" la estrategia si el win
+    rate de los bloques anteriores supera el break-even.
+    """
+    fold_ids = np.minimum((positions * folds).astype(int), folds - 1)
+    wins = np.bincount(fold_ids, weights=outcomes, minlength=folds)
+    counts = np.bincount(fold_ids, minlength=folds)
+    report = []
+    oos_wins = oos_trades = 0
+    for k in range(folds):
+        in_sample = counts[:k].sum()
+        enabled = k > 0 and in_sample > 0 and wins[:k].sum() / in_sample > break_even
+        if enabled:
+            oos_wins += wins[k]
+            oos_trades += counts[k]
+        report.append({
+            'fold': k + 1,
+            'trades': int(counts[k]),
+            'win_rate': float(wins[k] / counts[k]) if counts[k] else None,
+            'enabled': bool(enabled),
+        })
+    return report, (oos_wins / oos_trades if oos_trades else None), int(oos_trades)
+
+
+def monte_carlo(outcomes, payout, resamples, stake, ruin_drawdown, horizon=None, seed=0):
+    """
+    Bootstrap vectorizado de la secuencia de operaciones.
+
+    Returns:
+        (percentiles 2.5/50/97.5 del win rate, P(win rate < break-even), riesgo de ruina)
+    """
+    n = len(outcomes)
+    horizon = horizon or n
+    rng = np.random.default_rng(seed)
+    break_even = 1 / (1 + payout)
+    # Log-retorno por operación con stake fijo como fracción del capital
+    log_win = np.log1p(stake * payout)
+    log_loss = np.log1p(-stake)
+    ruin_level = np.log1p(-ruin_drawdown)
+
+    win_rates = np.empty(resamples)
+    ruined = 0
+    for start in range(0, resamples, MC_CHUNK):
+        size = min(MC_CHUNK, resamples - start)
+        sample = outcomes[rng.integers(0, n, size=(size, horizon))]
+        win_rates[start:start + size] = sample.mean(axis=1)
+        equity = np.cumsum(np.where(sample == 1, log_win, log_loss), axis=1)
+        ruined += int((equity.min(axis=1) <= ruin_level).sum())
+
+    percentiles = np.percentile(win_rates, [2.5, 50, 97.5])
+    return percentiles, float((win_rates < break_even).mean()), ruined / resamples
+
+
+def evaluate_strategy(module_name, class_name, datasets, options):
+    """Backtest + walk-forward + Monte Carlo de una estrategia (se ejecuta en un proceso del pool)."""
+    started = time.perf_counter()
+    strategy = _instantiate(module_name, class_name)
+    payout = options['payout']
+    break_even = 1 / (1 + payout)
+
+    outcomes, positions = [], []
+    for arrays in datasets.values():
+        result, pos = backtest(strategy, arrays)
+        outcomes.append(result)
+        positions.append(pos)
+    outcomes = np.concatenate(outcomes) if outcomes else np.empty(0, dtype=np.int8)
+    positions = np.concatenate(positions) if positions else np.empty(0)
+
+    report = {'strategy': strategy.name, 'class': class_name, 'trades': int(len(outcomes)),
+              'break_even': break_even}
+    if len(outcomes):
+        wins = int(outcomes.sum())
+        report['win_rate'] = wins / len(outcomes)
+        report['wilson_95'] = wilson_interval(wins, len(outcomes))
+        report['folds'], report['oos_win_rate'], report['oos_trades'] = walk_forward(
+            outcomes, positions, options['folds'], break_even
+        )
+        percentiles, p_below, ruin = monte_carlo(
+            outcomes, payout, options['resamples'], options['stake'], options['ruin'],
+            horizon=options.get('horizon'), seed=options['seed']
+        )
+        report['mc_win_rate'] = [float(x) for x in percentiles]
+        report['p_below_break_even'] = p_below
+        report['risk_of_ruin'] = ruin
+    report['seconds'] = time.perf_counter() - started
+    return report
+
+
+def format_report(report):
+    lines = [f"\n=== {report['strategy']} ({report['class']}) ==="]
+    if not report['trades']:
+        lines.append("  Sin operaciones en los datos.")
+        return '\n'.join(lines)
+    low, high = report['wilson_95']
+    mc_low, mc_mid, mc_high = report['mc_win_rate']
+    lines += [
+        f"  Operaciones: {report['trades']}  Win rate: {report['win_rate']:.1%} "
+        f"(IC95 Wilson {low:.1%}-{high:.1%})  Break-even: {report['break_even']:.1%}",
+        f"  Monte Carlo: mediana {mc_mid:.1%}, IC95 {mc_low:.1%}-{mc_high:.1%}, "
+        f"P(< break-even) = {report['p_below_break_even']:.1%}, riesgo de ruina = {report['risk_of_ruin']:.1%}",
+        "  Walk-forward: " + ', '.join(
+            f"B{f['fold']}: {f['trades']} ops"
+            + (f" {f['win_rate']:.0%}" if f['win_rate'] is not None else '')
+            + (' *' if f['enabled'] else '')
+            for f in report['folds']
+        ),
+    ]
+    if report['oos_win_rate'] is not None:
+        lines.append(f"  Fuera de muestra (bloques * activados): {report['oos_win_rate']:.1%} "
+                     f"en {report['oos_trades']} ops")
+    verdict = 'ROBUSTA' if low > report['break_even'] else (
+        'SIN VENTAJA' if high < report['break_even'] else 'NO CONCLUYENTE')
+    lines.append(f"  Veredicto: {verdict}  ({report['seconds']:.1f}s)")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Walk-forward y Monte Carlo de las estrategias")
+    parser.add_argument('--data', nargs='*', default=[], help="Archivos de velas (CSV/JSON)")
+    parser.add_argument('--snapshot', help="Snapshot .npz del bot")
+    parser.add_argument('--synthetic', type=int, default=0, help="Velas de random walk para prueba")
+    parser.add_argument('--strategies', nargs='*', help="Filtrar por nombre de clase")
+    parser.add_argument('--payout', type=float, default=0.92)
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--resamples', type=int, default=10000)
+    parser.add_argument('--horizon', type=int, default=None, help="Operaciones por trayectoria (default: las del backtest)")
+    parser.add_argument('--stake', type=float, default=0.02, help="Fracción del capital por operación")
+    parser.add_argument('--ruin', type=float, default=0.5, help="Drawdown que se considera ruina")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Guardar el reporte en JSON")
+    args = parser.parse_args(argv)
+
+    datasets = {}
+    for path in args.data:
+        datasets.update(load_dataset(path))
+    if args.snapshot:
+        datasets.update(load_dataset(args.snapshot))
+    if args.synthetic:
+        datasets.update(synthetic_dataset(args.synthetic, args.seed))
+    if not datasets:
+        parser.error("Indicar --data, --snapshot o --synthetic")
+
+    strategies = discover_strategies()
+    if args.strategies:
+        strategies = [s for s in strategies if s[1] in args.strategies]
+    print(f"Evaluando {len(strategies)} estrategias sobre {len(datasets)} series "
+          f"({sum(len(a['Timestamp']) for a in datasets.values())} velas)...")
+
+    options = {'payout': args.payout, 'folds': args.folds, 'resamples': args.resamples,
+               'horizon': args.horizon, 'stake': args.stake, 'ruin': args.ruin, 'seed': args.seed}
+    reports = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(evaluate_strategy, module, cls, datasets, options) for module, cls in strategies]
+        for future in futures:
+            report = future.result()
+            reports.append(report)
+            print(format_report(report))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False, default=float)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
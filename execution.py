@@ -0,0 +1,390 @@
+"""
+Capa de ejecución de órdenes.
+
+Normaliza las respuestas del broker en un único OrderResult, mide latencias
+(señal -> envío y envío -> confirmación), identifica cada orden con un
+client_order_id propio y aplica una política de reintento segura: solo se
+reintenta si se comprueba que la orden no quedó abierta en el broker.
+
+Los resultados que no se pueden determinar quedan como UNKNOWN y se
+concilian después contra el historial de operaciones del broker, en lugar
+de asumirlos como pérdida.
+"""
+import logging
+import asyncio
+import time
+import uuid
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+# Payout de respaldo si la respuesta de una operación ganada no trae profit
+FALLBACK_PAYOUT = 0.92
+
+
+def _lower_keys(data):
+    return {str(k).lower(): v for k, v in data.items()}
+
+
+def _split_response(raw):
+    """
+    Separa la respuesta del SDK en (trade_id, info).
+
+    Formatos conocidos: (trade_id, dict), dict, bool, str y número.
+    `info` es un dict normalizado con al menos 'result' si se pudo inferir.
+    """
+    if isinstance(raw, tuple) and len(raw) >= 2:
+        trade_id, info = raw[0], raw[1]
+        if isinstance(info, dict):
+            info = _lower_keys(info)
+            return trade_id, info
+        return trade_id, {}
+    if isinstance(raw, dict):
+        info = _lower_keys(raw)
+        return info.get('id') or info.get('trade_id'), info
+    if isinstance(raw, bool):
+        return None, {'result': 'win' if raw else 'loss'}
+    if isinstance(raw, str):
+        result = raw.lower()
+        if result in ('win', 'won', 'ganada', 'true'):
+            return None, {'result': 'win'}
+        if result in ('loss', 'lost', 'perdida', 'false'):
+            return None, {'result': 'loss'}
+        if result in ('draw', 'tie', 'empate'):
+            return None, {'result': 'draw'}
+        return None, {}
+    if isinstance(raw, (int, float)):
+        return None, {'result': 'win' if raw > 0 else 'loss'}
+    return None, {}
+
+
+class OrderResult:
+    """Estado normalizado de una orden."""
+
+    PENDING = 'PENDING'      # Enviada y confirmada, esperando expiración
+    WIN = 'WIN'
+    LOSS = 'LOSS'
+    DRAW = 'DRAW'
+    REJECTED = 'REJECTED'    # El broker no abrió la operación
+    UNKNOWN = 'UNKNOWN'      # No se sabe si abrió o cómo terminó: conciliar
+
+    FINAL = (WIN, LOSS, DRAW, REJECTED)
+
+    def __init__(self, client_order_id, pair, action, amount, duration, signal_time=None):
+        self.client_order_id = client_order_id
+        self.pair = pair
+        self.action = action
+        self.amount = amount
+        self.duration = duration
+        self.status = self.PENDING
+        self.trade_id = None
+        self.profit = 0.0
+        self.open_price = 0.0
+        self.close_price = 0.0
+        self.error = None
+        self.attempts = 0
+        self.signal_time = signal_time
+        self.sent_at = None
+        self.ack_at = None
+        self.closed_at = None
+
+    def __repr__(self):
+        return (f"OrderResult({self.client_order_id}, {self.pair} {self.action} {self.amount}, "
+                f"{self.status}, trade_id={self.trade_id}, profit={self.profit})")
+
+    @property
+    def is_final(self):
+        return self.status in self.FINAL
+
+    @property
+    def is_win(self):
+        return self.status == self.WIN
+
+    @property
+    def result(self):
+        """Resultado en el formato de feedback.db ('win', 'loss', 'draw', 'unknown')."""
+        return {self.WIN: 'win', self.LOSS: 'loss', self.DRAW: 'draw'}.get(self.status, 'unknown')
+
+    @property
+    def signal_latency_ms(self):
+        """Milisegundos entre la detección de la señal y el envío de la orden."""
+        if self.signal_time is None or self.sent_at is None:
+            return None
+        return (self.sent_at - self.signal_time) * 1000
+
+    @property
+    def ack_latency_ms(self):
+        """Milisegundos entre el envío y la confirmación del broker."""
+        if self.sent_at is None or self.ack_at is None:
+            return None
+        return (self.ack_at - self.sent_at) * 1000
+
+    def apply(self, info):
+        """Actualiza precios y resultado desde un dict de operación del broker."""
+        self.open_price = info.get('openprice', info.get('open_price', self.open_price)) or self.open_price
+        self.close_price = info.get('closeprice', info.get('close_price', self.close_price)) or self.close_price
+
+        result = str(info.get('result', '')).lower()
+        if not result and 'win' in info:
+            result = 'win' if info['win'] else 'loss'
+        if result in ('win', 'won'):
+            self.status = self.WIN
+            self.profit = info.get('profit', self.amount * FALLBACK_PAYOUT)
+        elif result in ('loss', 'lost'):
+            self.status = self.LOSS
+            self.profit = -self.amount
+        elif result in ('draw', 'tie'):
+            self.status = self.DRAW
+            self.profit = 0.0
+        else:
+            return False
+        self.closed_at = time.time()
+        return True
+
+
+class OrderExecutor:
+    def __init__(self, api, ack_timeout=10.0, result_margin=30.0, max_retries=1, retry_window=3.0,
+                 reconcile_deadline=900.0, confirm_grace=2.0):
+        """
+        Args:
+            api: Cliente del broker (PocketOptionAsync)
+            ack_timeout: Segundos para que el broker confirme la apertura
+            result_margin: Segundos extra después de la expiración para obtener el resultado
+            max_retries: Reintentos de envío si la orden seguro no quedó abierta
+            retry_window: Segundos desde la señal en los que todavía tiene sentido reintentar
+            reconcile_deadline: Segundos después de la expiración en los que se sigue
+                conciliando una orden UNKNOWN; pasado ese plazo se libera sin resultado
+            confirm_grace: Segundos que se sigue buscando en el historial una orden cuyo
+                envío falló antes de darla por no abierta (el broker la lista con demora)
+        """
+        self.api = api
+        self.ack_timeout = ack_timeout
+        self.result_margin = result_margin
+        self.max_retries = max_retries
+        self.retry_window = retry_window
+        self.reconcile_deadline = reconcile_deadline
+        self.confirm_grace = confirm_grace
+        self.orders = {}                   # client_order_id -> OrderResult
+        self.unknown = {}                  # client_order_id -> OrderResult a conciliar
+        self.latencies = deque(maxlen=100)  # (señal->envío, envío->ack) en ms
+
+    @staticmethod
+    def new_order_id():
+        return uuid.uuid4().hex[:16]
+
+    async def place(self, pair, action, amount, duration, signal_time=None, client_order_id=None):
+        """
+        Envía la orden y espera la confirmación (sin esperar el resultado).
+
+        Es idempotente por client_order_id: si la orden ya se envió, devuelve
+        el mismo OrderResult sin volver a enviarla.
+        """
+        client_order_id = client_order_id or self.new_order_id()
+        order = self.orders.get(client_order_id)
+        if order is not None:
+            return order
+        order = self.orders[client_order_id] = OrderResult(
+            client_order_id, pair, action, amount, duration, signal_time
+        )
+
+        send = self.api.buy if action == 'BUY' else self.api.sell
+        while True:
+            order.attempts += 1
+            order.sent_at = time.time()
+            try:
+                raw = await asyncio.wait_for(
+                    send(asset=pair, amount=amount, time=duration, check_win=False),
+                    timeout=self.ack_timeout
+                )
+            except Exception as e:
+                order.error = str(e) or type(e).__name__
+                # ¿Llegó a abrirse igual? Si sí, se adopta. Solo se reintenta si el
+                # historial confirma que no existe tras el margen de gracia (nunca a
+                # ciegas: duplicaría la orden). Si no, queda UNKNOWN y decide la conciliación
+                opened = await self._find_opened(order, grace=self.confirm_grace)
+                if opened:
+                    order.trade_id = opened
+                    order.ack_at = time.time()
+                    break
+                if opened is False and self._can_retry(order):
+                    log.warning(f"[Exec] Envío fallido ({order.error}). Reintentando {order.client_order_id}...")
+                    continue
+                order.status = OrderResult.UNKNOWN
+                break
+
+            order.ack_at = time.time()
+            trade_id, info = _split_response(raw)
+            if trade_id is None:
+                order.status = OrderResult.REJECTED
+                order.error = f"Respuesta sin id de operación: {raw}"
+            else:
+                order.trade_id = trade_id
+                order.apply(info)
+            break
+
+        if order.status == OrderResult.UNKNOWN:
+            self.unknown[client_order_id] = order
+        self._record_latency(order)
+        return order
+
+    def _can_retry(self, order):
+        if order.attempts > self.max_retries:
+            return False
+        if order.signal_time is not None and time.time() - order.signal_time > self.retry_window:
+            return False
+        return True
+
+    def _record_latency(self, order):
+        signal_ms, ack_ms = order.signal_latency_ms, order.ack_latency_ms
+        if ack_ms is not None:
+            self.latencies.append((signal_ms, ack_ms))
+        signal_txt = f"{signal_ms:.0f}ms" if signal_ms is not None else '-'
+        ack_txt = f"{ack_ms:.0f}ms" if ack_ms is not None else '-'
+        log.info(f"[Exec] {order.client_order_id} {order.status} señal->envío {signal_txt}, "
+                 f"envío->ack {ack_txt} (intentos: {order.attempts})",
+                 extra={'order_id': order.client_order_id, 'signal_ms': signal_ms, 'ack_ms': ack_ms,
+                        'attempts': order.attempts})
+
+    async def wait_result(self, order):
+        """Espera el resultado de una orden confirmada. Si no llega, queda UNKNOWN."""
+        if order.is_final or order.trade_id is None:
+            return order
+        check_win = getattr(self.api, 'check_win', None)
+        try:
+            if callable(check_win):
+                raw = await asyncio.wait_for(check_win(order.trade_id),
+                                             timeout=order.duration + self.result_margin)
+                _, info = _split_response(raw if not isinstance(raw, dict) else (order.trade_id, raw))
+                if order.apply(info):
+                    return order
+            else:
+                await asyncio.sleep(order.duration)
+        except Exception as e:
+            order.error = str(e) or type(e).__name__
+
+        # Último intento: buscar la operación en el historial
+        if not await self._resolve_from_history(order):
+            order.status = OrderResult.UNKNOWN
+            self.unknown[order.client_order_id] = order
+            log.warning(f"[Exec] Resultado desconocido para {order.client_order_id} ({order.error}). Se conciliará.")
+        return order
+
+    def mark_unknown(self, order, error=None):
+        """Deja una orden sin resultado como UNKNOWN para conciliarla después."""
+        if order.is_final:
+            return
+        order.status = OrderResult.UNKNOWN
+        order.error = error or order.error
+        self.unknown[order.client_order_id] = order
+
+    def forget(self, client_order_id):
+        """Libera una orden ya registrada (final); las UNKNOWN se mantienen hasta conciliar."""
+        if client_order_id not in self.unknown:
+            self.orders.pop(client_order_id, None)
+
+    async def reconcile(self):
+        """
+        Concilia órdenes UNKNOWN contra el historial. Devuelve las que se resolvieron
+        y las que vencieron el plazo de conciliación (estas siguen UNKNOWN).
+        """
+        resolved = []
+        for client_order_id, order in list(self.unknown.items()):
+            if order.trade_id is None:
+                opened = await self._find_opened(order)
+                if opened is False:
+                    order.status = OrderResult.REJECTED
+                elif opened is not None:
+                    order.trade_id = opened
+            if order.status != OrderResult.REJECTED and not await self._resolve_from_history(order):
+                if not self._reconcile_expired(order):
+                    continue
+                log.warning(f"[Exec] {client_order_id} sin conciliar tras {self.reconcile_deadline:.0f}s "
+                            f"de la expiración. Se libera como UNKNOWN.")
+            else:
+                log.info(f"[Exec] Conciliada {client_order_id}: {order.status}")
+            del self.unknown[client_order_id]
+            resolved.append(order)
+        return resolved
+
+    def _reconcile_expired(self, order):
+        expires_at = (order.sent_at or order.signal_time or time.time()) + order.duration + self.result_margin
+        return time.time() > expires_at + self.reconcile_deadline
+
+    async def _deals(self, *names):
+        """Llama al primer método de historial disponible en el SDK. None si no hay."""
+        for name in names:
+            method = getattr(self.api, name, None)
+            if callable(method):
+                try:
+                    deals = await asyncio.wait_for(method(), timeout=self.ack_timeout)
+                except Exception as e:
+                    log.error(f"[Exec] Error consultando {name}: {e}")
+                    return None
+                return [_lower_keys(d) for d in deals or [] if isinstance(d, dict)]
+        return None
+
+    def _claimed_ids(self, order):
+        """trade_id de las demás órdenes registradas (no se pueden adoptar)."""
+        return {str(other.trade_id) for other in self.orders.values()
+                if other is not order and other.trade_id is not None}
+
+    def _matches(self, order, deal, claimed=()):
+        if order.trade_id is not None:
+            return str(deal.get('id')) == str(order.trade_id)
+        # Sin id: misma moneda, monto y dirección, abierta después del envío y
+        # que no sea una operación que ya pertenece a otra orden
+        if str(deal.get('id')) in claimed:
+            return False
+        if deal.get('asset') != order.pair or float(deal.get('amount', -1)) != float(order.amount):
+            return False
+        command = deal.get('command', deal.get('action'))
+        if command is not None and str(command).lower() not in ('0', '1', 'call', 'put', 'buy', 'sell'):
+            return False
+        if command is not None:
+            is_buy = str(command).lower() in ('0', 'call', 'buy')
+            if is_buy != (order.action == 'BUY'):
+                return False
+        opened = deal.get('opentimestamp', deal.get('open_time'))
+        return not isinstance(opened, (int, float)) or opened >= (order.sent_at or 0) - 5
+
+    async def _find_opened(self, order, grace=0.0):
+        """
+        Busca la orden entre las operaciones abiertas/cerradas del broker.
+        Con `grace`, la sigue buscando durante esos segundos antes de darla por no abierta.
+
+        Returns:
+            trade_id si la encontró, False si el historial confirma que no
+            existe, None si no se pudo consultar.
+        """
+        deadline = time.time() + grace
+        while True:
+            found_history = False
+            claimed = self._claimed_ids(order)
+            for names in (('opened_deals', 'get_opened_deals'), ('closed_deals', 'get_closed_deals')):
+                deals = await self._deals(*names)
+                if deals is None:
+                    continue
+                found_history = True
+                for deal in deals:
+                    if self._matches(order, deal, claimed):
+                        return deal.get('id')
+            remaining = deadline - time.time()
+            if not found_history or remaining <= 0:
+                return False if found_history else None
+            await asyncio.sleep(min(0.5, remaining))
+
+    async def _resolve_from_history(self, order):
+        deals = await self._deals('closed_deals', 'get_closed_deals')
+        claimed = self._claimed_ids(order) if order.trade_id is None else ()
+        for deal in deals or ():
+            if self._matches(order, deal, claimed):
+                order.trade_id = order.trade_id or deal.get('id')
+                if order.apply(deal):
+                    return True
+                # Operaciones cerradas sin campo 'result': se infiere del profit
+                profit = deal.get('profit')
+                if isinstance(profit, (int, float)):
+                    order.apply({'result': 'win' if profit > 0 else ('draw' if profit == 0 else 'loss'),
+                                 'profit': profit})
+                    return True
+        return False
@@ -1,5 +1,21 @@
+"""
+Extrae el texto de los PDFs del curso.
+
+Cada PDF se procesa en un proceso aparte y su resultado (texto por página)
+se cachea en .pdf_cache/<sha256>.json: los PDFs que no cambiaron no se
+vuelven a leer. Genera:
+    - pdf_pages.json: [{"doc", "page", "text"}, ...] para knowledge_base.py
+    - pdf_strategies_content.txt: volcado plano (formato anterior)
+
+Uso:
+    python extract_texts.py [--workers N] [--force]
+"""
 import os
-from pypdf import PdfReader
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 pdf_files = [
     "11. Soportes y Resistencias, Tendencias.pdf",
@@ -13,24 +29,105 @@ pdf_files = [
 ]
 
 output_file = "pdf_strategies_content.txt"
+pages_file = "pdf_pages.json"
+cache_dir = ".pdf_cache"
 
-with open(output_file, "w", encoding="utf-8") as f_out:
-    for pdf_file in pdf_files:
-        if os.path.exists(pdf_file):
-            try:
-                print(f"Extracting: {pdf_file}")
-                reader = PdfReader(pdf_file)
-                f_out.write(f"\n\n--- START OF {pdf_file} ---\n\n")
-                for page in reader.pages:
-                    text = page.extract_text()
-                    if text:
-                        f_out.write(text)
-                        f_out.write("\n")
-                f_out.write(f"\n\n--- END OF {pdf_file} ---\n\n")
-            except Exception as e:
-                print(f"Error reading {pdf_file}: {e}")
-                f_out.write(f"Error reading {pdf_file}: {e}\n")
-        else:
+
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_pdf(pdf_file):
+    """Extrae el texto página por página (se ejecuta en un proceso del pool)."""
+    from pypdf import PdfReader
+    reader = PdfReader(pdf_file)
+    return [page.extract_text() or '' for page in reader.pages]
+
+
+def load_cached(digest):
+    path = os.path.join(cache_dir, f"{digest}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['pages']
+
+
+def save_cached(digest, pdf_file, pages):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{digest}.json")
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump({'file': pdf_file, 'pages': pages}, f, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+def extract_all(files, workers=None, force=False):
+    """
+    Devuelve {pdf: [texto por página]} usando la caché por hash.
+    Los PDFs nuevos o modificados se extraen en paralelo.
+    """
+    results = {}
+    pending = {}
+    for pdf_file in files:
+        if not os.path.exists(pdf_file):
             print(f"File not found: {pdf_file}")
+            continue
+        digest = file_hash(pdf_file)
+        pages = None if force else load_cached(digest)
+        if pages is not None:
+            print(f"Cached: {pdf_file}")
+            results[pdf_file] = pages
+        else:
+            pending[pdf_file] = digest
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pdf_file: pool.submit(extract_pdf, pdf_file) for pdf_file in pending}
+            for pdf_file, future in futures.items():
+                try:
+                    pages = future.result()
+                except Exception as e:
+                    print(f"Error reading {pdf_file}: {e}")
+                    continue
+                print(f"Extracted: {pdf_file} ({len(pages)} páginas)")
+                save_cached(pending[pdf_file], pdf_file, pages)
+                results[pdf_file] = pages
+
+    # Mismo orden que la lista de entrada
+    return {pdf_file: results[pdf_file] for pdf_file in files if pdf_file in results}
+
+
+def write_outputs(documents):
+    with open(output_file, "w", encoding="utf-8") as f_out:
+        for pdf_file, pages in documents.items():
+            f_out.write(f"\n\n--- START OF {pdf_file} ---\n\n")
+            for text in pages:
+                if text:
+                    f_out.write(text)
+                    f_out.write("\n")
+            f_out.write(f"\n\n--- END OF {pdf_file} ---\n\n")
+
+    records = [{'doc': pdf_file, 'page': number, 'text': text}
+               for pdf_file, pages in documents.items()
+               for number, text in enumerate(pages, start=1) if text.strip()]
+    with open(pages_file, "w", encoding="utf-8") as f_out:
+        json.dump(records, f_out, ensure_ascii=False)
+    return len(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extrae el texto de los PDFs del curso")
+    parser.add_argument('--workers', type=int, default=None, help="Procesos en paralelo")
+    parser.add_argument('--force', action='store_true', help="Ignorar la caché")
+    args = parser.parse_args(argv)
+
+    documents = extract_all(pdf_files, workers=args.workers, force=args.force)
+    pages = write_outputs(documents)
+    print(f"Extraction complete. {len(documents)} PDFs, {pages} páginas con texto.")
+
 
-print("Extraction complete.")
+if __name__ == '__main__':
+    sys.exit(main())
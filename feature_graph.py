@@ -0,0 +1,92 @@
+class FeatureGraph:
+    """
+    Grafo de dependencias de features (indicadores y patrones).
+
+    Cada productor declara las columnas que genera y las columnas de las que
+    depende. A partir de las features que piden las estrategias se arma un plan
+    mínimo (orden topológico) y solo se ejecutan esos productores. Un productor
+    se salta si sus columnas ya están en el CandleFrame, así que cada columna
+    se calcula como máximo una vez por carga de velas.
+    """
+
+    # Columnas que trae el CandleFrame al cargar velas
+    BASE_COLUMNS = ('Timestamp', 'Open', 'High', 'Low', 'Close')
+
+    def __init__(self):
+        self._producers = {}   # nombre -> (outputs, depends, func)
+        self._by_output = {}   # columna -> nombre del productor
+        self._updaters = {}    # nombre -> func(frame) que recalcula solo la última fila
+
+    def register(self, name, outputs, func, depends=(), update_last=None):
+        """
+        Registra un productor.
+
+        Args:
+            name: Identificador del productor
+            outputs: Columnas que escribe en el frame
+            func: Callable func(frame)
+            depends: Columnas que necesita (además de OHLC)
+            update_last: Callable opcional update_last(frame) -> bool que recalcula
+                         solo la última fila a partir de la anterior (vela en formación)
+        """
+        self._producers[name] = (tuple(outputs), tuple(depends), func)
+        if update_last is not None:
+            self._updaters[name] = update_last
+        for column in outputs:
+            self._by_output[column] = name
+
+    def plan(self, features):
+        """
+        Devuelve la lista ordenada de productores necesarios para `features`.
+        Lanza KeyError si una feature no tiene productor y ValueError si hay ciclos.
+        """
+        order = []
+        visiting = set()
+        done = set()
+
+        def visit(column):
+            if column in self.BASE_COLUMNS:
+                return
+            if column not in self._by_output:
+                raise KeyError(f"Feature sin productor registrado: {column}")
+            name = self._by_output[column]
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependencia circular en productor: {name}")
+            visiting.add(name)
+            for dep in self._producers[name][1]:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for feature in features:
+            visit(feature)
+        return order
+
+    def evaluate(self, frame, plan):
+        """
+        Ejecuta el plan sobre el frame, saltando productores ya calculados.
+
+        Si solo cambió la vela en formación (`frame.stale_last`), los productores
+        con `update_last` recalculan únicamente la última fila desde el estado de
+        la fila anterior; el resto (o si el updater no puede, p.ej. en el warm-up)
+        se recalcula completo.
+        """
+        stale_last = frame.stale_last
+        for name in plan:
+            outputs, _, func = self._producers[name]
+            if all(column in frame for column in outputs):
+                if not stale_last:
+                    continue
+                updater = self._updaters.get(name)
+                if updater is not None and updater(frame):
+                    continue
+            func(frame)
+        frame.stale_last = False
+        return frame
+
+    def outputs(self, plan):
+        """Columnas que quedan calculadas al ejecutar el plan."""
+        return [column for name in plan for column in self._producers[name][0]]
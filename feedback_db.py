@@ -34,6 +34,62 @@ class FeedbackDB:
             )
         ''')
         
+        # Índice de imágenes de feedback (almacén direccionado por contenido)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS feedback_images (
+                file_unique_id TEXT PRIMARY KEY,
+                sha256 TEXT,
+                path TEXT,
+                thumb_path TEXT,
+                size INTEGER,
+                width INTEGER,
+                height INTEGER,
+                created_at TEXT
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_images_sha256 ON feedback_images (sha256)')
+        
+        # Lo que vio el bot al operar: últimas velas + features (npz comprimido) y señales candidatas
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS trade_snapshots (
+                trade_id TEXT PRIMARY KEY,
+                created_at TEXT,
+                bars INTEGER,
+                frame BLOB,
+                signals TEXT
+            )
+        ''')
+        
+        # Operaciones virtuales de las estrategias en modo sombra (no se envían al broker)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shadow_trades (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pair TEXT,
+                strategy TEXT,
+                action TEXT,
+                stage TEXT,
+                reason TEXT,
+                market_state TEXT,
+                signal_time INTEGER,
+                entry_time INTEGER,
+                expiry_time INTEGER,
+                entry_price REAL,
+                exit_price REAL,
+                result TEXT,
+                payout REAL,
+                features TEXT,
+                created_at TEXT,
+                resolved_at TEXT
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_shadow_trades_pending ON shadow_trades (result, expiry_time)')
+        
+        # Columnas agregadas después de la creación original de la tabla
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(trades)')}
+        if 'features' not in columns:
+            # Features de la señal (JSON) para el modelo de calidad de señales
+            cursor.execute('ALTER TABLE trades ADD COLUMN features TEXT')
+        
         conn.commit()
         conn.close()
     
@@ -43,7 +99,7 @@ class FeedbackDB:
         
         Args:
             trade_data: dict con keys: trade_id, pair, action, strategy, timeframe, 
-                       amount, result, profit, telegram_message_id
+                       amount, result, profit, telegram_message_id, features (opcional)
         
         Returns:
             trade_id de la operación guardada
@@ -54,8 +110,8 @@ class FeedbackDB:
         cursor.execute('''
             INSERT INTO trades (
                 trade_id, timestamp, pair, action, strategy, timeframe,
-                amount, open_price, close_price, result, profit, telegram_message_id
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                amount, open_price, close_price, result, profit, telegram_message_id, features
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             trade_data['trade_id'],
             datetime.now().isoformat(),
@@ -68,7 +124,8 @@ class FeedbackDB:
             trade_data.get('close_price'),
             trade_data['result'],
             trade_data['profit'],
-            trade_data.get('telegram_message_id')
+            trade_data.get('telegram_message_id'),
+            json.dumps(trade_data['features']) if trade_data.get('features') else None
         ))
         
         conn.commit()
@@ -76,6 +133,23 @@ class FeedbackDB:
         
         return trade_data['trade_id']
     
+    def update_trade_result(self, trade_id, result, profit, close_price=None):
+        """Actualiza el resultado de una operación conciliada después de guardarla."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            UPDATE trades
+            SET result = ?, profit = ?, close_price = COALESCE(?, close_price)
+            WHERE trade_id = ?
+        ''', (result, profit, close_price, trade_id))
+        
+        rows_affected = cursor.rowcount
+        conn.commit()
+        conn.close()
+        
+        return rows_affected > 0
+    
     def add_feedback(self, telegram_message_id, feedback_text, image_path=None):
         """
         Agrega feedback a una operación usando el message_id de Telegram.
@@ -105,6 +179,47 @@ class FeedbackDB:
         
         return rows_affected > 0
     
+    def save_image(self, image_data):
+        """
+        Indexa una imagen de feedback guardada en el almacén.
+        
+        Args:
+            image_data: dict con keys: file_unique_id, sha256, path, thumb_path,
+                       size, width, height
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT OR REPLACE INTO feedback_images (
+                file_unique_id, sha256, path, thumb_path, size, width, height, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            image_data['file_unique_id'],
+            image_data['sha256'],
+            image_data['path'],
+            image_data.get('thumb_path'),
+            image_data.get('size'),
+            image_data.get('width'),
+            image_data.get('height'),
+            datetime.now().isoformat()
+        ))
+        
+        conn.commit()
+        conn.close()
+    
+    def get_image(self, file_unique_id):
+        """Obtiene la metadata de una imagen ya guardada (o None)."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM feedback_images WHERE file_unique_id = ?', (file_unique_id,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        return dict(row) if row else None
+    
     def get_all_trades(self, limit=100):
         """Obtiene todas las operaciones con su feedback."""
         conn = sqlite3.connect(self.db_path)
@@ -139,6 +254,175 @@ class FeedbackDB:
         
         return [dict(row) for row in rows]
     
+    def get_strategy_stats(self):
+        """Devuelve {estrategia: (wins, losses)} de todas las operaciones cerradas."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT strategy,
+                   SUM(CASE WHEN result = 'win' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN result = 'loss' THEN 1 ELSE 0 END)
+            FROM trades
+            WHERE strategy IS NOT NULL
+            GROUP BY strategy
+        ''')
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return {strategy: (wins, losses) for strategy, wins, losses in rows}
+    
+    def save_trade_snapshot(self, trade_id, frame_blob, bars, signals):
+        """
+        Guarda el snapshot de una operación.
+        
+        Args:
+            trade_id: ID de la operación
+            frame_blob: bytes .npz comprimido (state_snapshot.encode_frame)
+            bars: Cantidad de velas del snapshot
+            signals: dict serializable con la señal operada y las candidatas
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT OR REPLACE INTO trade_snapshots (trade_id, created_at, bars, frame, signals)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (trade_id, datetime.now().isoformat(), bars, sqlite3.Binary(frame_blob), json.dumps(signals)))
+        
+        conn.commit()
+        conn.close()
+    
+    def get_trade_snapshot(self, trade_id):
+        """Devuelve {'frame': bytes, 'signals': dict, 'bars', 'created_at'} o None."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM trade_snapshots WHERE trade_id = ?', (trade_id,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        if not row:
+            return None
+        snapshot = dict(row)
+        snapshot['signals'] = json.loads(snapshot['signals'] or '{}')
+        return snapshot
+    
+    def get_trades_with_features(self):
+        """Operaciones cerradas (win/loss) con features guardadas, de la más vieja a la más nueva."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT trade_id, strategy, result, features FROM trades
+            WHERE features IS NOT NULL AND result IN ('win', 'loss')
+            ORDER BY timestamp ASC
+        ''')
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in rows]
+    
+    def get_recent_results(self, limit=1000):
+        """Últimas operaciones cerradas (strategy, result, profit, timestamp), de la más vieja a la más nueva."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT strategy, result, profit, timestamp FROM (
+                SELECT strategy, result, profit, timestamp FROM trades
+                WHERE result IN ('win', 'loss')
+                ORDER BY timestamp DESC
+                LIMIT ?
+            ) ORDER BY timestamp ASC
+        ''', (limit,))
+
+        rows = cursor.fetchall()
+        conn.close()
+
+        return [dict(row) for row in rows]
+
+    def save_shadow_trade(self, trade):
+        """
+        Registra una operación virtual abierta (result NULL hasta resolverla).
+        
+        Args:
+            trade: dict con pair, strategy, action, stage, reason, market_state,
+                   signal_time, entry_time, expiry_time, entry_price, payout y features
+        
+        Returns:
+            id de la fila
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT INTO shadow_trades
+                (pair, strategy, action, stage, reason, market_state, signal_time,
+                 entry_time, expiry_time, entry_price, payout, features, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            trade['pair'], trade['strategy'], trade['action'], trade.get('stage'), trade.get('reason'),
+            trade.get('market_state'), trade.get('signal_time'), trade['entry_time'], trade['expiry_time'],
+            trade['entry_price'], trade.get('payout'),
+            json.dumps(trade['features']) if trade.get('features') else None,
+            datetime.now().isoformat()
+        ))
+        
+        row_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return row_id
+    
+    def resolve_shadow_trade(self, shadow_id, exit_price, result):
+        """Cierra una operación virtual con el precio al vencimiento ('win', 'loss' o 'draw')."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            UPDATE shadow_trades SET exit_price = ?, result = ?, resolved_at = ? WHERE id = ?
+        ''', (exit_price, result, datetime.now().isoformat(), shadow_id))
+        
+        conn.commit()
+        conn.close()
+    
+    def get_pending_shadow_trades(self):
+        """Operaciones virtuales sin resolver (para retomarlas después de un reinicio)."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM shadow_trades WHERE result IS NULL ORDER BY expiry_time')
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in rows]
+    
+    def get_shadow_stats(self):
+        """Devuelve {estrategia: (wins, losses, draws, pendientes)} de las operaciones virtuales."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT strategy,
+                   SUM(CASE WHEN result = 'win' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN result = 'loss' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN result = 'draw' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN result IS NULL THEN 1 ELSE 0 END)
+            FROM shadow_trades
+            GROUP BY strategy
+        ''')
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return {strategy: (wins, losses, draws, pending) for strategy, wins, losses, draws, pending in rows}
+
     def export_to_json(self, output_file='feedback_export.json'):
         """Exporta todos los datos a JSON para análisis."""
         trades = self.get_all_trades(limit=10000)
@@ -0,0 +1,80 @@
+"""
+Niveles de Fibonacci sobre el último impulso confirmado.
+
+El impulso es el tramo entre los dos últimos swings de la estructura de
+mercado (market_structure.py), respetando su orden:
+    - mínimo -> máximo: impulso alcista, el retroceso baja hacia los niveles
+    - máximo -> mínimo: impulso bajista, el retroceso sube hacia los niveles
+
+Los niveles de retroceso y extensión se calculan una vez por tramo y solo se
+recalculan cuando se confirma un swing nuevo; consultar es O(1).
+"""
+from market_structure import UP, DOWN
+
+RETRACEMENTS = (0.382, 0.5, 0.618, 0.786)
+EXTENSIONS = (1.272, 1.618)
+
+
+class FibonacciLeg:
+    __slots__ = ('start', 'end', 'direction', 'start_timestamp', 'end_timestamp',
+                 'range', 'retracements', 'extensions')
+
+    def __init__(self, start_swing, end_swing):
+        self.start = start_swing.price
+        self.end = end_swing.price
+        self.start_timestamp = start_swing.timestamp
+        self.end_timestamp = end_swing.timestamp
+        self.direction = UP if self.end > self.start else DOWN
+        self.range = abs(self.end - self.start)
+        # Retroceso r: desde el final del impulso de vuelta hacia el inicio
+        move = self.end - self.start
+        self.retracements = {ratio: self.end - move * ratio for ratio in RETRACEMENTS}
+        # Extensión e: proyección del impulso desde el inicio
+        self.extensions = {ratio: self.start + move * ratio for ratio in EXTENSIONS}
+
+    def contains(self, price):
+        """El precio sigue dentro del tramo (el retroceso no lo invalidó ni hay impulso nuevo)."""
+        return min(self.start, self.end) < price < max(self.start, self.end)
+
+    def nearest_retracement(self, price):
+        """(ratio, nivel) de retroceso más cercano al precio."""
+        return min(self.retracements.items(), key=lambda item: abs(item[1] - price))
+
+    def __repr__(self):
+        return (f"FibonacciLeg({self.direction} {self.start:.5f}->{self.end:.5f} "
+                f"61.8%={self.retracements[0.618]:.5f})")
+
+
+class FibonacciEngine:
+    def __init__(self, min_range=0.0005):
+        """
+        Args:
+            min_range: Tamaño mínimo del impulso (fracción del precio) para trazar niveles
+        """
+        self.min_range = min_range
+        self.leg = None
+        self._key = None  # (timestamp inicio, timestamp fin, precio fin) del tramo cacheado
+
+    def update(self, structure):
+        """
+        Recalcula el tramo si cambiaron los dos últimos swings de la estructura.
+        Llamar cuando se confirman swings (PairContext lo hace).
+
+        Returns:
+            True si el tramo cambió
+        """
+        swings = structure.swings
+        if len(swings) < 2:
+            return False
+        start, end = swings[-2], swings[-1]
+        # La estructura alterna máximos y mínimos, pero un swing del mismo tipo más
+        # extremo reemplaza al último: la clave incluye el precio final
+        key = (start.timestamp, end.timestamp, end.price)
+        if key == self._key:
+            return False
+        self._key = key
+        if start.kind == end.kind or abs(end.price - start.price) < start.price * self.min_range:
+            self.leg = None
+        else:
+            self.leg = FibonacciLeg(start, end)
+        return True
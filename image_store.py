@@ -0,0 +1,135 @@
+"""
+Almacén de imágenes de feedback direccionado por contenido.
+
+Cada imagen se guarda una sola vez como feedback_images/<aa>/<sha256>.jpg
+(el hash se calcula mientras se descarga). Los `file_unique_id` de Telegram
+ya conocidos se resuelven desde FeedbackDB sin volver a descargar. La
+escritura de los chunks y las miniaturas van a threads para no bloquear el
+event loop.
+"""
+import logging
+import os
+import asyncio
+import hashlib
+import uuid
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow es opcional: sin él no se generan miniaturas
+    Image = None
+
+THUMBNAIL_SIZE = (320, 320)
+
+
+def _make_thumbnail(src, dst, size):
+    """Genera la miniatura JPEG (si no existe) y devuelve (ancho, alto) de la imagen original."""
+    with Image.open(src) as img:
+        width, height = img.size
+        if not os.path.exists(dst):
+            img.thumbnail(size)
+            img.convert('RGB').save(dst, 'JPEG', quality=80)
+    return width, height
+
+
+class ImageStore:
+    def __init__(self, root='feedback_images', feedback_db=None, max_workers=2):
+        self.root = Path(root)
+        self.feedback_db = feedback_db
+        self.max_workers = max_workers
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='thumbs')
+        return self._executor
+
+    def _path_for(self, digest):
+        return self.root / digest[:2] / f"{digest}.jpg"
+
+    def _thumb_path_for(self, digest):
+        return self.root / 'thumbs' / f"{digest}.jpg"
+
+    async def lookup(self, file_unique_id):
+        """Devuelve la ruta de una imagen ya guardada para ese file_unique_id, o None."""
+        if not self.feedback_db or not file_unique_id:
+            return None
+        meta = await asyncio.to_thread(self.feedback_db.get_image, file_unique_id)
+        if meta and Path(meta['path']).exists():
+            return meta['path']
+        return None
+
+    async def save_stream(self, chunks, file_unique_id=None):
+        """
+        Guarda una imagen a partir de un async iterator de chunks de bytes.
+
+        Si el contenido ya existía (mismo hash) no se duplica en disco.
+        Returns:
+            Ruta de la imagen guardada
+        """
+        tmp_dir = self.root / 'tmp'
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = tmp_dir / f"{uuid.uuid4().hex}.part"
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            f = await asyncio.to_thread(open, tmp_path, 'wb')
+            try:
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+
+            sha256 = digest.hexdigest()
+            path = self._path_for(sha256)
+            if path.exists():
+                log.debug(f"[Feedback] Imagen duplicada, se reutiliza: {path}")
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        thumb_path, width, height = await self._thumbnail(sha256, path)
+
+        if self.feedback_db:
+            await asyncio.to_thread(self.feedback_db.save_image, {
+                'file_unique_id': file_unique_id or sha256,
+                'sha256': sha256,
+                'path': str(path),
+                'thumb_path': thumb_path,
+                'size': size,
+                'width': width,
+                'height': height,
+            })
+        return str(path)
+
+    async def _thumbnail(self, sha256, path):
+        """Genera la miniatura en el thread pool. Devuelve (ruta, ancho, alto)."""
+        if Image is None:
+            return None, None, None
+
+        thumb = self._thumb_path_for(sha256)
+        thumb.parent.mkdir(parents=True, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        try:
+            width, height = await loop.run_in_executor(
+                self._get_executor(), _make_thumbnail, path, thumb, THUMBNAIL_SIZE
+            )
+        except Exception as e:
+            log.error(f"[Feedback] Error generando miniatura de {path}: {e}")
+            return None, None, None
+        return str(thumb), width, height
+
+    def close(self):
+        """Detiene el pool de miniaturas (se vuelve a crear si se guarda otra imagen)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,421 @@
+"""
+Kernels numéricos con forma de bucle: suavizados exponenciales y de Wilder,
+ventanas móviles de máximos/mínimos, extremos locales y detección de swings.
+
+Cada kernel tiene dos implementaciones con el mismo resultado:
+    - `_<kernel>_loop`: el bucle directo, compilado con numba.njit si numba
+      está instalado (se compila en la primera llamada y queda en caché en
+      __pycache__)
+    - `_<kernel>_numpy`: fallback en NumPy puro (ventanas con
+      sliding_window_view; las recurrencias lineales y = a·y + b·x resueltas
+      por bloques con cumsum, iguales al bucle salvo redondeo)
+
+Las funciones públicas apuntan a una u otra según BACKEND. Con la variable
+de entorno BOT_JIT=0 se fuerza el fallback aunque numba esté instalado.
+Las fórmulas reproducen las de la librería `ta` (incluidos sus arranques),
+así los valores no cambian respecto de los que calculaba analysis.py.
+benchmark_kernels.py compara ambas implementaciones contra `ta`.
+"""
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+numba = None
+if os.environ.get('BOT_JIT', '1') != '0':
+    try:
+        import numba
+    except ImportError:
+        pass
+
+BACKEND = 'numba' if numba is not None else 'numpy'
+
+
+def _recurrence(a, b, seed, values):
+    """
+    Recurrencia lineal y[i] = a·y[i-1] + b·values[i] a partir de `seed` (sin incluirla), 0 <= a < 1.
+
+    Dentro de un bloque de L valores y[j] = a^(j+1)·(y + Σ b·x[k]·a^-(k+1)), un
+    cumsum; L se acota para que a^-L no desborde. Los términos más grandes son los
+    más recientes, así que el error relativo es del orden de L·eps.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if a == 0:
+        return b * values
+    block = int(min(256, max(1, 500 // -np.log2(a))))
+    powers = a ** np.arange(1, block + 1, dtype=np.float64)
+    scaled = b / powers
+    out = np.empty(len(values))
+    y = float(seed)
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        m = len(chunk)
+        result = powers[:m] * (y + np.cumsum(chunk * scaled[:m]))
+        out[start:start + m] = result
+        y = result[-1]
+    return out
+
+
+# --- Suavizado exponencial (EMA / RSI) ---
+
+def _ewm_loop(values, alpha, min_periods):
+    n = len(values)
+    out = np.full(n, np.nan)
+    smoothed = np.nan
+    count = 0
+    for i in range(n):
+        x = values[i]
+        if not np.isnan(x):
+            smoothed = x if count == 0 else alpha * x + (1 - alpha) * smoothed
+            count += 1
+        if count >= min_periods:
+            out[i] = smoothed
+    return out
+
+
+def _ewm_numpy(values, alpha, min_periods):
+    out = np.full(len(values), np.nan)
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return out
+    start = int(np.argmax(valid))
+    out[start] = values[start]
+    # Los NaN intermedios conservan el valor anterior: la recurrencia corre sobre los
+    # válidos y se arrastra hacia adelante
+    rest = values[start + 1:]
+    present = valid[start + 1:]
+    smoothed = np.r_[values[start], _recurrence(1 - alpha, alpha, values[start], rest[present])]
+    out[start + 1:] = smoothed[np.cumsum(present)]
+    out[np.cumsum(valid) < min_periods] = np.nan
+    return out
+
+
+# --- Promedio de Wilder (ATR de `ta`) ---
+
+def _wilder_loop(values, window):
+    n = len(values)
+    out = np.zeros(n)
+    if n < window:
+        return out
+    total = 0.0
+    for i in range(window):
+        total += values[i]
+    out[window - 1] = total / window
+    for i in range(window, n):
+        out[i] = (out[i - 1] * (window - 1) + values[i]) / window
+    return out
+
+
+def _wilder_numpy(values, window):
+    out = np.zeros(len(values))
+    if len(values) < window:
+        return out
+    seed = sum(values[:window].tolist()) / window
+    out[window - 1] = seed
+    out[window:] = _recurrence((window - 1) / window, 1 / window, seed, values[window:])
+    return out
+
+
+# --- ADX (misma construcción que ta.trend.ADXIndicator) ---
+
+def _adx_loop(high, low, close, window):
+    n = len(close)
+    out = np.zeros(n)
+    if n < 2 * window:
+        return out
+    size = n - (window - 1)
+    # Rango verdadero y movimientos direccionales (la primera vela no tiene previa)
+    moves = np.zeros(n)
+    pos = np.zeros(n)
+    neg = np.zeros(n)
+    for i in range(1, n):
+        moves[i] = max(high[i], close[i - 1]) - min(low[i], close[i - 1])
+        up = high[i] - high[i - 1]
+        down = low[i - 1] - low[i]
+        if up > down and up > 0:
+            pos[i] = up
+        if down > up and down > 0:
+            neg[i] = down
+
+    trs = np.zeros(size)
+    dip = np.zeros(size)
+    din = np.zeros(size)
+    for i in range(1, window + 1):
+        trs[0] += moves[i]
+        dip[0] += pos[i]
+        din[0] += neg[i]
+    # Como en `ta`, la última posición queda en 0 (no se usa para el ADX)
+    for i in range(1, size - 1):
+        trs[i] = trs[i - 1] - trs[i - 1] / window + moves[window + i]
+        dip[i] = dip[i - 1] - dip[i - 1] / window + pos[window + i]
+        din[i] = din[i - 1] - din[i - 1] / window + neg[window + i]
+
+    index = np.zeros(size)
+    for i in range(size):
+        plus = 100 * (dip[i] / trs[i]) if trs[i] != 0 else 0.0
+        minus = 100 * (din[i] / trs[i]) if trs[i] != 0 else 0.0
+        if plus + minus != 0:
+            index[i] = 100 * abs((plus - minus) / (plus + minus))
+
+    total = 0.0
+    for i in range(window):
+        total += index[i]
+    adx = total / window
+    out[2 * window - 1] = adx
+    for i in range(window + 1, size):
+        adx = (adx * (window - 1) + index[i - 1]) / window
+        out[window - 1 + i] = adx
+    return out
+
+
+def _adx_numpy(high, low, close, window):
+    n = len(close)
+    out = np.zeros(n)
+    if n < 2 * window:
+        return out
+    size = n - (window - 1)
+    prev_close = close[:-1]
+    moves = np.zeros(n)
+    moves[1:] = np.maximum(high[1:], prev_close) - np.minimum(low[1:], prev_close)
+    up = np.zeros(n)
+    down = np.zeros(n)
+    up[1:] = high[1:] - high[:-1]
+    down[1:] = low[:-1] - low[1:]
+    pos = np.where((up > down) & (up > 0), up, 0.0)
+    neg = np.where((down > up) & (down > 0), down, 0.0)
+
+    def smooth(values):
+        result = np.zeros(size)
+        result[0] = sum(values[1:window + 1].tolist())
+        result[1:size - 1] = _recurrence(1 - 1 / window, 1.0, result[0], values[window + 1:n])
+        return result
+
+    trs = smooth(moves)
+    dip = smooth(pos)
+    din = smooth(neg)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plus = np.where(trs != 0, 100 * (dip / trs), 0.0)
+        minus = np.where(trs != 0, 100 * (din / trs), 0.0)
+        index = np.where(plus + minus != 0, 100 * np.abs((plus - minus) / (plus + minus)), 0.0)
+
+    seed = sum(index[:window].tolist()) / window
+    out[2 * window - 1] = seed
+    out[2 * window:] = _recurrence((window - 1) / window, 1 / window, seed, index[window:size - 1])
+    return out
+
+
+# --- Ventanas móviles (estocástico) ---
+
+def _rolling_max_loop(values, window):
+    n = len(values)
+    out = np.full(n, np.nan)
+    for i in range(window - 1, n):
+        best = values[i - window + 1]
+        for j in range(i - window + 2, i + 1):
+            if values[j] > best:
+                best = values[j]
+        out[i] = best
+    return out
+
+
+def _rolling_min_loop(values, window):
+    n = len(values)
+    out = np.full(n, np.nan)
+    for i in range(window - 1, n):
+        best = values[i - window + 1]
+        for j in range(i - window + 2, i + 1):
+            if values[j] < best:
+                best = values[j]
+        out[i] = best
+    return out
+
+
+def _rolling_mean_loop(values, window):
+    n = len(values)
+    out = np.full(n, np.nan)
+    for i in range(window - 1, n):
+        total = 0.0
+        for j in range(i - window + 1, i + 1):
+            total += values[j]
+        out[i] = total / window
+    return out
+
+
+def _rolling_numpy(reduce):
+    def rolling(values, window):
+        out = np.full(len(values), np.nan)
+        if len(values) >= window:
+            out[window - 1:] = reduce(sliding_window_view(values, window), axis=1)
+        return out
+    return rolling
+
+
+def _rolling_mean_numpy(values, window):
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        # Suma secuencial (el orden del bucle) en lugar de la suma por pares de NumPy
+        windows = sliding_window_view(values, window)
+        total = windows[:, 0].copy()
+        for j in range(1, window):
+            total += windows[:, j]
+        out[window - 1:] = total / window
+    return out
+
+
+# --- Extremos locales centrados (patrones chartistas) ---
+
+def _local_extremes_loop(values, window, maximum):
+    """Velas que son el extremo de la ventana centrada [i - window//2, i + window - window//2)."""
+    n = len(values)
+    flags = np.zeros(n, dtype=np.bool_)
+    half = window // 2
+    for start in range(n - window + 1):
+        best = values[start]
+        for j in range(start + 1, start + window):
+            if (values[j] > best) if maximum else (values[j] < best):
+                best = values[j]
+        flags[start + half] = best == values[start + half]
+    return flags
+
+
+def _local_extremes_numpy(values, window, maximum):
+    flags = np.zeros(len(values), dtype=bool)
+    if len(values) < window:
+        return flags
+    extremes = (np.max if maximum else np.min)(sliding_window_view(values, window), axis=1)
+    half = window // 2
+    flags[half:half + len(extremes)] = extremes == values[half:half + len(extremes)]
+    return flags
+
+
+# --- Swings (estructura de mercado) ---
+
+def _swing_points_loop(highs, lows, window):
+    """
+    Máximo (mínimo) de swing: extremo de las 2*window+1 velas centradas, estricto
+    contra las anteriores y no estricto contra las posteriores (mesetas una sola vez).
+    """
+    n = len(highs)
+    is_high = np.zeros(n, dtype=np.bool_)
+    is_low = np.zeros(n, dtype=np.bool_)
+    for center in range(window, n - window):
+        high_ok = True
+        low_ok = True
+        for j in range(center - window, center):
+            high_ok = high_ok and highs[center] > highs[j]
+            low_ok = low_ok and lows[center] < lows[j]
+        for j in range(center + 1, center + window + 1):
+            high_ok = high_ok and highs[center] >= highs[j]
+            low_ok = low_ok and lows[center] <= lows[j]
+        is_high[center] = high_ok
+        is_low[center] = low_ok
+    return is_high, is_low
+
+
+def _swing_points_numpy(highs, lows, window):
+    n = len(highs)
+    is_high = np.zeros(n, dtype=bool)
+    is_low = np.zeros(n, dtype=bool)
+    if n < 2 * window + 1:
+        return is_high, is_low
+    # Fila k de la ventana = velas [k, k + window); centros window..n-window-1
+    high_max = sliding_window_view(highs, window).max(axis=1)
+    low_min = sliding_window_view(lows, window).min(axis=1)
+    centers = slice(window, n - window)
+    left = slice(0, n - 2 * window)
+    right = slice(window + 1, n - window + 1)
+    is_high[centers] = (highs[centers] > high_max[left]) & (highs[centers] >= high_max[right])
+    is_low[centers] = (lows[centers] < low_min[left]) & (lows[centers] <= low_min[right])
+    return is_high, is_low
+
+
+LOOPS = {
+    'ewm': _ewm_loop,
+    'wilder': _wilder_loop,
+    'adx': _adx_loop,
+    'rolling_max': _rolling_max_loop,
+    'rolling_min': _rolling_min_loop,
+    'rolling_mean': _rolling_mean_loop,
+    'local_extremes': _local_extremes_loop,
+    'swing_points': _swing_points_loop,
+}
+
+FALLBACKS = {
+    'ewm': _ewm_numpy,
+    'wilder': _wilder_numpy,
+    'adx': _adx_numpy,
+    'rolling_max': _rolling_numpy(np.max),
+    'rolling_min': _rolling_numpy(np.min),
+    'rolling_mean': _rolling_mean_numpy,
+    'local_extremes': _local_extremes_numpy,
+    'swing_points': _swing_points_numpy,
+}
+
+if numba is not None:
+    COMPILED = {name: numba.njit(cache=True)(func) for name, func in LOOPS.items()}
+else:
+    COMPILED = {}
+_active = COMPILED or FALLBACKS
+
+
+def _float_array(values):
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def ewm(values, alpha, min_periods=1):
+    """
+    Suavizado exponencial sin ajuste (pandas `ewm(alpha=..., adjust=False)`):
+    arranca en el primer valor no NaN; NaN mientras haya menos de `min_periods` valores.
+    """
+    return _active['ewm'](_float_array(values), float(alpha), int(min_periods))
+
+
+def ema(values, window):
+    """EMA de `window` períodos como ta.trend.EMAIndicator (NaN en el arranque)."""
+    return ewm(values, 2.0 / (window + 1), window)
+
+
+def wilder(values, window):
+    """Promedio de Wilder como el ATR de `ta`: 0 en el arranque, la media simple en window-1."""
+    return _active['wilder'](_float_array(values), int(window))
+
+
+def true_range(high, low, close):
+    """Rango verdadero (la primera vela usa High - Low)."""
+    high, low, close = _float_array(high), _float_array(low), _float_array(close)
+    result = high - low
+    if len(close) > 1:
+        prev_close = close[:-1]
+        np.maximum(result[1:], np.abs(high[1:] - prev_close), out=result[1:])
+        np.maximum(result[1:], np.abs(low[1:] - prev_close), out=result[1:])
+    return result
+
+
+def adx(high, low, close, window=14):
+    """ADX como ta.trend.ADXIndicator.adx(); ceros si hay menos de 2*window velas."""
+    return _active['adx'](_float_array(high), _float_array(low), _float_array(close), int(window))
+
+
+def rolling_max(values, window):
+    return _active['rolling_max'](_float_array(values), int(window))
+
+
+def rolling_min(values, window):
+    return _active['rolling_min'](_float_array(values), int(window))
+
+
+def rolling_mean(values, window):
+    return _active['rolling_mean'](_float_array(values), int(window))
+
+
+def local_extremes(values, window, maximum=True):
+    """
+    Equivalente a `Series.rolling(window, center=True).max() == values` (o min).
+    Los bordes sin ventana completa quedan en False (como los NaN de pandas).
+    """
+    return _active['local_extremes'](_float_array(values), int(window), bool(maximum))
+
+
+def swing_points(highs, lows, window):
+    """(es máximo de swing, es mínimo de swing) por vela; los bordes sin ventana completa en False."""
+    return _active['swing_points'](_float_array(highs), _float_array(lows), int(window))
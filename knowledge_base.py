@@ -0,0 +1,189 @@
+"""
+Base de conocimiento buscable sobre el texto de los PDFs del curso.
+
+Divide cada página en pasajes, arma un índice invertido en memoria
+(término -> {pasaje: frecuencia}) y ordena los resultados con BM25. Las
+búsquedas ignoran mayúsculas y tildes ("tendencia" encuentra "Tendencias").
+
+Fuente: pdf_pages.json (generado por extract_texts.py); si no existe se usa
+el volcado plano pdf_strategies_content.txt.
+
+Uso:
+    python knowledge_base.py doble techo
+    python knowledge_base.py "soporte resistencia" -n 5
+"""
+import logging
+import os
+import re
+import sys
+import json
+import math
+import argparse
+import unicodedata
+from collections import Counter
+
+log = logging.getLogger(__name__)
+
+PAGES_FILE = 'pdf_pages.json'
+CONTENT_FILE = 'pdf_strategies_content.txt'
+
+# Parámetros BM25
+K1 = 1.5
+B = 0.75
+
+# Tamaño aproximado de cada pasaje (caracteres)
+PASSAGE_SIZE = 700
+
+STOPWORDS = {
+    'a', 'al', 'como', 'con', 'de', 'del', 'el', 'en', 'es', 'esta', 'este', 'la', 'las', 'lo',
+    'los', 'mas', 'o', 'para', 'pero', 'por', 'que', 'se', 'si', 'sin', 'su', 'sus', 'un', 'una',
+    'uno', 'y', 'the', 'of', 'and', 'to', 'in',
+}
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+_MARKER = re.compile(r'--- START OF (.+?) ---\n(.*?)--- END OF \1 ---', re.S)
+
+
+def normalize(text):
+    """Minúsculas y sin tildes."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    """
+    Términos indexables: sin stopwords y reducidos a una raíz aproximada.
+    Se quita el plural y después la vocal final, así singular y plural
+    coinciden ('soporte'/'soportes' -> 'soport', 'vela'/'velas' -> 'vel').
+    """
+    terms = []
+    for token in _TOKEN.findall(normalize(text)):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        if len(token) > 4 and token.endswith('es'):
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith('s'):
+            token = token[:-1]
+        if len(token) > 3 and token[-1] in 'aeo':
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+def split_passages(text, size=PASSAGE_SIZE):
+    """Corta el texto en pasajes de ~`size` caracteres respetando los saltos de línea."""
+    passages = []
+    current = []
+    length = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        current.append(line)
+        length += len(line) + 1
+        if length >= size:
+            passages.append('\n'.join(current))
+            current = []
+            length = 0
+    if current:
+        passages.append('\n'.join(current))
+    return passages
+
+
+class KnowledgeBase:
+    def __init__(self, pages_path=PAGES_FILE, content_path=CONTENT_FILE):
+        self.passages = []   # [{'doc', 'page', 'text'}]
+        self.index = {}      # término -> {id de pasaje: frecuencia}
+        self.lengths = []    # términos por pasaje
+        self.avg_length = 0.0
+        self.build(self._load(pages_path, content_path))
+
+    @staticmethod
+    def _load(pages_path, content_path):
+        if os.path.exists(pages_path):
+            with open(pages_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        if os.path.exists(content_path):
+            with open(content_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            return [{'doc': doc, 'page': None, 'text': text} for doc, text in _MARKER.findall(content)]
+        log.warning(f"[KB] No se encontró {pages_path} ni {content_path}. Ejecutar extract_texts.py")
+        return []
+
+    def build(self, pages):
+        """Arma el índice invertido a partir de las páginas."""
+        for page in pages:
+            for text in split_passages(page['text']):
+                passage_id = len(self.passages)
+                self.passages.append({'doc': page['doc'], 'page': page['page'], 'text': text})
+                counts = Counter(tokenize(text))
+                self.lengths.append(sum(counts.values()))
+                for term, freq in counts.items():
+                    self.index.setdefault(term, {})[passage_id] = freq
+        if self.lengths:
+            self.avg_length = sum(self.lengths) / len(self.lengths)
+
+    def search(self, query, limit=3):
+        """
+        Busca pasajes relevantes para `query`, ordenados por BM25.
+
+        Returns:
+            Lista de dicts con doc, page, score, text y snippet
+        """
+        n = len(self.passages)
+        scores = {}
+        terms = set(tokenize(query))
+        for term in terms:
+            postings = self.index.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for passage_id, freq in postings.items():
+                norm = K1 * (1 - B + B * self.lengths[passage_id] / self.avg_length)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * freq * (K1 + 1) / (freq + norm)
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        results = []
+        for passage_id, score in best:
+            passage = dict(self.passages[passage_id])
+            passage['score'] = score
+            passage['snippet'] = self._snippet(passage['text'], terms)
+            results.append(passage)
+        return results
+
+    @staticmethod
+    def _snippet(text, terms, width=350):
+        """Fragmento del pasaje alrededor del primer término encontrado."""
+        folded = normalize(text)
+        start = min((folded.find(term) for term in terms if term in folded), default=0)
+        start = max(0, start - width // 3)
+        snippet = text[start:start + width].strip()
+        return ('…' if start > 0 else '') + snippet + ('…' if start + width < len(text) else '')
+
+
+def format_results(results, query):
+    """Texto plano con los resultados (CLI / Telegram)."""
+    if not results:
+        return f"Sin resultados para '{query}'."
+    lines = []
+    for i, result in enumerate(results, start=1):
+        source = result['doc'].replace('.pdf', '')
+        if result['page']:
+            source += f", pág. {result['page']}"
+        lines.append(f"{i}. [{source}] (score {result['score']:.1f})\n{result['snippet']}")
+    return '\n\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Busca en el contenido de los PDFs del curso")
+    parser.add_argument('query', nargs='+', help="Términos a buscar")
+    parser.add_argument('-n', '--limit', type=int, default=3, help="Cantidad de pasajes")
+    args = parser.parse_args(argv)
+
+    query = ' '.join(args.query)
+    kb = KnowledgeBase()
+    print(format_results(kb.search(query, args.limit), query))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
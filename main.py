@@ -1,27 +1,45 @@
+import logging
 import asyncio
-import pandas as pd
-from datetime import datetime, timezone, timedelta
+import time
+from datetime import datetime, timezone
 
-# Importar módulos propios
-from BinaryOptionsToolsV2.pocketoption import PocketOptionAsync
+# Importar módulos propios (el SDK del broker se importa al crear el bot)
+from config import load_config
+from state_snapshot import save_snapshot, load_snapshot, encode_frame
 from analysis import MarketAnalyzer
 from patterns import PatternRecognizer
 from telegram_bot import TelegramNotifier
 from feedback_db import FeedbackDB
+from candle_frame import CandleFrame
+from feature_graph import FeatureGraph
+from signal_ensemble import SignalEnsemble
+from tick_stream import TickStream
+from risk_manager import RiskManager
+from news_filter import NewsFilter
+from knowledge_base import KnowledgeBase, format_results
+from signal_model import SignalModel, extract_features, FEATURE_COLUMNS
+from execution import OrderExecutor, OrderResult
+from pair_context import PairContext
+from correlation import CorrelationMatrix
+from strategy_registry import StrategyRegistry
+from shadow import ShadowBook
+from candle_validator import CandleValidator
+from chart_renderer import ChartRenderer, trade_annotations, with_exit
+from bot_logging import setup_logging, shutdown_logging, recent_events, format_events, dropped_count
 
-# Importar estrategias
-from strategy_stochastic import StrategyStochastic
-from strategy_continuation import StrategyContinuation
-from strategy_fibonacci import StrategyFibonacci
-from strategy_structure import StrategyStructure
+log = logging.getLogger('main')
 
 # --- Configuración ---
 PAIRS = ['EURUSD_otc', 'GBPUSD_otc', 'AUDUSD_otc', 'USDCAD_otc', 'AUDCAD_otc', 'USDMXN_otc', 'USDCOP_otc']
 INTERVAL = 300  # 5 minutos
 LOOKBACK = 300 # Aumentado para permitir cálculo de SMA_200
+SNAPSHOT_BARS = 100  # Velas guardadas con cada operación (trade_snapshots)
 
 class TradingBot:
-    def __init__(self, ssid, telegram_token=None, telegram_chat_id=None):
+    def __init__(self, ssid, telegram_token=None, telegram_chat_id=None, snapshot_path=None, snapshot_every=5,
+                 intrabar_lead=0, risk=None, news=None, correlation=None, strategies_path='strategies.json',
+                 charts=None):
+        from BinaryOptionsToolsV2.pocketoption import PocketOptionAsync
         self.api = PocketOptionAsync(ssid)
         self.analyzer = MarketAnalyzer()
         self.pattern_recognizer = PatternRecognizer()
@@ -32,266 +50,631 @@ class TradingBot:
         # Inicializar Telegram con referencia a la DB
         self.notifier = TelegramNotifier(telegram_token, telegram_chat_id, self.feedback_db)
         
-        # Estado de trading
-        self.active_trade_expiry = datetime.min.replace(tzinfo=timezone.utc)
+        # Consulta de los PDFs del curso desde el chat: /doc <término>
+        self.knowledge_base = None
+        self.notifier.register_command('/doc', self.search_docs)
+        self.notifier.register_command('/shadow', self.shadow_report)
+        self.notifier.register_command('/log', self.show_log)
         
-        # Inicializar lista de estrategias activas
-        self.strategies = [
-            StrategyStochastic(),
-            StrategyContinuation(),
-            StrategyFibonacci(),
-            # StrategyStructure()  # DESACTIVADA - ver DISABLED_STRATEGIES.txt
-        ]
+        # Gráficos anotados de cada operación (pool de procesos, solo si hay matplotlib)
+        self.charts = ChartRenderer(**(charts or {}))
+        
+        # Buffers de velas/features por par (se reutilizan entre ciclos)
+        # Si hay snapshot reciente, arrancamos en caliente desde él
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self.frames = self.restore_snapshot()
+        # Calidad de datos: huecos/duplicados/OHLC; los pares degradados no se operan
+        self.validator = CandleValidator(INTERVAL)
+        
+        # Correlación móvil de retornos entre pares (se actualiza una vez por barrido)
+        self.correlation = CorrelationMatrix(PAIRS, interval=INTERVAL, **(correlation or {}))
+        
+        # Riesgo: tamaño de posición y límites de exposición (estado incremental),
+        # incluida la exposición repetida en pares correlacionados
+        self.risk = RiskManager(correlation=self.correlation, **(risk or {}))
+        self.risk.load_history(self.feedback_db)
+        
+        # Filtro de noticias (calendario económico local)
+        self.news = NewsFilter(**(news or {}))
+        
+        # Tareas en background (órdenes, gráficos, snapshots...): se guarda la referencia
+        # para que no las recolecte el GC a mitad de camino y para registrar sus errores
+        self._tasks = set()
+        
+        # Ejecución de órdenes: resultados normalizados, latencias y conciliación
+        self.executor = OrderExecutor(self.api)
+        self.pending_orders = {}  # client_order_id -> señal, hasta registrar el resultado final
+        
+        # Modo intrabar: segundos antes del cierre en que se aceptan señales provisionales
+        self.intrabar_lead = intrabar_lead
+        # (par, estrategia) -> timestamp de la última vela operada (una entrada por vela)
+        self.fired = {}
+        # Resultado de todas las estrategias en el último análisis de cada par y
+        # candidatas del último barrido (se guardan con cada operación)
+        self.evaluations = {}
+        self.last_sweep = []
+        # Contexto incremental por par (estructura de mercado) que comparten las estrategias
+        self.contexts = {}
+        
+        # Estrategias activas según strategies.json (se recargan en caliente entre velas)
+        self.registry = StrategyRegistry(strategies_path)
+        self.strategies = self.registry.load()
+        
+        # Modo sombra: estrategias evaluadas sobre las mismas vistas, con operaciones virtuales
+        self.shadow_strategies = self.registry.shadow
+        self.shadow = ShadowBook(self.feedback_db, INTERVAL)
+        self.shadow.load_pending()
+        
+        # Grafo de features: solo se calculan los indicadores/patrones que se usan
+        self.features = FeatureGraph()
+        self.analyzer.register_features(self.features)
+        self.pattern_recognizer.register_features(self.features)
+        self.feature_plan = self.build_feature_plan()
+        
+        # Stream de precios en tiempo real (si el SDK lo soporta); si no, solo polling
+        self.stream = TickStream(self.api, INTERVAL) if TickStream.supported(self.api) else None
+        
+        # Ensamble de señales (pesos por estrategia aprendidos de feedback.db)
+        self.ensemble = SignalEnsemble(self.feedback_db)
+        
+        # Modelo de calidad de señales (probabilidad de ganar según features)
+        self.signal_model = SignalModel()
+        self.signal_model.load_history(self.feedback_db)
+
+    async def search_docs(self, query):
+        """Handler de /doc: busca pasajes en la base de conocimiento (se indexa al primer uso)."""
+        if not query:
+            return "Uso: /doc <término>"
+        if self.knowledge_base is None:
+            self.knowledge_base = await asyncio.to_thread(KnowledgeBase)
+        results = self.knowledge_base.search(query, limit=3)
+        return format_results(results, query)
+
+    async def show_log(self, args):
+        """
+        Handler de /log: últimos eventos del ring buffer.
+        Uso: /log [cantidad] [nivel] [texto], p.ej. "/log 30 warning EURUSD".
+        """
+        limit, level, words = 20, None, []
+        for arg in args.split():
+            if arg.isdigit():
+                limit = min(int(arg), 100)
+            elif arg.upper() in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'):
+                level = arg
+            else:
+                words.append(arg)
+        text = format_events(recent_events(limit, level, ' '.join(words) or None))
+        dropped = dropped_count()
+        return f"{text}\n({dropped} eventos descartados por cola llena)" if dropped else text
+
+    async def shadow_report(self, _args):
+        """Handler de /shadow: resultados de las estrategias en modo sombra."""
+        return await asyncio.to_thread(self.shadow.report)
+
+    def build_feature_plan(self):
+        """
+        Plan mínimo de productores para las estrategias (activas y sombra), el
+        estado de mercado y las features del modelo de señales.
+        """
+        required = list(self.analyzer.MARKET_STATE_FEATURES) + list(FEATURE_COLUMNS)
+        for strategy in self.strategies + self.shadow_strategies:
+            required.extend(strategy.requires)
+        plan = self.features.plan(required)
+        log.info(f"[Features] Plan de cálculo: {', '.join(plan)}")
+        return plan
+
+    def reload_strategies(self):
+        """
+        Aplica cambios en strategies.json o en los strategy_*.py sin reiniciar.
+        Los buffers de velas/indicadores se conservan; solo se calculan las
+        columnas nuevas que pidan las estrategias.
+        """
+        if not self.registry.reload():
+            return
+        self.strategies = self.registry.strategies
+        self.shadow_strategies = self.registry.shadow
+        self.feature_plan = self.build_feature_plan()
+
+    def restore_snapshot(self):
+        """Restaura velas/features del último snapshot (si existe y sigue vigente)."""
+        if not self.snapshot_path:
+            return {}
+        try:
+            frames = load_snapshot(self.snapshot_path, INTERVAL, max_age=INTERVAL * LOOKBACK)
+        except Exception as e:
+            log.warning(f"[Snapshot] No se pudo restaurar {self.snapshot_path}: {e}")
+            return {}
+        if frames:
+            log.info(f"[Snapshot] Restaurados {len(frames)} pares desde {self.snapshot_path}")
+        return frames
+
+    def save_snapshot(self):
+        """Guarda velas/features por par para el próximo arranque."""
+        if not self.snapshot_path:
+            return
+        try:
+            saved = save_snapshot(self.snapshot_path, self.frames, INTERVAL)
+            log.info(f"[Snapshot] Guardados {saved} pares en {self.snapshot_path}")
+        except Exception as e:
+            log.error(f"[Snapshot] Error guardando snapshot: {e}")
 
     async def fetch_data(self, pair):
-        """Obtiene velas y prepara el DataFrame."""
+        """Obtiene velas y las carga en el CandleFrame del par."""
+        frame = self.frames.get(pair)
+        if frame is None:
+            frame = self.frames[pair] = CandleFrame(capacity=LOOKBACK + 16)
+        
+        # Stream en tiempo real: completar desde el ring buffer sin llamar a la API.
+        # Si el ring no empalma con el frame (hueco), se usa el polling para rellenar.
+        if self.stream and not frame.empty and self.stream.is_live(pair):
+            candles = self.stream.candles_since(pair, frame.last_timestamp)
+            if candles:
+                frame.merge(candles, max_length=LOOKBACK)
+                return frame
+        
+        # Si el frame ya tiene histórico reciente, solo pedimos las velas que faltan
+        # (incluida la vela en formación). Si no, descargamos el histórico completo.
         offset = INTERVAL * LOOKBACK
+        incremental = False
+        if not frame.empty:
+            since_last = int(datetime.now(timezone.utc).timestamp()) - frame.last_timestamp
+            if since_last < offset:
+                offset = since_last + INTERVAL * 2
+                incremental = True
+        
         try:
             # Añadido timeout de 10 segundos
             candles = await asyncio.wait_for(self.api.get_candles(pair, INTERVAL, offset), timeout=10.0)
-            df = pd.DataFrame(candles)
-            if df.empty:
-                print(f"  [WARN] Dataframe vacío para {pair}")
-                return df
+            if not candles:
+                log.warning(f"Dataframe vacío para {pair}")
+                return None
             
-            # Normalizar columnas (manejar minúsculas/mayúsculas)
-            df.columns = [c.lower() for c in df.columns]
+            if incremental:
+                frame.merge(candles, max_length=LOOKBACK)
+                return frame
             
-            # Mapeo esperado
-            rename_map = {'time': 'Timestamp', 'open': 'Open', 'close': 'Close', 'high': 'High', 'low': 'Low'}
-            df.rename(columns=rename_map, inplace=True)
-            
-            # Verificar que existan las columnas críticas
-            required = ['Open', 'High', 'Low', 'Close']
-            if not all(col in df.columns for col in required):
-                print(f"  [ERR] Columnas faltantes en {pair}. Las que hay: {df.columns.tolist()}")
-                return pd.DataFrame()
-                
-            # Convertir Timestamp
-            if 'Timestamp' in df.columns:
-                 # Fix DeprecationWarning by using timezone-aware now
-                 df['Timestamp'] = pd.to_datetime(df['Timestamp'], unit='s', utc=True)
-            else:
-                 # Fallback if no timestamp
-                 df['Timestamp'] = pd.Timestamp.now(tz=timezone.utc)
-            
-            # Convertir a numeric
-            for c in required:
-                df[c] = pd.to_numeric(df[c])
-            
-            return df
+            # Normaliza columnas, convierte a numérico y reutiliza los buffers del par
+            return frame.load(candles)
             
+        # En caso de error se conserva el buffer del par (no hay que volver a descargar todo)
+        except KeyError as e:
+            log.error(f"{pair}: {e}")
+            return None
         except asyncio.TimeoutError:
-            return pd.DataFrame()
+            return None
         except Exception as e:
-            print(f"Error fetching {pair}: {e}")
-            return pd.DataFrame()
+            log.error(f"Error fetching {pair}: {e}")
+            return None
 
     async def analyze_pair(self, pair):
         """Pipeline completo de análisis para un par."""
-        print(f"Analizando {pair}...")
-        df = await self.fetch_data(pair)
-        if df.empty:
-            return None
-
-        # 1. Análisis Fundamental (Noticias)
-        news_status = self.analyzer.check_news()
+        log.debug(f"Analizando {pair}...")
         
-        # 2. Análisis Técnico (Indicadores)
-        df = self.analyzer.compute_indicators(df)
+        frame = await self.fetch_data(pair)
+        if frame is None or frame.empty:
+            return []
         
-        # 3. Reconocimiento de Patrones
-        df = self.pattern_recognizer.find_candlestick_patterns(df)
-        df = self.pattern_recognizer.find_chart_patterns(df)
+        # Validación de velas (con backfill dirigido de huecos) antes de calcular indicadores
+        usable, changed = await self.validator.ensure(self.api, pair, frame, max_length=LOOKBACK)
+        if changed:
+            # La estructura incremental se rehace sobre las velas corregidas
+            self.contexts.pop(pair, None)
+        if not usable:
+            log.warning(f"[Data] {pair} degradado ({self.validator.degraded.get(pair)}). No se opera.")
+            return []
+
+        # 2-3. Indicadores y Patrones (solo los que piden las estrategias)
+        self.features.evaluate(frame, self.feature_plan)
         
         # 4. Estado del Mercado
-        market_state = self.analyzer.determine_market_state(df)
+        market_state = self.analyzer.determine_market_state(frame)
+
+        # Vista pandas (sin copia) para las estrategias
+        df = frame.to_pandas()
+        
+        # La última vela puede estar en formación. Las señales "confirmed" se evalúan
+        # solo sobre velas cerradas; las "provisional" incluyen la vela en formación y
+        # solo cuentan en los últimos `intrabar_lead` segundos antes del cierre.
+        timestamps = frame['Timestamp']
+        now = time.time()
+        bar_close = timestamps[-1] + INTERVAL
+        forming = bar_close > now
+        
+        # Operaciones virtuales vencidas del par se resuelven con las velas recién descargadas
+        # (la escritura en la DB va fuera del event loop)
+        await asyncio.to_thread(self.shadow.resolve, pair, frame, now)
+        
+        # (etapa, vista, timestamp de la vela, fila del frame)
+        views = []
+        if forming and len(df) > 1:
+            views.append(('confirmed', df.iloc[:-1], int(timestamps[-2]), -2))
+            if self.intrabar_lead and bar_close - now <= self.intrabar_lead:
+                views.append(('provisional', df, int(timestamps[-1]), -1))
+        elif not forming:
+            views.append(('confirmed', df, int(timestamps[-1]), -1))
+
+        # Estructura de mercado: solo se procesan las velas cerradas nuevas
+        context = self.contexts.get(pair)
+        if context is None:
+            context = self.contexts[pair] = PairContext(pair)
+        context.update(frame, closed=len(frame) - 1 if forming else len(frame))
+
+        # Análisis Fundamental (Noticias): no operar pares con eventos de alto impacto cerca.
+        # Solo se bloquean las señales: velas, contexto y operaciones virtuales siguen al día
+        event = self.news.blocking_event(pair)
+        if event is not None:
+            log.info(f"[News] {pair} bloqueado por {event['currency']} {event['title']} "
+                     f"({datetime.fromtimestamp(event['time'], timezone.utc).strftime('%H:%M')} UTC)")
+            self.evaluations[pair] = []
+            return []
 
         # 5. Consultar Estrategias
-        signals = []
-        for strategy in self.strategies:
-            action, reason, duration = strategy.get_signal(df)
-            if action in ['BUY', 'SELL']:
-                print(f"  >>> SEÑAL DETECTADA en {pair} por {strategy.name}: {action} ({reason})")
-                signals.append((action, duration, strategy.name))
-        
-        # Sistema de Votación y Resolución de Conflictos
-        if not signals:
-            return None
+        # Cada señal es una candidata; el ensamble decide entre todos los pares del barrido
+        candidates = []
+        evaluations = self.evaluations[pair] = []
+        for stage, view, bar, row in views:
+            for strategy in self.strategies:
+                # Una sola entrada por vela y estrategia (una provisional ya operada cubre la confirmada)
+                if self.fired.get((pair, strategy.name), 0) >= bar:
+                    continue
+                action, reason, duration = strategy.get_signal(view, context)
+                evaluations.append({'stage': stage, 'bar': bar, 'strategy': strategy.name,
+                                    'action': action, 'reason': reason})
+                if action in ['BUY', 'SELL']:
+                    log.info(f">>> SEÑAL {stage.upper()} en {pair} por {strategy.name}: {action} ({reason})",
+                             extra={'pair': pair, 'strategy': strategy.name, 'action': action, 'stage': stage})
+                    
+                    # Filtro del modelo: descartar señales con baja probabilidad de ganar
+                    features = extract_features(frame, row, action, market_state, stage)
+                    accepted, probability = self.signal_model.accept(features)
+                    if not accepted:
+                        log.warning(f"[Model] Señal descartada: p(win)={probability:.2f}")
+                        continue
+                    
+                    candidates.append({
+                        'pair': pair,
+                        'action': action,
+                        'duration': duration,
+                        'strategy': strategy.name,
+                        'reason': reason,
+                        'market_state': market_state,
+                        'stage': stage,
+                        'bar': bar,
+                        'detected_at': time.time(),
+                        'features': features,
+                        'model_probability': probability,
+                    })
+            
+            # Modo sombra: misma vista e indicadores ya calculados; la señal se registra
+            # como operación virtual (entrada al cierre de la vela de la señal)
+            for strategy in self.shadow_strategies:
+                if self.fired.get((pair, strategy.name), 0) >= bar:
+                    continue
+                action, reason, duration = strategy.get_signal(view, context)
+                if action not in ['BUY', 'SELL']:
+                    continue
+                self.fired[(pair, strategy.name)] = bar
+                features = extract_features(frame, row, action, market_state, stage)
+                # Entrada al cierre de la vela (confirmada) o al precio de la detección (provisional)
+                entry_time = bar + INTERVAL if stage == 'confirmed' else now
+                await asyncio.to_thread(self.shadow.open, pair, strategy.name, action, duration,
+                                        entry_time=entry_time, entry_price=frame['Close'][row],
+                                        stage=stage, reason=reason, market_state=market_state, signal_time=bar,
+                                        payout=self.risk.payouts.get(pair), features=features)
+        
+        return candidates
 
-        # Separar señales de COMPRA y VENTA
-        buy_signals = [s for s in signals if s[0] == 'BUY']
-        sell_signals = [s for s in signals if s[0] == 'SELL']
+    async def wait_next_scan(self):
+        """
+        Espera hasta el próximo barrido: el cierre de vela y, en modo intrabar,
+        también `intrabar_lead` segundos antes del cierre.
+        """
+        now = time.time()
+        next_close = (now // INTERVAL + 1) * INTERVAL
+        target = next_close
+        if self.intrabar_lead and now < next_close - self.intrabar_lead:
+            target = next_close - self.intrabar_lead
+        delay = target - now
+        
+        if self.stream:
+            # Con stream, el barrido arranca apenas cierra una vela
+            await self.stream.wait_candle_close(timeout=delay)
+        else:
+            await asyncio.sleep(max(1, min(10, delay)))
 
-        # 1. Chequeo de Conflicto (Si hay señales opuestas, NO operamos)
-        if buy_signals and sell_signals:
-            print(f"  [ALERTA] Conflicto de estrategias en {pair}: {len(buy_signals)} BUY vs {len(sell_signals)} SELL. Operación cancelada por seguridad.")
-            return None
+    async def refresh_account(self):
+        """Actualiza balance y payouts en el RiskManager (fuera del camino de la orden)."""
+        try:
+            balance = await asyncio.wait_for(self.api.balance(), timeout=10.0)
+            if balance is not None:
+                self.risk.update_balance(balance)
+        except Exception as e:
+            log.warning(f"[Risk] No se pudo obtener el balance: {e}")
+        
+        payout = getattr(self.api, 'payout', None)
+        if not callable(payout):
+            return
+        for pair in PAIRS:
+            try:
+                value = await asyncio.wait_for(payout(pair), timeout=5.0)
+                if isinstance(value, (int, float)):
+                    self.risk.set_payout(pair, value)
+            except Exception:
+                pass
 
-        # 2. Ejecución por Consenso
-        if buy_signals:
-            print(f"  >>> CONSENSO DE COMPRA ({len(buy_signals)} estrategias coinciden).")
-            # Podríamos priorizar la estrategia con mayor duración o simplemente tomar la primera
-            # Por ahora, retornamos la primera que generó señal
-            return buy_signals[0]
+    async def execute_signal(self, signal, amount):
+        """Ejecuta la señal elegida, espera el resultado y lo registra."""
+        pair = signal['pair']
+        action = signal['action']
+        duration = signal['duration']
+        strat_name = signal['strategy']
+        log.info(f"EJECUTANDO ORDEN: {action} en {pair} por {duration}s ({amount:.2f}). Estrategia: {strat_name} ({signal.get('stage', 'confirmed')})",
+                 extra={'pair': pair, 'strategy': strat_name, 'action': action, 'amount': amount})
+        for strategy_name in signal.get('agreeing', [strat_name]):
+            self.fired[(pair, strategy_name)] = signal.get('bar', 0)
+        
+        # Snapshot de lo que vio el bot al decidir (copia antes de que el frame avance)
+        frame = self.frames.get(pair)
+        snapshot = frame.export(last=SNAPSHOT_BARS) if frame is not None else None
+        signals = {
+            'signal': dict(signal),
+            'evaluations': self.evaluations.get(pair, []),
+            'sweep': [{k: v for k, v in c.items() if k != 'features'} for c in self.last_sweep],
+        }
+        
+        # El client_order_id identifica la orden en el executor y en el RiskManager.
+        # La exposición se reserva antes de enviar y se libera cuando hay resultado.
+        client_order_id = self.executor.new_order_id()
+        self.risk.open_position(client_order_id, pair, amount, action)
+        self.pending_orders[client_order_id] = signal
+        order = None
+        chart = None
+        try:
+            order = await self.executor.place(pair, action, amount, duration,
+                                              signal_time=signal.get('detected_at'),
+                                              client_order_id=client_order_id)
+            if order.status == OrderResult.REJECTED:
+                log.warning(f"[Exec] Orden rechazada en {pair}: {order.error}")
+                await self.notifier.send_message(f"⚠️ Orden rechazada en {pair}: {order.error}")
+                return
             
-        if sell_signals:
-            print(f"  >>> CONSENSO DE VENTA ({len(sell_signals)} estrategias coinciden).")
-            return sell_signals[0]
+            # Calcular timeframe para mostrar (5min = 300seg)
+            timeframe = f"{duration // 60}min" if duration >= 60 else f"{duration}seg"
             
-        return signals[0] # Fallback por si acaso
+            # Notificar Apertura (la orden ya está enviada: no suma latencia)
+            open_message_id = await self.notifier.notify_open(pair, action, strat_name, timeframe, amount)
+            
+            # Gráfico de la entrada: se dibuja en otro proceso y se envía en background
+            if snapshot is not None and self.charts.enabled and self.notifier.token:
+                chart = self.chart_annotations(signal, order, snapshot)
+                self.spawn(self.send_chart(pair, snapshot, chart, open_message_id))
+            
+            # Esperar resultado; si no se puede determinar queda UNKNOWN (no se asume pérdida)
+            order = await self.executor.wait_result(order)
+            if order.is_final:
+                log.info(f">>> Resultado Operación: {'GANADA ✅' if order.is_win else order.status}",
+                         extra={'pair': pair, 'strategy': strat_name, 'order_id': order.client_order_id,
+                                'result': order.result, 'profit': order.profit})
+                close_message_id = await self.notifier.notify_close(pair, order.profit, order.is_win)
+                if chart is not None:
+                    # Mismas anotaciones con la salida, sobre las velas actuales
+                    frame = self.frames.get(pair)
+                    arrays = frame.export(last=SNAPSHOT_BARS) if frame is not None and not frame.empty else snapshot
+                    exit_chart = with_exit(chart, order.closed_at or time.time(),
+                                           order.close_price or arrays['Close'][-1], order.result)
+                    self.spawn(self.send_chart(pair, arrays, exit_chart, close_message_id))
+            else:
+                await self.notifier.send_message(
+                    f"⚠️ Resultado desconocido en {pair} ({order.client_order_id}). Se conciliará con el historial."
+                )
+            
+            # Solicitar feedback y obtener el message_id del mensaje de feedback
+            feedback_message_id = await self.notifier.request_feedback()
+            
+            trade_data = {
+                'trade_id': self.trade_id_for(order),
+                'pair': pair,
+                'action': action,
+                'strategy': strat_name,
+                'timeframe': timeframe,
+                'amount': amount,
+                'open_price': order.open_price,
+                'close_price': order.close_price,
+                'result': order.result,
+                'profit': order.profit,
+                'telegram_message_id': feedback_message_id,
+                'features': signal.get('features'),
+            }
+            await asyncio.to_thread(self.feedback_db.save_trade, trade_data)
+            signal['saved_trade_id'] = trade_data['trade_id']
+            
+            # Compresión y escritura del snapshot en background
+            if snapshot is not None:
+                self.spawn(self.save_trade_snapshot(trade_data['trade_id'], snapshot, signals))
+            
+        except Exception as e:
+            log.error(f"Error ejecutando orden: {e}")
+            if order is not None:
+                # La orden pudo quedar abierta: se concilia (y libera el cupo) con el historial
+                self.executor.mark_unknown(order, str(e) or type(e).__name__)
+            try:
+                await self.notifier.send_message(f"⚠️ Error ejecutando orden en {pair}: {e}")
+            except Exception as notify_error:
+                log.error(f"[Telegram] No se pudo avisar el error: {notify_error}")
+        finally:
+            if order is None or order.status == OrderResult.REJECTED:
+                self.settle_order(client_order_id)
+            elif order.is_final:
+                self.settle_order(client_order_id, order)
+
+    def spawn(self, coro):
+        """Lanza una tarea en background conservando la referencia hasta que termine."""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            log.error(f"Error en tarea de fondo {task.get_coro().__qualname__}: {error!r}",
+                      exc_info=(type(error), error, error.__traceback__))
+
+    async def save_trade_snapshot(self, trade_id, arrays, signals):
+        """Comprime y guarda el snapshot de la operación fuera del event loop."""
+        def write():
+            blob = encode_frame(arrays)
+            self.feedback_db.save_trade_snapshot(trade_id, blob, len(arrays['Timestamp']), signals)
+            return len(blob)
+        try:
+            size = await asyncio.to_thread(write)
+            log.info(f"[Snapshot] Operación {trade_id}: {size / 1024:.1f} KB")
+        except Exception as e:
+            log.error(f"[Snapshot] Error guardando snapshot de {trade_id}: {e}")
+
+    def chart_annotations(self, signal, order, arrays):
+        """Anotaciones del gráfico: indicadores de la estrategia, patrones, Fibonacci y zonas del par."""
+        pair = signal['pair']
+        strategy = next((s for s in self.strategies if s.name == signal['strategy']), None)
+        return trade_annotations(pair, arrays, signal['action'], signal['strategy'],
+                                 order.sent_at or time.time(), order.open_price or arrays['Close'][-1],
+                                 requires=getattr(strategy, 'requires', ()), context=self.contexts.get(pair))
+
+    async def send_chart(self, pair, arrays, annotations, reply_to_message_id=None):
+        """Dibuja el gráfico en el pool de procesos y lo envía como foto (en background)."""
+        path = await self.charts.render(pair, arrays, annotations)
+        if path is not None:
+            await self.notifier.send_photo(path, reply_to_message_id=reply_to_message_id)
+
+    @staticmethod
+    def trade_id_for(order):
+        return order.trade_id or f"order_{order.client_order_id}"
+
+    def settle_order(self, client_order_id, order=None):
+        """Libera la exposición y registra el resultado final (al cerrar o al conciliar)."""
+        signal = self.pending_orders.pop(client_order_id, None)
+        self.executor.forget(client_order_id)
+        if order is None or order.status in (OrderResult.REJECTED, OrderResult.DRAW):
+            self.risk.close_position(client_order_id, order.profit if order else 0.0)
+            return
+        if order.status == OrderResult.UNKNOWN:
+            # Venció el plazo de conciliación: se libera el cupo asumiendo el peor caso
+            # para el límite diario, sin contarlo en las estadísticas de la estrategia
+            self.risk.close_position(client_order_id, -order.amount)
+            return
+        strat_name = signal['strategy'] if signal else None
+        self.risk.close_position(client_order_id, order.profit, strat_name, order.is_win)
+        if strat_name:
+            # Actualizar pesos del ensamble con el resultado
+            self.ensemble.record_result(strat_name, order.is_win)
+        if signal and signal.get('features'):
+            # Update incremental del modelo; reentrenamiento completo fuera del event loop
+            if self.signal_model.update(signal['features'], order.is_win):
+                self.spawn(self.signal_model.refit())
+
+    async def reconcile_orders(self):
+        """Concilia órdenes con resultado desconocido contra el historial del broker."""
+        if not self.executor.unknown:
+            return
+        for order in await self.executor.reconcile():
+            if order.status == OrderResult.UNKNOWN:
+                self.settle_order(order.client_order_id, order)
+                continue
+            signal = self.pending_orders.get(order.client_order_id, {})
+            trade_id = signal.get('saved_trade_id') or self.trade_id_for(order)
+            result = 'rejected' if order.status == OrderResult.REJECTED else order.result
+            await asyncio.to_thread(self.feedback_db.update_trade_result, trade_id,
+                                    result, order.profit, order.close_price or None)
+            self.settle_order(order.client_order_id, order)
 
     async def run(self):
-        print("--- INICIANDO BOT DE TRADING AVANZADO ---\n")
-        print("--- MODO SEGURO: Máx 1 operación simultánea ---\n")
+        log.info("--- INICIANDO BOT DE TRADING AVANZADO ---")
+        log.info(f"--- MODO SEGURO: Máx {self.risk.max_concurrent} operación(es) simultánea(s) ---")
         if self.notifier.token:
-            print("--- TELEGRAM ACTIVADO ---\n")
+            log.info("--- TELEGRAM ACTIVADO ---")
             await self.notifier.send_message("🤖 **Bot Iniciado**\nListo para operar.")
             
             # Iniciar listener de Telegram en background
-            asyncio.create_task(self.notifier.start_listening())
-            print("--- FEEDBACK SYSTEM ACTIVADO ---\n")
+            self.spawn(self.notifier.start_listening())
+            log.info("--- FEEDBACK SYSTEM ACTIVADO ---")
         
+        # Recarga programada del calendario económico
+        self.spawn(self.news.run_refresh())
+        
+        if self.stream:
+            self.stream.start(PAIRS)
+            log.info("--- STREAM DE PRECIOS ACTIVADO ---")
+        
+        cycles = 0
         while True:
+            # Balance/payouts para el tamaño de posición y conciliación de resultados pendientes.
+            # Va antes del chequeo de concurrencia: conciliar es lo que libera el cupo de
+            # una orden UNKNOWN
+            await self.refresh_account()
+            await self.reconcile_orders()
+            
             # 0. Chequeo de Concurrencia
-            now_utc = datetime.now(timezone.utc)
-            if now_utc < self.active_trade_expiry:
-                remaining = (self.active_trade_expiry - now_utc).total_seconds()
-                print(f"[{now_utc.strftime('%H:%M:%S')}] Operación en curso. Esperando {int(remaining)}s para finalizar...")
+            if len(self.risk.open_trades) >= self.risk.max_concurrent:
+                log.info(f"{len(self.risk.open_trades)} operación(es) en curso. Esperando...")
                 await asyncio.sleep(5)
                 continue
+            
+            # Cambios de estrategias: se aplican al inicio de la vela, antes del barrido
+            self.reload_strategies()
 
+            # 1. Barrido: juntar candidatas de todos los pares
+            candidates = []
             for pair in PAIRS:
-                # Chequeo doble por si se tardó mucho en el loop anterior
-                if datetime.now(timezone.utc) < self.active_trade_expiry:
-                    break
-                    
-                signal = await self.analyze_pair(pair)
-                
-                if signal:
-                    action, duration, strat_name = signal
-                    print(f"EJECUTANDO ORDEN: {action} en {pair} por {duration}s. Estrategia: {strat_name}")
-                    
-                    try:
-                        amount = 1.0 # Monto fijo por ahora
-                        
-                        # Calcular timeframe para mostrar (5min = 300seg)
-                        timeframe = f"{duration // 60}min" if duration >= 60 else f"{duration}seg"
-                        
-                        # Notificar Apertura
-                        await self.notifier.notify_open(pair, action, strat_name, timeframe, amount)
-
-                        # Ejecutar orden y ESPERAR resultado (check_win=True)
-                        result = None
-                        if action == 'BUY':
-                             result = await self.api.buy(asset=pair, amount=amount, time=duration, check_win=True)
-                        else:
-                             result = await self.api.sell(asset=pair, amount=amount, time=duration, check_win=True)
-                        
-                        # Procesar Resultado
-                        # La API devuelve una tupla: (trade_id, trade_info_dict)
-                        # El diccionario contiene 'result': 'win' o 'loss' y 'profit': valor_real
-                        
-                        is_win = False  # Default a pérdida por seguridad
-                        profit = -amount  # Default a pérdida del monto
-                        
-                        if isinstance(result, tuple) and len(result) >= 2:
-                            # Extraer el diccionario (segundo elemento de la tupla)
-                            trade_info = result[1]
-                            if isinstance(trade_info, dict):
-                                result_str = trade_info.get('result', '').lower()
-                                is_win = result_str == 'win'
-                                
-                                # Obtener profit real de la API
-                                if is_win:
-                                    profit = trade_info.get('profit', amount * 0.92)
-                                else:
-                                    # En pérdida, el profit es negativo (perdemos el monto apostado)
-                                    profit = -amount
-                                
-                                print(f"  [DEBUG] Extracted result: {result_str} -> is_win: {is_win}, profit: {profit}")
-                        elif result is True:
-                            is_win = True
-                            profit = amount * 0.92  # Fallback
-                        elif result is False:
-                            is_win = False
-                            profit = -amount
-                        elif isinstance(result, dict):
-                            result_str = result.get('result', '').lower()
-                            is_win = result_str == 'win' or result.get('win', False)
-                            if is_win:
-                                profit = result.get('profit', amount * 0.92)
-                            else:
-                                profit = -amount
-                        elif isinstance(result, str):
-                            is_win = result.lower() in ['win', 'won', 'ganada', 'true']
-                            profit = amount * 0.92 if is_win else -amount
-                        elif isinstance(result, (int, float)):
-                            is_win = result > 0
-                            profit = amount * 0.92 if is_win else -amount
-                        else:
-                            print(f"  [WARN] Resultado desconocido de la API: {result}")
-                        
-                        print(f"  >>> Resultado Operación: {'GANADA ✅' if is_win else 'PERDIDA ❌'}")
-                        
-                        # Notificar cierre
-                        await self.notifier.notify_close(pair, profit, is_win)
-                        
-                        # Guardar operación en la base de datos
-                        if isinstance(result, tuple) and len(result) >= 2:
-                            trade_id = result[0]  # Primer elemento de la tupla es el trade_id
-                            trade_info = result[1]  # Segundo elemento es el diccionario con info
-                            open_price = trade_info.get('openPrice', 0)
-                            close_price = trade_info.get('closePrice', 0)
-                        else:
-                            trade_id = f"trade_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                            open_price = 0
-                            close_price = 0
-                        
-                        # Solicitar feedback y obtener el message_id del mensaje de feedback
-                        feedback_message_id = await self.notifier.request_feedback()
-                        
-                        trade_data = {
-                            'trade_id': trade_id,
-                            'pair': pair,
-                            'action': action,
-                            'strategy': strat_name,
-                            'timeframe': timeframe,
-                            'amount': amount,
-                            'open_price': open_price,
-                            'close_price': close_price,
-                            'result': 'win' if is_win else 'loss',
-                            'profit': profit,
-                            'telegram_message_id': feedback_message_id
-                        }
-                        self.feedback_db.save_trade(trade_data)
-
-                        # Actualizar bloqueo
-                        self.active_trade_expiry = datetime.now(timezone.utc) + timedelta(seconds=5)
-                        
-                        # Salir del loop de pares para respetar el bloqueo inmediatamente
-                        break 
-                        
-                    except Exception as e:
-                        print(f"Error ejecutando orden: {e}")
-                        await self.notifier.send_message(f"⚠️ Error ejecutando orden en {pair}: {e}")
-                        
+                live = self.stream is not None and self.stream.is_live(pair)
+                candidates.extend(await self.analyze_pair(pair))
+                if not live:
+                    await asyncio.sleep(2) # Pausa entre pares para no saturar (solo polling)
+            
+            # 2. Descartar pares sin margen de riesgo (incluida la exposición correlacionada
+            #    con operaciones abiertas) y elegir la mejor oportunidad global
+            self.correlation.update(self.frames, now=time.time())
+            candidates = [c for c in candidates if self.risk.can_trade(c['pair'], c['action'])[0]]
+            self.last_sweep = candidates
+            signal = self.ensemble.select(candidates)
+            if signal:
+                amount, reason = self.risk.size(signal['pair'], signal['strategy'], signal['action'])
+                if amount > 0:
+                    # En background: el barrido sigue mientras la operación está abierta
+                    self.spawn(self.execute_signal(signal, amount))
                 else:
-                    # print(f"Sin señal clara en {pair}")
-                    pass
-                
-                await asyncio.sleep(2) # Pausa entre pares para no saturar
+                    log.warning(f"[Risk] Operación descartada en {signal['pair']}: {reason}")
+            
+            log.info("Ciclo completado. Esperando...")
             
-            print("Ciclo completado. Esperando...")
-            await asyncio.sleep(10)
+            # Snapshot periódico (por si el proceso muere sin apagado limpio)
+            cycles += 1
+            if self.snapshot_every and cycles % self.snapshot_every == 0:
+                await asyncio.to_thread(self.save_snapshot)
+            
+            await self.wait_next_scan()
 
 async def main():
-    ssid = input("Introduce tu SSID de PocketOption: ").strip()
-    tg_token = input("Introduce tu Token de Telegram (Enter para omitir): ").strip()
-    tg_chat = input("Introduce tu Chat ID de Telegram (Enter para omitir): ").strip()
+    config = load_config()
+    # Logging en un hilo de fondo: el event loop solo encola
+    setup_logging(**config['logging'])
+    
+    # Fallback interactivo solo si no hay SSID en entorno/archivo
+    ssid = config['ssid'] or input("Introduce tu SSID de PocketOption: ").strip()
     
-    bot = TradingBot(ssid, tg_token, tg_chat)
-    await bot.run()
+    bot = TradingBot(ssid, config['telegram_token'], config['telegram_chat_id'],
+                     snapshot_path=config['snapshot_path'], snapshot_every=config['snapshot_every'],
+                     intrabar_lead=config['intrabar_lead'], risk=config['risk'],
+                     news=config['news'], correlation=config['correlation'],
+                     strategies_path=config['strategies_path'], charts=config['charts'])
+    try:
+        await bot.run()
+    finally:
+        bot.save_snapshot()
+        bot.charts.close()
+        await bot.notifier.close()
+        shutdown_logging()
 
 if __name__ == '__main__':
     asyncio.run(main())
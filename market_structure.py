@@ -0,0 +1,162 @@
+"""
+Estructura de mercado incremental por par.
+
+Mantiene la secuencia de swings confirmados (máximos/mínimos locales con
+`swing_window` velas a cada lado) etiquetados HH/LH (máximos) y HL/LL
+(mínimos), la tendencia resultante y los quiebres de estructura:
+    - BOS: el cierre rompe el último swing a favor de la tendencia
+    - CHOCH: el cierre rompe el último swing en contra de la tendencia
+      (cambio de carácter, posible reversión)
+
+Cada vela cerrada nueva se procesa una sola vez en O(swing_window): la
+detección de swings de todas las velas nuevas de una actualización es un solo
+llamado a kernels.swing_points (compilado si numba está instalado). Las
+consultas (tendencia, último swing, último quiebre) son O(1).
+"""
+from collections import deque
+
+import numpy as np
+
+import kernels
+
+UP = 'UP'
+DOWN = 'DOWN'
+RANGE = 'RANGE'
+
+
+class Swing:
+    __slots__ = ('timestamp', 'price', 'kind', 'label')
+
+    def __init__(self, timestamp, price, kind, label=None):
+        self.timestamp = timestamp
+        self.price = price
+        self.kind = kind    # 'H' (máximo) o 'L' (mínimo)
+        self.label = label  # 'HH', 'LH', 'HL', 'LL' (None en el primero de cada tipo)
+
+    def __repr__(self):
+        return f"Swing({self.label or self.kind} {self.price:.5f} @ {self.timestamp})"
+
+
+class MarketStructure:
+    def __init__(self, swing_window=5, max_swings=100):
+        self.window = swing_window
+        self.swings = deque(maxlen=max_swings)
+        self.last_high = None
+        self.last_low = None
+        self.trend = RANGE
+        # Último quiebre: {'timestamp', 'direction', 'kind' (BOS/CHOCH), 'level'}
+        self.last_break = None
+        self.last_timestamp = None
+        self._recent = deque(maxlen=2 * swing_window + 1)  # (ts, high, low)
+        self._high_broken = False
+        self._low_broken = False
+
+    def __len__(self):
+        return len(self.swings)
+
+    def update(self, timestamps, highs, lows, closes):
+        """
+        Procesa las velas cerradas posteriores a la última vista.
+
+        Args:
+            timestamps, highs, lows, closes: arrays de velas cerradas (orden cronológico)
+
+        Returns:
+            Lista de swings confirmados en esta actualización
+        """
+        start = 0
+        if self.last_timestamp is not None:
+            start = int(np.searchsorted(timestamps, self.last_timestamp, side='right'))
+        if start >= len(timestamps):
+            return []
+
+        # Las últimas 2w velas ya vistas completan las ventanas de las primeras velas nuevas
+        w = self.window
+        previous = list(self._recent)[-2 * w:]
+        all_timestamps = np.concatenate([[bar[0] for bar in previous], timestamps[start:]]).astype(np.int64)
+        all_highs = np.concatenate([[bar[1] for bar in previous], highs[start:]])
+        all_lows = np.concatenate([[bar[2] for bar in previous], lows[start:]])
+        # El centro de la ventana es swing si es el extremo de las 2w+1 velas
+        # (estricto contra las anteriores para no duplicar mesetas)
+        is_high, is_low = kernels.swing_points(all_highs, all_lows, w)
+
+        confirmed = []
+        for i in range(len(previous), len(all_timestamps)):
+            # La vela i confirma (o descarta) el swing centrado w velas antes
+            center = i - w
+            if center >= w:
+                if is_high[center]:
+                    swing = self._add_swing(int(all_timestamps[center]), float(all_highs[center]), 'H')
+                    if swing is not None:
+                        confirmed.append(swing)
+                if is_low[center]:
+                    swing = self._add_swing(int(all_timestamps[center]), float(all_lows[center]), 'L')
+                    if swing is not None:
+                        confirmed.append(swing)
+            self._check_break(int(all_timestamps[i]), float(closes[start + i - len(previous)]))
+
+        self.last_timestamp = int(all_timestamps[-1])
+        self._recent.extend(zip(all_timestamps[-(2 * w + 1):].tolist(), all_highs[-(2 * w + 1):].tolist(),
+                                all_lows[-(2 * w + 1):].tolist()))
+        return confirmed
+
+    def _last_of(self, kind):
+        """Último swing del tipo `kind` en la secuencia (por la alternancia está a 1-2 posiciones)."""
+        for swing in reversed(self.swings):
+            if swing.kind == kind:
+                return swing
+        return None
+
+    def _add_swing(self, timestamp, price, kind):
+        last = self.swings[-1] if self.swings else None
+        if last is not None and last.kind == kind:
+            # Dos swings seguidos del mismo tipo: se queda el más extremo
+            more_extreme = price > last.price if kind == 'H' else price < last.price
+            if not more_extreme:
+                return None
+            self.swings.pop()
+
+        previous = self._last_of(kind)
+        label = None
+        if previous is not None:
+            if kind == 'H':
+                label = 'HH' if price > previous.price else 'LH'
+            else:
+                label = 'HL' if price > previous.price else 'LL'
+
+        swing = Swing(timestamp, price, kind, label)
+        self.swings.append(swing)
+        if kind == 'H':
+            self.last_high = swing
+            self._high_broken = False
+        else:
+            self.last_low = swing
+            self._low_broken = False
+        self._update_trend()
+        return swing
+
+    def _update_trend(self):
+        high = self.last_high.label if self.last_high else None
+        low = self.last_low.label if self.last_low else None
+        if high == 'HH' and low == 'HL':
+            self.trend = UP
+        elif high == 'LH' and low == 'LL':
+            self.trend = DOWN
+        else:
+            self.trend = RANGE
+
+    def _check_break(self, timestamp, close):
+        if self.last_high is not None and not self._high_broken and close > self.last_high.price:
+            self._high_broken = True
+            self.last_break = {'timestamp': timestamp, 'direction': UP, 'level': self.last_high.price,
+                               'kind': 'CHOCH' if self.trend == DOWN else 'BOS'}
+        if self.last_low is not None and not self._low_broken and close < self.last_low.price:
+            self._low_broken = True
+            self.last_break = {'timestamp': timestamp, 'direction': DOWN, 'level': self.last_low.price,
+                               'kind': 'CHOCH' if self.trend == UP else 'BOS'}
+
+    def recent_break(self, since_timestamp):
+        """Último quiebre si ocurrió en o después de `since_timestamp`, o None."""
+        if self.last_break is not None and self.last_break['timestamp'] >= since_timestamp:
+            return self.last_break
+        return None
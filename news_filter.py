@@ -0,0 +1,164 @@
+"""
+Filtro de noticias basado en un calendario económico cacheado localmente.
+
+El calendario se lee de un archivo (JSON o CSV) para funcionar sin conexión y
+se indexa por divisa en listas ordenadas por hora. Como todos los eventos
+bloquean la misma ventana (±N minutos), la pregunta "¿hay un evento de alto
+impacto para EUR o USD cerca de ahora?" se responde con un bisect por
+divisa: O(log n).
+
+Formato de cada evento:
+    {"time": "2025-12-10T13:30:00Z", "currency": "USD", "impact": "high", "title": "CPI"}
+`time` puede ser ISO 8601 o epoch en segundos.
+"""
+import logging
+import os
+import csv
+import json
+import asyncio
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+from risk_manager import pair_currencies
+
+log = logging.getLogger(__name__)
+
+IMPACT_LEVELS = {'low': 1, 'medium': 2, 'high': 3}
+
+
+def _event_time(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    if value.replace('.', '', 1).isdigit():
+        return float(value)
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def _impact(value):
+    if isinstance(value, (int, float)):
+        return int(value)
+    return IMPACT_LEVELS.get(str(value).strip().lower(), 0)
+
+
+class NewsFilter:
+    def __init__(self, path='economic_calendar.json', window_minutes=30, min_impact='high',
+                 refresh_every=3600, url=None):
+        """
+        Args:
+            path: Archivo local del calendario (.json o .csv)
+            window_minutes: Minutos antes y después de cada evento en que se bloquea
+            min_impact: Impacto mínimo que bloquea ('low', 'medium', 'high')
+            refresh_every: Segundos entre recargas programadas
+            url: Origen opcional desde el que se actualiza el archivo local
+        """
+        self.path = path
+        self.window = window_minutes * 60
+        self.min_impact = _impact(min_impact)
+        self.refresh_every = refresh_every
+        self.url = url
+        self._times = {}    # divisa -> [timestamps ordenados]
+        self._events = {}   # divisa -> [eventos en el mismo orden]
+        self._mtime = None
+        self.loaded_at = 0.0
+        self.reload()
+
+    def __len__(self):
+        return sum(len(times) for times in self._times.values())
+
+    def _read(self):
+        if self.path.lower().endswith('.csv'):
+            with open(self.path, 'r', encoding='utf-8', newline='') as f:
+                return list(csv.DictReader(f))
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('events', []) if isinstance(data, dict) else data
+
+    def reload(self):
+        """Relee el archivo si cambió desde la última carga. Devuelve True si recargó."""
+        self.loaded_at = time.time()
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            if self._mtime is None:
+                log.warning(f"[News] Calendario {self.path} no encontrado. Filtro de noticias vacío.")
+                self._mtime = 0
+            return False
+        if mtime == self._mtime:
+            return False
+
+        try:
+            rows = self._read()
+        except Exception as e:
+            log.error(f"[News] Error leyendo {self.path}: {e}")
+            return False
+
+        by_currency = {}
+        for row in rows:
+            try:
+                impact = _impact(row.get('impact', 0))
+                if impact < self.min_impact:
+                    continue
+                event = {
+                    'time': _event_time(row['time']),
+                    'currency': str(row['currency']).strip().upper(),
+                    'impact': impact,
+                    'title': row.get('title', ''),
+                }
+            except (KeyError, ValueError, TypeError):
+                continue
+            by_currency.setdefault(event['currency'], []).append(event)
+
+        self._times = {}
+        self._events = {}
+        for currency, events in by_currency.items():
+            events.sort(key=lambda e: e['time'])
+            self._events[currency] = events
+            self._times[currency] = [e['time'] for e in events]
+        self._mtime = mtime
+        log.info(f"[News] Calendario cargado: {len(self)} eventos en {len(self._times)} divisas")
+        return True
+
+    def event_for(self, currency, now=None):
+        """Primer evento de la divisa dentro de la ventana alrededor de `now`, o None."""
+        times = self._times.get(currency)
+        if not times:
+            return None
+        now = now if now is not None else time.time()
+        i = bisect_left(times, now - self.window)
+        if i < len(times) and times[i] <= now + self.window:
+            return self._events[currency][i]
+        return None
+
+    def blocking_event(self, pair, now=None):
+        """Evento que bloquea el par (por cualquiera de sus divisas), o None."""
+        for currency in pair_currencies(pair):
+            event = self.event_for(currency, now)
+            if event is not None:
+                return event
+        return None
+
+    async def download(self):
+        """Actualiza el archivo local desde `url` (escritura atómica)."""
+        import aiohttp
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(self.url) as response:
+                response.raise_for_status()
+                content = await response.read()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, self.path)
+
+    async def run_refresh(self):
+        """Recarga programada: descarga (si hay url) y relee el archivo cada `refresh_every`."""
+        while True:
+            await asyncio.sleep(self.refresh_every)
+            if self.url:
+                try:
+                    await self.download()
+                except Exception as e:
+                    log.error(f"[News] Error descargando calendario: {e}. Se usa la copia local.")
+            await asyncio.to_thread(self.reload)
@@ -0,0 +1,72 @@
+"""
+Contexto incremental por par que comparten las estrategias.
+
+Agrupa las estructuras que se actualizan con cada vela cerrada (estructura
+de mercado, zonas de soporte/resistencia, impulso de Fibonacci) para que las estrategias las consulten en O(1) en lugar de
+re-escanear ventanas del DataFrame en cada llamada.
+"""
+import numpy as np
+
+from market_structure import MarketStructure
+from sr_zones import SRZones
+from fibonacci import FibonacciEngine
+
+
+def _epoch_seconds(timestamps):
+    """Columna Timestamp (epoch int o datetime64 de pandas) -> array int64 de segundos."""
+    values = np.asarray(timestamps)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[s]').astype(np.int64)
+    if values.dtype == object:
+        return np.array([int(v.timestamp()) for v in values], dtype=np.int64)
+    return values.astype(np.int64)
+
+
+class PairContext:
+    def __init__(self, pair=None, swing_window=5, zones=None):
+        """
+        Args:
+            pair: Par (solo informativo)
+            swing_window: Velas a cada lado para confirmar un swing
+            zones: kwargs de SRZones (width, clearance, min_touches, max_zones)
+        """
+        self.pair = pair
+        self.structure = MarketStructure(swing_window)
+        self.zones = SRZones(**(zones or {}))
+        self.fibonacci = FibonacciEngine()
+
+    def update(self, frame, closed=None):
+        """
+        Incorpora las velas cerradas nuevas del CandleFrame.
+
+        Args:
+            frame: CandleFrame del par
+            closed: Cantidad de filas cerradas (por defecto todas; la vela en formación se excluye)
+
+        Returns:
+            Swings confirmados en esta actualización
+        """
+        n = len(frame) if closed is None else closed
+        return self._update_arrays(frame['Timestamp'][:n], frame['High'][:n], frame['Low'][:n], frame['Close'][:n])
+
+    def _update_arrays(self, timestamps, highs, lows, closes):
+        swings = self.structure.update(timestamps, highs, lows, closes)
+        # Las zonas solo cambian cuando se confirma un swing
+        for swing in swings:
+            self.zones.add_swing(swing)
+        if swings:
+            self.fibonacci.update(self.structure)
+        return swings
+
+    @classmethod
+    def from_dataframe(cls, df, pair=None):
+        """Contexto construido desde un DataFrame (uso sin bot, p.ej. llamadas sueltas a get_signal)."""
+        context = cls(pair)
+        context._update_arrays(_epoch_seconds(df['Timestamp'].values), df['High'].values,
+                               df['Low'].values, df['Close'].values)
+        return context
+
+    @staticmethod
+    def bar_timestamp(df, offset=-1):
+        """Timestamp (epoch) de la vela `offset` del DataFrame."""
+        return int(_epoch_seconds(df['Timestamp'].values[offset:][:1])[0])
@@ -1,160 +1,200 @@
-import pandas as pd
 import numpy as np
 
+import kernels
+
 class PatternRecognizer:
+    CANDLESTICK_FEATURES = ('CDL_DOJI', 'CDL_HAMMER', 'CDL_SHOOTINGSTAR', 'CDL_ENGULFING',
+                            'CDL_MORNINGSTAR', 'CDL_EVENINGSTAR')
+    CHART_FEATURES = ('Pattern_DoubleTop', 'Pattern_DoubleTop_Neck', 'Pattern_DoubleBottom',
+                      'Pattern_DoubleBottom_Neck', 'Pattern_Triangle', 'Pattern_Triangle_Upper',
+                      'Pattern_Triangle_Lower', 'max_local', 'min_local')
+
     def __init__(self):
         pass
 
-    def find_candlestick_patterns(self, df):
+    def register_features(self, graph):
+        """Registra los detectores de patrones como productores del FeatureGraph."""
+        graph.register('candlestick_patterns', self.CANDLESTICK_FEATURES, self.find_candlestick_patterns)
+        graph.register('chart_patterns', self.CHART_FEATURES, self.find_chart_patterns)
+
+    @staticmethod
+    def _shift(values, periods):
+        """Equivalente a Series.shift(periods) sobre un array float (rellena con NaN)."""
+        shifted = np.empty_like(values)
+        shifted[:periods] = np.nan
+        shifted[periods:] = values[:-periods]
+        return shifted
+
+    def find_candlestick_patterns(self, frame):
         """
         Busca patrones de velas japonesas usando lógica personalizada (sin TA-Lib).
-        Agrega columnas al DataFrame con las señales:
+        Agrega columnas al CandleFrame con las señales:
         100 = Bullish
         -100 = Bearish
         0 = No Pattern
         """
+        open_ = frame['Open']
+        high = frame['High']
+        low = frame['Low']
+        close = frame['Close']
+
         # Calcular cuerpos y sombras para facilitar lógica
-        df['Body'] = abs(df['Close'] - df['Open'])
-        df['UpperShadow'] = df['High'] - df[['Open', 'Close']].max(axis=1)
-        df['LowerShadow'] = df[['Open', 'Close']].min(axis=1) - df['Low']
-        df['TotalRange'] = df['High'] - df['Low']
+        body = np.abs(close - open_)
+        upper_shadow = high - np.maximum(open_, close)
+        lower_shadow = np.minimum(open_, close) - low
+        total_range = high - low
         
         # Evitar división por cero
-        df['TotalRange'] = df['TotalRange'].replace(0, 0.00001)
+        total_range[total_range == 0] = 0.00001
         
         # --- DOJI ---
         # Cuerpo muy pequeño en relación al rango total (ej. < 10%)
-        df['CDL_DOJI'] = np.where(df['Body'] <= df['TotalRange'] * 0.1, 100, 0)
+        frame.set('CDL_DOJI', np.where(body <= total_range * 0.1, 100, 0))
 
         # --- HAMMER (Martillo) ---
         # Cuerpo pequeño en la parte superior, sombra inferior larga (> 2 * cuerpo), sombra superior pequeña
         is_hammer = (
-            (df['Body'] <= df['TotalRange'] * 0.3) & # Cuerpo pequeño
-            (df['LowerShadow'] >= df['Body'] * 2) & # Sombra inferior larga
-            (df['UpperShadow'] <= df['Body'] * 0.5) # Sombra superior cortita
+            (body <= total_range * 0.3) & # Cuerpo pequeño
+            (lower_shadow >= body * 2) & # Sombra inferior larga
+            (upper_shadow <= body * 0.5) # Sombra superior cortita
         )
-        df['CDL_HAMMER'] = np.where(is_hammer, 100, 0)
+        frame.set('CDL_HAMMER', np.where(is_hammer, 100, 0))
 
         # --- SHOOTING STAR (Estrella Fugaz) ---
         # Inverso al martillo: Cuerpo pequeño abajo, sombra superior larga
         is_shooting_star = (
-            (df['Body'] <= df['TotalRange'] * 0.3) &
-            (df['UpperShadow'] >= df['Body'] * 2) &
-            (df['LowerShadow'] <= df['Body'] * 0.5)
+            (body <= total_range * 0.3) &
+            (upper_shadow >= body * 2) &
+            (lower_shadow <= body * 0.5)
         )
         # TA-Lib a veces retorna -100 para shooting star (bearish)
-        df['CDL_SHOOTINGSTAR'] = np.where(is_shooting_star, -100, 0)
+        frame.set('CDL_SHOOTINGSTAR', np.where(is_shooting_star, -100, 0))
         
         # --- ENGULFING (Envolvente) ---
         # Bullish: Vela previa ROJA, vela actual VERDE y cubre cuerpo previo
         # Bearish: Vela previa VERDE, vela actual ROJA y cubre cuerpo previo
-        prev_open = df['Open'].shift(1)
-        prev_close = df['Close'].shift(1)
-        prev_body = abs(prev_close - prev_open)
+        prev_open = self._shift(open_, 1)
+        prev_close = self._shift(close, 1)
+        prev_body = np.abs(prev_close - prev_open)
         
         # Bullish Engulfing
         is_bull_engul = (
             (prev_close < prev_open) & # Previa Roja
-            (df['Close'] > df['Open']) & # Actual Verde
-            (df['Close'] > prev_open) & 
-            (df['Open'] < prev_close)
+            (close > open_) & # Actual Verde
+            (close > prev_open) & 
+            (open_ < prev_close)
         )
         
         # Bearish Engulfing
         is_bear_engul = (
             (prev_close > prev_open) & # Previa Verde
-            (df['Close'] < df['Open']) & # Actual Roja
-            (df['Close'] < prev_open) &
-            (df['Open'] > prev_close)
+            (close < open_) & # Actual Roja
+            (close < prev_open) &
+            (open_ > prev_close)
         )
         
-        df['CDL_ENGULFING'] = 0
-        df.loc[is_bull_engul, 'CDL_ENGULFING'] = 100
-        df.loc[is_bear_engul, 'CDL_ENGULFING'] = -100
+        engulfing = frame.fill('CDL_ENGULFING', 0)
+        engulfing[is_bull_engul] = 100
+        engulfing[is_bear_engul] = -100
         
         # --- MORNING STAR ---
         # 1. Larga Bajista, 2. Pequeña (cualquier color) abajo, 3. Larga Alcista
         # Simplificación vectorizada
-        p2_open = df['Open'].shift(2)
-        p2_close = df['Close'].shift(2)
-        p2_body = abs(p2_close - p2_open)
+        p2_open = self._shift(open_, 2)
+        p2_close = self._shift(close, 2)
+        p2_body = np.abs(p2_close - p2_open)
+        p2_range = self._shift(total_range, 2)
         
         # Vela 1 (Hace 2): Larga y Roja
-        c1_long_red = (p2_close < p2_open) & (p2_body > df['TotalRange'].shift(2) * 0.5)
+        c1_long_red = (p2_close < p2_open) & (p2_body > p2_range * 0.5)
         
         # Vela 2 (Hace 1): Cuerpo pequeño (Doji o Spinning Top) y Gap abajo (idealmente)
         c2_small = (prev_body < p2_body * 0.5)
-        c2_gap = (np.maximum(prev_open, prev_close) < p2_close) # Gap down del cuerpo
         
         # Vela 3 (Actual): Larga y Verde, cierra dentro del cuerpo de la 1
-        c3_long_green = (df['Close'] > df['Open']) & (df['Close'] > (p2_open + p2_close)/2)
+        c3_long_green = (close > open_) & (close > (p2_open + p2_close)/2)
         
         is_morning_star = c1_long_red & c2_small & c3_long_green
-        df['CDL_MORNINGSTAR'] = np.where(is_morning_star, 100, 0)
+        frame.set('CDL_MORNINGSTAR', np.where(is_morning_star, 100, 0))
 
         # --- EVENING STAR ---
         # 1. Larga Verde, 2. Pequeña arriba, 3. Larga Roja
-        c1_long_green = (p2_close > p2_open) & (p2_body > df['TotalRange'].shift(2) * 0.5)
+        c1_long_green = (p2_close > p2_open) & (p2_body > p2_range * 0.5)
         
-        c2_gap_up = (np.minimum(prev_open, prev_close) > p2_close) # Gap up
-        
-        c3_long_red = (df['Close'] < df['Open']) & (df['Close'] < (p2_open + p2_close)/2)
+        c3_long_red = (close < open_) & (close < (p2_open + p2_close)/2)
         
         is_evening_star = c1_long_green & c2_small & c3_long_red
-        df['CDL_EVENINGSTAR'] = np.where(is_evening_star, -100, 0)
-        
-        # Limpieza de columnas temporales
-        df.drop(columns=['Body', 'UpperShadow', 'LowerShadow', 'TotalRange'], inplace=True)
+        frame.set('CDL_EVENINGSTAR', np.where(is_evening_star, -100, 0))
         
-        return df
+        return frame
 
-    def find_chart_patterns(self, df, lookback=30):
+    def find_chart_patterns(self, frame, lookback=30):
         """
         Intenta identificar patrones chartistas simples como Doble Techo/Suelo y Triángulos.
         Mejorado para evitar falsos positivos en consolidaciones.
+
+        La última vela del frame puede estar en formación: los patrones se evalúan
+        en la última fila y también en la anteúltima usando solo las velas hasta
+        ella, así la vista de velas cerradas ('confirmed', que termina en la fila
+        -2) ve los patrones completados sin mirar la vela en formación.
         """
         # Inicializar columnas por si no existen
-        df['Pattern_DoubleTop'] = 0
-        df['Pattern_DoubleTop_Neck'] = np.nan
-        df['Pattern_DoubleBottom'] = 0
-        df['Pattern_DoubleBottom_Neck'] = np.nan
-        df['Pattern_Triangle'] = 0
-        df['Pattern_Triangle_Upper'] = np.nan
-        df['Pattern_Triangle_Lower'] = np.nan
+        columns = {name: frame.fill(name, value) for name, value in (
+            ('Pattern_DoubleTop', 0), ('Pattern_DoubleTop_Neck', np.nan),
+            ('Pattern_DoubleBottom', 0), ('Pattern_DoubleBottom_Neck', np.nan),
+            ('Pattern_Triangle', 0), ('Pattern_Triangle_Upper', np.nan),
+            ('Pattern_Triangle_Lower', np.nan),
+        )}
+
+        high = frame['High']
+        low = frame['Low']
 
         window = 10
-        # Rolling de Pandas
-        df['max_local'] = df['High'].rolling(window, center=True).max() == df['High']
-        df['min_local'] = df['Low'].rolling(window, center=True).min() == df['Low']
-    
-        
-        if len(df) < lookback:
-            return df
-            
-        recent = df.iloc[-lookback:]
-        maxs = recent[recent['max_local']]
-        mins = recent[recent['min_local']]
+        max_local = kernels.local_extremes(high, window, maximum=True)
+        min_local = kernels.local_extremes(low, window, maximum=False)
+        frame.set('max_local', max_local)
+        frame.set('min_local', min_local)
+
+        n = len(frame)
+        for end in (n - 1, n):
+            if end < lookback:
+                continue
+            if end == n:
+                maxima, minima = max_local, min_local
+            else:
+                # Extremos recalculados sin la última vela (la ventana centrada la vería)
+                maxima = kernels.local_extremes(high[:end], window, maximum=True)
+                minima = kernels.local_extremes(low[:end], window, maximum=False)
+            for name, value in self._chart_patterns(high, low, maxima, minima, end, lookback).items():
+                columns[name][end - 1] = value
+
+        return frame
+
+    @staticmethod
+    def _chart_patterns(high, low, max_local, min_local, end, lookback):
+        """Patrones completados en la vela `end - 1` (solo mira velas < end): columna -> valor."""
+        found = {}
+
+        # Posiciones de extremos locales dentro de la ventana reciente
+        maxs = np.flatnonzero(max_local[end - lookback:end]) + (end - lookback)
+        mins = np.flatnonzero(min_local[end - lookback:end]) + (end - lookback)
         
         # --- Doble Techo ---
         if len(maxs) >= 2:
-            last_peaks = maxs.tail(2)
-            p1_idx = last_peaks.index[0]
-            p2_idx = last_peaks.index[1]
-            p1_price = last_peaks.iloc[0]['High']
-            p2_price = last_peaks.iloc[1]['High']
+            pos1, pos2 = maxs[-2], maxs[-1]
+            p1_price = high[pos1]
+            p2_price = high[pos2]
             
             # 1. Similitud de precio (Tolerancia 0.1%)
             price_match = abs(p1_price - p2_price) / p1_price < 0.001
             
             # 2. Separación temporal (mínimo 5 velas entre picos)
-            pos1 = df.index.get_loc(p1_idx)
-            pos2 = df.index.get_loc(p2_idx)
             separation = pos2 - pos1
             time_check = separation > 5
             
             # 3. Valle significativo entre picos
             if time_check:
-                valley_min = df.iloc[pos1:pos2]['Low'].min()
+                valley_min = low[pos1:pos2].min()
                 valley_depth = (p1_price - valley_min) / p1_price
                 valley_check = valley_depth > 0.002
             else:
@@ -163,26 +203,22 @@ class PatternRecognizer:
                 
             if price_match and time_check and valley_check:
                 # Marcar en la última vela (asumimos que acabamos de completar el patrón)
-                df.iloc[-1, df.columns.get_loc('Pattern_DoubleTop')] = 1
-                df.iloc[-1, df.columns.get_loc('Pattern_DoubleTop_Neck')] = valley_min
+                found['Pattern_DoubleTop'] = 1
+                found['Pattern_DoubleTop_Neck'] = valley_min
                 
         # --- Doble Suelo ---
         if len(mins) >= 2:
-            last_troughs = mins.tail(2)
-            p1_idx = last_troughs.index[0]
-            p2_idx = last_troughs.index[1]
-            p1_price = last_troughs.iloc[0]['Low']
-            p2_price = last_troughs.iloc[1]['Low']
+            pos1, pos2 = mins[-2], mins[-1]
+            p1_price = low[pos1]
+            p2_price = low[pos2]
             
             price_match = abs(p1_price - p2_price) / p1_price < 0.001
             
-            pos1 = df.index.get_loc(p1_idx)
-            pos2 = df.index.get_loc(p2_idx)
             separation = pos2 - pos1
             time_check = separation > 5
             
             if time_check:
-                peak_max = df.iloc[pos1:pos2]['High'].max()
+                peak_max = high[pos1:pos2].max()
                 peak_height = (peak_max - p1_price) / p1_price
                 peak_check = peak_height > 0.002
             else:
@@ -190,25 +226,21 @@ class PatternRecognizer:
                 peak_max = np.nan
 
             if price_match and time_check and peak_check:
-                df.iloc[-1, df.columns.get_loc('Pattern_DoubleBottom')] = 1
-                df.iloc[-1, df.columns.get_loc('Pattern_DoubleBottom_Neck')] = peak_max
+                found['Pattern_DoubleBottom'] = 1
+                found['Pattern_DoubleBottom_Neck'] = peak_max
 
                 
         # --- Triángulo (Compresión) ---
         if len(maxs) >= 2 and len(mins) >= 2:
-             p_max1 = maxs.iloc[-2]['High']
-             p_max2 = maxs.iloc[-1]['High']
-             p_min1 = mins.iloc[-2]['Low']
-             p_min2 = mins.iloc[-1]['Low']
+             p_max1 = high[maxs[-2]]
+             p_max2 = high[maxs[-1]]
+             p_min1 = low[mins[-2]]
+             p_min2 = low[mins[-1]]
              
              # Maximos decrecientes Y mínimos crecientes
              if p_max2 < p_max1 and p_min2 > p_min1:
-                 col_tri = df.columns.get_loc('Pattern_Triangle')
-                 col_up = df.columns.get_loc('Pattern_Triangle_Upper')
-                 col_low = df.columns.get_loc('Pattern_Triangle_Lower')
-                 
-                 df.iloc[-1, col_tri] = 1
-                 df.iloc[-1, col_up] = p_max2 # Resistencia (Neck supeior)
-                 df.iloc[-1, col_low] = p_min2 # Soporte (Neck inferior)
+                 found['Pattern_Triangle'] = 1
+                 found['Pattern_Triangle_Upper'] = p_max2 # Resistencia (Neck supeior)
+                 found['Pattern_Triangle_Lower'] = p_min2 # Soporte (Neck inferior)
                  
-        return df
+        return found
@@ -0,0 +1,241 @@
+"""
+Gestión de riesgo y tamaño de posición.
+
+Decide "¿puedo operar y por cuánto?" a partir de estado mantenido de forma
+incremental (contadores de operaciones abiertas por par y por divisa, PnL del
+día, ventanas móviles de resultados por estrategia), así que cada consulta es
+O(1) y no agrega latencia a la entrada de la orden.
+
+Con una matriz de correlación (correlation.py) se bloquean además las
+operaciones que repiten la exposición de una abierta en un par muy
+correlacionado (misma dirección efectiva).
+
+El monto sale de Kelly fraccional con la tasa de acierto móvil de la
+estrategia (suavizada con un prior Beta) y el payout del par, acotado por un
+máximo por operación relativo al balance.
+"""
+from collections import deque
+from datetime import datetime
+
+# Prior Beta compartido con el ensamble (estrategias con pocas operaciones en la ventana)
+from signal_ensemble import posterior_win_rate
+
+# Payout neto por defecto (92%) si el broker no informa uno para el par
+DEFAULT_PAYOUT = 0.92
+
+
+def pair_currencies(pair):
+    """'EURUSD_otc' -> ('EUR', 'USD')."""
+    symbol = pair.split('_')[0].upper()
+    return symbol[:3], symbol[3:6]
+
+
+class RiskManager:
+    def __init__(self, max_concurrent=1, max_per_pair=1, max_per_currency=2,
+                 kelly_fraction=0.25, max_stake_fraction=0.02, max_daily_loss=0.10,
+                 min_amount=1.0, max_amount=None, window=50, max_correlation=0.8, correlation=None):
+        """
+        Args:
+            max_concurrent: Operaciones abiertas simultáneas como máximo
+            max_per_pair: Operaciones abiertas por par
+            max_per_currency: Operaciones abiertas que involucran una misma divisa
+            kelly_fraction: Fracción de Kelly a usar (0.25 = cuarto de Kelly)
+            max_stake_fraction: Tope del monto por operación, como fracción del balance
+            max_daily_loss: Pérdida diaria máxima, como fracción del balance al inicio del día
+            min_amount: Monto mínimo que acepta el broker (y monto sin balance conocido)
+            max_amount: Tope absoluto por operación (opcional)
+            window: Operaciones recientes por estrategia para estimar la ventaja
+            max_correlation: |correlación| a partir de la cual dos pares cuentan como la misma exposición
+            correlation: CorrelationMatrix compartida con el bot (opcional)
+        """
+        self.max_concurrent = max_concurrent
+        self.max_per_pair = max_per_pair
+        self.max_per_currency = max_per_currency
+        self.kelly_fraction = kelly_fraction
+        self.max_stake_fraction = max_stake_fraction
+        self.max_daily_loss = max_daily_loss
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.window = window
+        self.max_correlation = max_correlation
+        self.correlation = correlation
+
+        self.balance = None
+        self.payouts = {}         # par -> payout neto (0.92 = 92%)
+
+        # Operaciones abiertas: trade_key -> (par, monto, dirección)
+        self.open_trades = {}
+        self.pair_open = {}       # par -> operaciones abiertas
+        self.currency_open = {}   # divisa -> operaciones abiertas
+        self.exposure = 0.0       # monto total en juego
+
+        # PnL del día (se reinicia al cambiar de fecha)
+        self.day = datetime.now().date()
+        self.day_start_balance = None
+        self.daily_pnl = 0.0
+
+        # Resultados recientes por estrategia: deque de 0/1 + wins en la ventana
+        self.results = {}
+        self.wins = {}
+
+    # --- Estado de cuenta ---
+
+    def update_balance(self, balance):
+        """Actualiza el balance; el primero del día fija la base del límite diario."""
+        self._roll_day()
+        self.balance = float(balance)
+        if self.day_start_balance is None:
+            self.day_start_balance = self.balance
+
+    def set_payout(self, pair, payout):
+        """Payout del par; acepta porcentaje (92) o fracción (0.92)."""
+        payout = float(payout)
+        self.payouts[pair] = payout / 100.0 if payout > 1.5 else payout
+
+    def _roll_day(self):
+        today = datetime.now().date()
+        if today != self.day:
+            self.day = today
+            self.daily_pnl = 0.0
+            self.day_start_balance = self.balance
+
+    # --- Ventaja por estrategia ---
+
+    def record_result(self, strategy, is_win):
+        """Agrega un resultado a la ventana móvil de la estrategia."""
+        results = self.results.get(strategy)
+        if results is None:
+            results = self.results[strategy] = deque(maxlen=self.window)
+            self.wins[strategy] = 0
+        if len(results) == results.maxlen:
+            self.wins[strategy] -= results[0]
+        results.append(1 if is_win else 0)
+        self.wins[strategy] += 1 if is_win else 0
+
+    def load_history(self, feedback_db):
+        """Precarga ventanas por estrategia y el PnL de hoy desde feedback.db."""
+        today = self.day.isoformat()
+        for trade in feedback_db.get_recent_results(limit=self.window * 20):
+            if trade['strategy']:
+                self.record_result(trade['strategy'], trade['result'] == 'win')
+            if (trade['timestamp'] or '').startswith(today):
+                self.daily_pnl += trade['profit'] or 0.0
+
+    def win_rate(self, strategy):
+        """Tasa de acierto móvil con prior Beta."""
+        return posterior_win_rate(self.wins.get(strategy, 0), len(self.results.get(strategy, ())))
+
+    def kelly(self, strategy, pair):
+        """Fracción de Kelly completa para una opción binaria: p - (1 - p) / b."""
+        p = self.win_rate(strategy)
+        b = self.payouts.get(pair, DEFAULT_PAYOUT)
+        return p - (1 - p) / b
+
+    # --- Consultas ---
+
+    def can_trade(self, pair, action=None):
+        """
+        Chequea los límites de exposición para el par (y la dirección, si se indica,
+        contra las operaciones abiertas en pares correlacionados).
+
+        Returns:
+            (bool, motivo)
+        """
+        self._roll_day()
+        if len(self.open_trades) >= self.max_concurrent:
+            return False, f"máximo de {self.max_concurrent} operaciones abiertas"
+        if self.pair_open.get(pair, 0) >= self.max_per_pair:
+            return False, f"ya hay operación abierta en {pair}"
+        for currency in pair_currencies(pair):
+            if self.currency_open.get(currency, 0) >= self.max_per_currency:
+                return False, f"exposición máxima en {currency}"
+        if action is not None:
+            duplicate = self.correlated_exposure(pair, action)
+            if duplicate:
+                return False, duplicate
+        if self.max_daily_loss and self.day_start_balance:
+            if -self.daily_pnl >= self.max_daily_loss * self.day_start_balance:
+                return False, f"límite de pérdida diaria alcanzado ({self.daily_pnl:.2f})"
+        return True, 'OK'
+
+    def correlated_exposure(self, pair, action):
+        """
+        Operación abierta que ya cubre la misma exposición: par con |correlación| >=
+        max_correlation y misma dirección efectiva (correlación negativa invierte la
+        dirección). Devuelve el motivo o None. O(operaciones abiertas).
+        """
+        if self.correlation is None or not self.max_correlation:
+            return None
+        for open_pair, _, open_action in self.open_trades.values():
+            if open_pair == pair or open_action is None:
+                continue
+            rho = self.correlation.correlation(pair, open_pair)
+            if rho is None or abs(rho) < self.max_correlation:
+                continue
+            same_direction = (action == open_action) == (rho > 0)
+            if same_direction:
+                return f"repite la exposición de {open_pair} {open_action} (correlación {rho:+.2f})"
+        return None
+
+    def size(self, pair, strategy, action=None):
+        """
+        Monto a operar según Kelly fraccional.
+
+        Returns:
+            (monto, motivo); monto 0 si la operación no debe hacerse
+        """
+        allowed, reason = self.can_trade(pair, action)
+        if not allowed:
+            return 0.0, reason
+
+        edge = self.kelly(strategy, pair)
+        if edge <= 0:
+            return 0.0, f"sin ventaja para {strategy} (p={self.win_rate(strategy):.2f})"
+
+        if self.balance is None:
+            return self.min_amount, 'balance desconocido, monto mínimo'
+
+        fraction = min(edge * self.kelly_fraction, self.max_stake_fraction)
+        amount = self.balance * fraction
+        if self.max_amount:
+            amount = min(amount, self.max_amount)
+        if self.max_daily_loss and self.day_start_balance:
+            # No arriesgar más de lo que queda del límite diario
+            remaining = self.max_daily_loss * self.day_start_balance + self.daily_pnl
+            if remaining < self.min_amount:
+                # Subir al mínimo del broker superaría el límite
+                return 0.0, 'límite diario'
+            amount = min(amount, remaining)
+        if amount < self.min_amount:
+            if self.balance < self.min_amount:
+                return 0.0, 'balance insuficiente'
+            amount = self.min_amount
+        return round(amount, 2), f"kelly={edge:.3f} x {self.kelly_fraction}"
+
+    # --- Ciclo de vida de las operaciones ---
+
+    def open_position(self, trade_key, pair, amount, action=None):
+        """Registra una operación abierta (antes de enviar la orden)."""
+        self.open_trades[trade_key] = (pair, amount, action)
+        self.pair_open[pair] = self.pair_open.get(pair, 0) + 1
+        for currency in pair_currencies(pair):
+            self.currency_open[currency] = self.currency_open.get(currency, 0) + 1
+        self.exposure += amount
+
+    def close_position(self, trade_key, profit=0.0, strategy=None, is_win=None):
+        """Libera la exposición de una operación y contabiliza su resultado."""
+        position = self.open_trades.pop(trade_key, None)
+        if position is None:
+            return
+        pair, amount, _ = position
+        self.pair_open[pair] -= 1
+        for currency in pair_currencies(pair):
+            self.currency_open[currency] -= 1
+        self.exposure -= amount
+
+        self._roll_day()
+        self.daily_pnl += profit
+        if self.balance is not None:
+            self.balance += profit
+        if strategy is not None and is_win is not None:
+            self.record_result(strategy, is_win)
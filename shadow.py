@@ -0,0 +1,111 @@
+"""
+Modo sombra: operaciones virtuales de estrategias que no operan dinero.
+
+Las estrategias con "mode": "shadow" en strategies.json se evalúan sobre las
+mismas vistas (velas + indicadores ya calculados) que las activas. Sus señales
+se registran en la tabla shadow_trades de feedback.db con el precio de
+entrada, y se resuelven al vencimiento con las velas que el bot descarga
+después (cierre de la vela que contiene el vencimiento).
+"""
+import logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def _outcome(action, entry_price, exit_price):
+    if exit_price == entry_price:
+        return 'draw'
+    return 'win' if (exit_price > entry_price) == (action == 'BUY') else 'loss'
+
+
+class ShadowBook:
+    def __init__(self, feedback_db, interval=300):
+        """
+        Args:
+            feedback_db: FeedbackDB donde se guardan las operaciones virtuales
+            interval: Duración de la vela en segundos
+        """
+        self.feedback_db = feedback_db
+        self.interval = interval
+        self.pending = {}  # par -> [operación virtual abierta]
+
+    def load_pending(self):
+        """Retoma las operaciones virtuales sin resolver (p.ej. después de un reinicio)."""
+        for trade in self.feedback_db.get_pending_shadow_trades():
+            self.pending.setdefault(trade['pair'], []).append(trade)
+        count = sum(len(trades) for trades in self.pending.values())
+        if count:
+            log.info(f"[Shadow] {count} operación(es) virtual(es) pendiente(s) retomada(s)")
+
+    def open(self, pair, strategy, action, duration, entry_time, entry_price, **extra):
+        """
+        Registra una operación virtual. `entry_time` y `entry_price` son el mismo
+        instante: el cierre de la vela de la señal (confirmada) o el momento de la
+        detección con el precio de ese momento (provisional), como la orden real.
+
+        Args:
+            extra: stage, reason, market_state, signal_time, payout, features
+
+        Returns:
+            dict de la operación (con su `id` en shadow_trades)
+        """
+        trade = dict(extra, pair=pair, strategy=strategy, action=action,
+                     entry_time=int(entry_time), expiry_time=int(entry_time) + int(duration),
+                     entry_price=float(entry_price))
+        trade['id'] = self.feedback_db.save_shadow_trade(trade)
+        self.pending.setdefault(pair, []).append(trade)
+        log.info(f"[Shadow] {pair} {action} por {strategy} a {entry_price:.5f} ({trade.get('reason')})")
+        return trade
+
+    def resolve(self, pair, frame, now):
+        """
+        Resuelve las operaciones virtuales del par cuyo vencimiento ya pasó,
+        con el cierre de la vela que contiene el vencimiento (la que termina en
+        él si la entrada fue al cierre de una vela).
+
+        Returns:
+            Lista de operaciones resueltas (con `exit_price` y `result`)
+        """
+        trades = self.pending.get(pair)
+        if not trades or frame is None or frame.empty:
+            return []
+        timestamps = frame['Timestamp']
+        closes = frame['Close']
+        resolved = []
+        remaining = []
+        for trade in trades:
+            expiry = trade['expiry_time']
+            bar = (expiry - 1) // self.interval * self.interval
+            # La vela que contiene el vencimiento debe estar cerrada y en el buffer
+            if bar + self.interval > now or timestamps[-1] < bar:
+                remaining.append(trade)
+                continue
+            # Última vela que empieza en o antes de `bar` (con huecos, el último precio conocido)
+            position = int(np.searchsorted(timestamps, bar, side='right')) - 1
+            if position < 0:
+                # El buffer ya no cubre el vencimiento: queda sin resultado
+                self.feedback_db.resolve_shadow_trade(trade['id'], None, 'unknown')
+                continue
+            exit_price = float(closes[position])
+            trade['exit_price'] = exit_price
+            trade['result'] = _outcome(trade['action'], trade['entry_price'], exit_price)
+            self.feedback_db.resolve_shadow_trade(trade['id'], exit_price, trade['result'])
+            resolved.append(trade)
+        self.pending[pair] = remaining
+        for trade in resolved:
+            log.info(f"[Shadow] {pair} {trade['action']} por {trade['strategy']}: {trade['result'].upper()} "
+                     f"({trade['entry_price']:.5f} -> {trade['exit_price']:.5f})")
+        return resolved
+
+    def report(self):
+        """Resumen por estrategia de las operaciones virtuales (texto para Telegram/consola)."""
+        stats = self.feedback_db.get_shadow_stats()
+        if not stats:
+            return "Sin operaciones en modo sombra."
+        lines = ["Modo sombra (operaciones virtuales):"]
+        for strategy, (wins, losses, draws, pending) in sorted(stats.items()):
+            decided = wins + losses
+            rate = f"{wins / decided * 100:.1f}%" if decided else "-"
+            lines.append(f"- {strategy}: {wins}W/{losses}L/{draws}D, win rate {rate}, pendientes {pending}")
+        return '\n'.join(lines)
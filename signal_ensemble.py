@@ -0,0 +1,162 @@
+"""
+Ensamble de señales: puntúa todas las señales candidatas de un barrido de
+pares y elige la mejor oportunidad global.
+
+Cada estrategia tiene un peso = log-odds de su tasa de acierto, estimada con
+un prior Beta y actualizada con los resultados de feedback.db. Para cada
+(par, dirección) se suman los pesos de las estrategias que coinciden, se
+restan los de las que apuntan al lado contrario y se ajusta por estado de
+mercado. El cálculo es vectorizado sobre todas las candidatas del barrido.
+"""
+import logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Prior Beta(PRIOR_WIN_RATE * PRIOR_STRENGTH, (1 - PRIOR_WIN_RATE) * PRIOR_STRENGTH)
+# para estrategias sin historial (o con muy pocos trades). Lo comparte el
+# tamaño de posición (risk_manager.py): puntuación y monto usan la misma estimación
+PRIOR_WIN_RATE = 0.55
+PRIOR_STRENGTH = 10.0
+
+
+def posterior_win_rate(wins, trades):
+    """Tasa de acierto posterior (media de la Beta) con `wins` ganadas en `trades`."""
+    return (wins + PRIOR_WIN_RATE * PRIOR_STRENGTH) / (trades + PRIOR_STRENGTH)
+
+# Ajuste en log-odds según el estado de mercado y la dirección de la señal
+STATE_ADJUSTMENT = {
+    ('TRENDING_UP', 'BUY'): 0.1,
+    ('TRENDING_UP', 'SELL'): -0.1,
+    ('TRENDING_DOWN', 'SELL'): 0.1,
+    ('TRENDING_DOWN', 'BUY'): -0.1,
+    ('VOLATILE', 'BUY'): -0.2,
+    ('VOLATILE', 'SELL'): -0.2,
+}
+
+# Descuento en log-odds para señales provisionales (vela todavía en formación)
+PROVISIONAL_PENALTY = 0.05
+
+# Probabilidad mínima combinada para operar (break-even con payout ~92%)
+MIN_PROBABILITY = 0.52
+
+DIRECTIONS = {'BUY': 0, 'SELL': 1}
+
+
+class SignalEnsemble:
+    def __init__(self, feedback_db=None, min_probability=MIN_PROBABILITY):
+        self.min_probability = min_probability
+        self.stats = {}  # estrategia -> [wins, losses]
+        if feedback_db:
+            self.load_history(feedback_db)
+
+    def load_history(self, feedback_db):
+        """Carga wins/losses por estrategia desde la base de feedback."""
+        for strategy, (wins, losses) in feedback_db.get_strategy_stats().items():
+            self.stats[strategy] = [wins, losses]
+        if self.stats:
+            summary = ', '.join(f"{name}: {self.win_rate(name):.0%}" for name in self.stats)
+            log.info(f"[Ensemble] Historial cargado -> {summary}")
+
+    def record_result(self, strategy, is_win):
+        """Actualiza incrementalmente el historial de una estrategia."""
+        wins_losses = self.stats.setdefault(strategy, [0, 0])
+        wins_losses[0 if is_win else 1] += 1
+
+    def win_rate(self, strategy):
+        """Tasa de acierto posterior (media de la Beta)."""
+        wins, losses = self.stats.get(strategy, (0, 0))
+        return posterior_win_rate(wins, wins + losses)
+
+    def weight(self, strategy):
+        """Peso de la estrategia en log-odds."""
+        p = self.win_rate(strategy)
+        return np.log(p / (1 - p))
+
+    @staticmethod
+    def _unique(candidates):
+        """
+        Índices de una candidata por (par, dirección, estrategia): una estrategia que
+        disparó en la vista confirmada y en la provisional vota una sola vez (con la
+        confirmada).
+        """
+        best = {}
+        for i, c in enumerate(candidates):
+            key = (c['pair'], c['action'], c['strategy'])
+            if key not in best or (candidates[best[key]].get('stage') == 'provisional'
+                                   and c.get('stage') != 'provisional'):
+                best[key] = i
+        return sorted(best.values())
+
+    def score(self, candidates):
+        """
+        Puntúa las candidatas de un barrido.
+
+        Args:
+            candidates: lista de dicts con keys pair, action, strategy, market_state
+
+        Returns:
+            Array con la probabilidad combinada del grupo (par, dirección) de cada candidata
+        """
+        if not candidates:
+            return np.empty(0)
+
+        pairs = {}
+        pair_idx = np.fromiter((pairs.setdefault(c['pair'], len(pairs)) for c in candidates),
+                               dtype=np.int64, count=len(candidates))
+        direction = np.fromiter((DIRECTIONS[c['action']] for c in candidates),
+                                dtype=np.int64, count=len(candidates))
+        # Los duplicados de una misma estrategia (otra vista) no suman peso
+        counted = np.zeros(len(candidates), dtype=bool)
+        counted[self._unique(candidates)] = True
+        weights = np.fromiter((self.weight(c['strategy']) for c in candidates),
+                              dtype=np.float64, count=len(candidates))
+        weights[~counted] = 0.0
+
+        # Suma de pesos por grupo (par, dirección): grupo = par * 2 + dirección
+        group = pair_idx * 2 + direction
+        totals = np.bincount(group, weights=weights, minlength=len(pairs) * 2)
+        opposite = group ^ 1
+
+        adjustment = np.fromiter(
+            (STATE_ADJUSTMENT.get((c.get('market_state'), c['action']), 0.0)
+             - (PROVISIONAL_PENALTY if c.get('stage') == 'provisional' else 0.0) for c in candidates),
+            dtype=np.float64, count=len(candidates)
+        )
+        logit = totals[group] - totals[opposite] + adjustment
+        return 1.0 / (1.0 + np.exp(-logit))
+
+    def select(self, candidates):
+        """
+        Elige la mejor oportunidad del barrido.
+
+        Returns:
+            dict de la candidata elegida (con `probability` y `agreeing`) o None
+        """
+        if not candidates:
+            return None
+
+        probabilities = self.score(candidates)
+        best = int(np.argmax(probabilities))
+        probability = float(probabilities[best])
+        chosen = candidates[best]
+
+        unique = [candidates[i] for i in self._unique(candidates)]
+        agreeing = [c for c in unique
+                    if c['pair'] == chosen['pair'] and c['action'] == chosen['action']]
+        opposing = len([c for c in unique
+                        if c['pair'] == chosen['pair'] and c['action'] != chosen['action']])
+
+        if probability < self.min_probability:
+            log.info(f"[Ensemble] Mejor candidata {chosen['pair']} {chosen['action']} con "
+                     f"p={probability:.2f} < {self.min_probability:.2f}. No se opera.")
+            return None
+
+        # La estrategia que firma la operación es la de mayor peso entre las que coinciden
+        primary = max(agreeing, key=lambda c: self.weight(c['strategy']))
+        selected = dict(primary)
+        selected['probability'] = probability
+        selected['agreeing'] = [c['strategy'] for c in agreeing]
+        log.info(f">>> [Ensemble] {selected['pair']} {selected['action']} p={probability:.2f} "
+                 f"({len(agreeing)} a favor, {opposing} en contra)")
+        return selected
@@ -0,0 +1,222 @@
+"""
+Modelo de calidad de señales: regresión logística en NumPy (solo CPU).
+
+Aprende la probabilidad de ganar de una señal a partir de los indicadores,
+patrones y estado de mercado en el momento de la señal (guardados junto a
+cada operación en feedback.db, columna `features`). Con el modelo entrenado
+se descartan las señales de baja probabilidad.
+
+La inferencia es un producto escalar sobre ~20 features (microsegundos).
+El modelo se actualiza con un paso de gradiente por cada operación cerrada
+y se reentrena completo cada `refit_every` operaciones (en un hilo, sobre
+una copia de las muestras: el event loop sigue actualizando mientras tanto).
+"""
+import logging
+import asyncio
+import json
+import math
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Orden fijo del vector de features. Las direccionales se multiplican por el
+# signo de la señal (+1 BUY, -1 SELL) para que "a favor de la tendencia"
+# tenga el mismo signo en compras y ventas.
+FEATURE_NAMES = (
+    'bias',
+    'close_sma200', 'close_ema20', 'ema20_ema50', 'macd_hist',
+    'rsi', 'stoch_k', 'stoch_d', 'atr', 'adx',
+    'double_top', 'double_bottom', 'triangle',
+    'state_trending_up', 'state_trending_down', 'state_volatile', 'state_sideways',
+    'provisional', 'hour_sin', 'hour_cos',
+)
+
+STATES = ('TRENDING_UP', 'TRENDING_DOWN', 'VOLATILE', 'SIDEWAYS')
+
+# Columnas del CandleFrame que lee extract_features. El plan de features del bot
+# las calcula siempre: si dependieran de las estrategias cargadas, el significado
+# de cada feature cambiaría con la recarga en caliente
+FEATURE_COLUMNS = (
+    'SMA_200', 'EMA_20', 'EMA_50', 'MACD_Hist', 'RSI', 'Stoch_K', 'Stoch_D', 'ATR', 'ADX',
+    'Pattern_DoubleTop', 'Pattern_DoubleBottom', 'Pattern_Triangle',
+)
+
+
+def _value(frame, column, row):
+    if column not in frame:
+        return 0.0
+    value = float(frame[column][row])
+    return 0.0 if math.isnan(value) else value
+
+
+def _centered(frame, column, row):
+    """Oscilador 0-100 llevado a [-1, 1]; 0 si la columna no está calculada."""
+    if column not in frame:
+        return 0.0
+    value = float(frame[column][row])
+    return 0.0 if math.isnan(value) else (value - 50) / 50
+
+
+def extract_features(frame, row, action, market_state, stage='confirmed'):
+    """
+    Features de la señal en la fila `row` del CandleFrame (-1 o -2).
+
+    Returns:
+        dict nombre -> float (se guarda como JSON con la operación)
+    """
+    sign = 1.0 if action == 'BUY' else -1.0
+    close = float(frame['Close'][row])
+
+    def relative(column):
+        reference = _value(frame, column, row)
+        return (close / reference - 1.0) * 100 if reference else 0.0
+
+    ema_50 = _value(frame, 'EMA_50', row)
+    hour = (int(frame['Timestamp'][row]) % 86400) / 3600.0
+
+    features = {
+        'close_sma200': sign * relative('SMA_200'),
+        'close_ema20': sign * relative('EMA_20'),
+        'ema20_ema50': sign * ((_value(frame, 'EMA_20', row) / ema_50 - 1.0) * 100 if ema_50 else 0.0),
+        'macd_hist': sign * _value(frame, 'MACD_Hist', row) / close * 1e4,
+        # Osciladores centrados en 0 y orientados a la dirección de la señal
+        'rsi': sign * _centered(frame, 'RSI', row),
+        'stoch_k': sign * _centered(frame, 'Stoch_K', row),
+        'stoch_d': sign * _centered(frame, 'Stoch_D', row),
+        'atr': _value(frame, 'ATR', row) / close * 1e3,
+        'adx': _value(frame, 'ADX', row) / 100,
+        'double_top': -sign * _value(frame, 'Pattern_DoubleTop', row),
+        'double_bottom': sign * _value(frame, 'Pattern_DoubleBottom', row),
+        'triangle': _value(frame, 'Pattern_Triangle', row),
+        'provisional': 1.0 if stage == 'provisional' else 0.0,
+        'hour_sin': math.sin(2 * math.pi * hour / 24),
+        'hour_cos': math.cos(2 * math.pi * hour / 24),
+    }
+    for state in STATES:
+        features[f"state_{state.lower()}"] = 1.0 if market_state == state else 0.0
+    return features
+
+
+def to_vector(features):
+    """dict de features -> vector en el orden de FEATURE_NAMES (faltantes = 0)."""
+    vector = np.fromiter((features.get(name, 0.0) for name in FEATURE_NAMES),
+                         dtype=np.float64, count=len(FEATURE_NAMES))
+    vector[0] = 1.0
+    return vector
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class SignalModel:
+    def __init__(self, min_probability=0.5, min_trades=30, l2=1.0, learning_rate=0.05, refit_every=10):
+        """
+        Args:
+            min_probability: Probabilidad mínima para aceptar una señal
+            min_trades: Operaciones con features necesarias antes de filtrar
+            l2: Regularización L2 (evita sobreajuste con pocos trades)
+            learning_rate: Paso del update incremental
+            refit_every: Operaciones nuevas entre reentrenamientos completos
+        """
+        self.min_probability = min_probability
+        self.min_trades = min_trades
+        self.l2 = l2
+        self.learning_rate = learning_rate
+        self.refit_every = refit_every
+        self.weights = np.zeros(len(FEATURE_NAMES))
+        self.samples = []  # [(vector, y)]
+        self._since_refit = 0
+        self._refitting = False
+
+    @property
+    def ready(self):
+        return len(self.samples) >= self.min_trades
+
+    def load_history(self, feedback_db):
+        """Entrena con las operaciones de feedback.db que tienen features guardadas."""
+        for trade in feedback_db.get_trades_with_features():
+            try:
+                features = json.loads(trade['features'])
+            except (TypeError, ValueError):
+                continue
+            self.samples.append((to_vector(features), 1.0 if trade['result'] == 'win' else 0.0))
+        if self.samples:
+            self.fit()
+            log.info(f"[Model] Entrenado con {len(self.samples)} operaciones "
+                     f"({'activo' if self.ready else f'filtra desde {self.min_trades}'})")
+
+    def fit(self, iterations=50):
+        """Reentrenamiento completo (Newton-Raphson / IRLS con L2)."""
+        if not self.samples:
+            return
+        self.weights = self._solve(self.samples, self.weights, iterations)
+        self._since_refit = 0
+
+    async def refit(self, iterations=50):
+        """
+        Reentrenamiento completo fuera del event loop (uno a la vez).
+
+        Se entrena sobre una copia de las muestras; los pasos de gradiente de las
+        operaciones que llegan mientras tanto se reaplican sobre los pesos nuevos.
+        """
+        if self._refitting or not self.samples:
+            return
+        self._refitting = True
+        self._since_refit = 0
+        samples = list(self.samples)
+        try:
+            weights = await asyncio.to_thread(self._solve, samples, self.weights.copy(), iterations)
+        finally:
+            self._refitting = False
+        for x, y in self.samples[len(samples):]:
+            weights -= self.learning_rate * (_sigmoid(x @ weights) - y) * x
+        self.weights = weights
+
+    def _solve(self, samples, weights, iterations):
+        X = np.vstack([x for x, _ in samples])
+        y = np.array([label for _, label in samples])
+        w = weights.copy()
+        reg = np.full(len(w), self.l2)
+        reg[0] = 0.0  # El bias no se regulariza
+        for _ in range(iterations):
+            p = _sigmoid(X @ w)
+            gradient = X.T @ (p - y) + reg * w
+            hessian = (X * (p * (1 - p))[:, None]).T @ X + np.diag(reg + 1e-6)
+            step = np.linalg.solve(hessian, gradient)
+            w -= step
+            if np.abs(step).max() < 1e-6:
+                break
+        return w
+
+    def predict(self, features):
+        """Probabilidad de ganar de una señal, o None si el modelo aún no tiene datos suficientes."""
+        if not self.ready:
+            return None
+        return float(_sigmoid(to_vector(features) @ self.weights))
+
+    def accept(self, features):
+        """
+        Decide si la señal pasa el filtro.
+
+        Returns:
+            (bool, probabilidad o None)
+        """
+        probability = self.predict(features)
+        return probability is None or probability >= self.min_probability, probability
+
+    def update(self, features, is_win):
+        """
+        Agrega una operación cerrada: paso de gradiente inmediato y
+        reentrenamiento completo cada `refit_every` operaciones.
+
+        Returns:
+            True si corresponde reentrenar (refit) ahora
+        """
+        x = to_vector(features)
+        y = 1.0 if is_win else 0.0
+        self.samples.append((x, y))
+        self.weights -= self.learning_rate * (_sigmoid(x @ self.weights) - y) * x
+        self._since_refit += 1
+        return self._since_refit >= self.refit_every and not self._refitting
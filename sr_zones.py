@@ -0,0 +1,169 @@
+"""
+Zonas de soporte/resistencia por par.
+
+Agrupa los precios de los swings confirmados (ver market_structure.py) en
+zonas: un swing a menos de `width` (fracción del precio) del centro de una
+zona existente la refuerza (un toque más); si no, abre una zona nueva.
+
+Las zonas se mantienen ordenadas por precio (lista de centros + bisect):
+    - agregar un swing: O(log n) + inserción
+    - zona más cercana por encima/debajo del precio: O(log n)
+
+Fuerza de una zona = toques, con bonus si fue tocada desde ambos lados
+(soporte que pasó a resistencia o viceversa).
+"""
+from bisect import bisect_left, bisect_right
+
+BUY = 'BUY'
+SELL = 'SELL'
+
+
+class Zone:
+    __slots__ = ('center', 'low', 'high', 'touches', 'highs', 'lows', 'last_timestamp')
+
+    def __init__(self, price, kind, timestamp):
+        self.center = price
+        self.low = price
+        self.high = price
+        self.touches = 0
+        self.highs = 0  # Toques desde abajo (swing máximo = resistencia)
+        self.lows = 0   # Toques desde arriba (swing mínimo = soporte)
+        self.last_timestamp = timestamp
+        self.touch(price, kind, timestamp)
+
+    def touch(self, price, kind, timestamp):
+        self.center = (self.center * self.touches + price) / (self.touches + 1)
+        self.low = min(self.low, price)
+        self.high = max(self.high, price)
+        self.touches += 1
+        if kind == 'H':
+            self.highs += 1
+        else:
+            self.lows += 1
+        self.last_timestamp = max(self.last_timestamp, timestamp)
+
+    def absorb(self, other):
+        """Fusiona otra zona (cuando dos centros quedan a menos de `width`)."""
+        total = self.touches + other.touches
+        self.center = (self.center * self.touches + other.center * other.touches) / total
+        self.low = min(self.low, other.low)
+        self.high = max(self.high, other.high)
+        self.touches = total
+        self.highs += other.highs
+        self.lows += other.lows
+        self.last_timestamp = max(self.last_timestamp, other.last_timestamp)
+
+    @property
+    def strength(self):
+        # Cambio de rol (tocada como soporte y como resistencia) vale un toque extra
+        return self.touches + (1 if self.highs and self.lows else 0)
+
+    def __repr__(self):
+        return f"Zone({self.center:.5f} [{self.low:.5f}-{self.high:.5f}] toques={self.touches} fuerza={self.strength})"
+
+
+class SRZones:
+    def __init__(self, width=0.0005, clearance=0.0008, min_touches=2, max_zones=50):
+        """
+        Args:
+            width: Distancia máxima (fracción del precio) de un swing al centro de la zona que toca
+            clearance: Espacio libre mínimo (fracción del precio) hasta la zona contraria para entrar
+            min_touches: Toques para considerar una zona como nivel válido
+            max_zones: Zonas que se conservan (se descarta la de último toque más antiguo)
+        """
+        self.width = width
+        self.clearance = clearance
+        self.min_touches = min_touches
+        self.max_zones = max_zones
+        self.centers = []  # Ordenados; paralelo a self.zones
+        self.zones = []
+
+    def __len__(self):
+        return len(self.zones)
+
+    def add_swing(self, swing):
+        """Incorpora un swing confirmado (Swing de market_structure). Devuelve la zona tocada/creada."""
+        price = swing.price
+        tolerance = price * self.width
+        i = bisect_left(self.centers, price)
+
+        # Candidatas: la zona inmediatamente debajo (i-1) y encima (i); gana la más cercana
+        best = None
+        for j in (i - 1, i):
+            if 0 <= j < len(self.zones) and abs(self.centers[j] - price) <= tolerance:
+                if best is None or abs(self.centers[j] - price) < abs(self.centers[best] - price):
+                    best = j
+
+        if best is None:
+            zone = Zone(price, swing.kind, swing.timestamp)
+            self.centers.insert(i, price)
+            self.zones.insert(i, zone)
+            if len(self.zones) > self.max_zones:
+                self._drop_oldest()
+            return zone
+
+        # El centro se mueve hacia el precio sin cruzar a las vecinas (el orden se mantiene)
+        zone = self.zones[best]
+        zone.touch(price, swing.kind, swing.timestamp)
+        self.centers[best] = zone.center
+        return self._merge_neighbors(best)
+
+    def _merge_neighbors(self, i):
+        zone = self.zones[i]
+        for j in (i + 1, i - 1):
+            if 0 <= j < len(self.zones) and abs(self.centers[j] - zone.center) <= zone.center * self.width:
+                keep, drop = min(i, j), max(i, j)
+                self.zones[keep].absorb(self.zones[drop])
+                self.centers[keep] = self.zones[keep].center
+                del self.zones[drop]
+                del self.centers[drop]
+                return self.zones[keep]
+        return zone
+
+    def _drop_oldest(self):
+        oldest = min(range(len(self.zones)), key=lambda j: self.zones[j].last_timestamp)
+        del self.zones[oldest]
+        del self.centers[oldest]
+
+    def nearest_above(self, price, min_touches=None):
+        """Zona válida más cercana con centro por encima de `price`, o None."""
+        min_touches = self.min_touches if min_touches is None else min_touches
+        for j in range(bisect_right(self.centers, price), len(self.zones)):
+            if self.zones[j].touches >= min_touches:
+                return self.zones[j]
+        return None
+
+    def nearest_below(self, price, min_touches=None):
+        """Zona válida más cercana con centro por debajo de `price`, o None."""
+        min_touches = self.min_touches if min_touches is None else min_touches
+        for j in range(bisect_left(self.centers, price) - 1, -1, -1):
+            if self.zones[j].touches >= min_touches:
+                return self.zones[j]
+        return None
+
+    def zone_at(self, price):
+        """Zona válida que contiene el precio (rango tocado ± width), o None."""
+        margin = price * self.width
+        i = bisect_left(self.centers, price)
+        for j in (i - 1, i):
+            if 0 <= j < len(self.zones):
+                zone = self.zones[j]
+                if zone.touches >= self.min_touches and zone.low - margin <= price <= zone.high + margin:
+                    return zone
+        return None
+
+    def blocking_zone(self, action, price):
+        """
+        Zona contraria demasiado cerca para entrar: resistencia encima en un BUY
+        o soporte debajo en un SELL, a menos de `clearance`. None si hay espacio.
+        """
+        limit = price * self.clearance
+        if action == BUY:
+            zone = self.nearest_above(price)
+            if zone is not None and zone.low - price < limit:
+                return zone
+        elif action == SELL:
+            zone = self.nearest_below(price)
+            if zone is not None and price - zone.high < limit:
+                return zone
+        return None
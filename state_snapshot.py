@@ -0,0 +1,85 @@
+"""
+Snapshot del estado en memoria del bot (velas y features por par).
+
+Se guarda al apagar y periódicamente durante la ejecución; al arrancar se
+restaura para que cada par solo tenga que descargar las velas que faltan
+desde el último snapshot en lugar de todo el histórico.
+"""
+import io
+import os
+import json
+import time
+import numpy as np
+
+from candle_frame import CandleFrame
+
+SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(path, frames, interval):
+    """
+    Guarda los CandleFrames por par en un .npz (escritura atómica).
+
+    Args:
+        path: Ruta del archivo .npz
+        frames: dict par -> CandleFrame
+        interval: Timeframe de las velas (segundos)
+    """
+    arrays = {}
+    pairs = []
+    for pair, frame in frames.items():
+        if frame.empty:
+            continue
+        pairs.append(pair)
+        for name, values in frame.export().items():
+            arrays[f"{pair}/{name}"] = values
+
+    meta = {'version': SNAPSHOT_VERSION, 'saved_at': time.time(), 'interval': interval, 'pairs': pairs}
+    arrays['__meta__'] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    return len(pairs)
+
+
+def load_snapshot(path, interval, max_age):
+    """
+    Restaura los CandleFrames guardados.
+
+    Devuelve {} si no existe el archivo, si es de otro timeframe/versión o si
+    es más viejo que `max_age` segundos (ya no serviría para completar).
+    """
+    if not os.path.exists(path):
+        return {}
+
+    with np.load(path) as data:
+        meta = json.loads(data['__meta__'].tobytes().decode('utf-8'))
+        if meta.get('version') != SNAPSHOT_VERSION or meta.get('interval') != interval:
+            return {}
+        if time.time() - meta.get('saved_at', 0) > max_age:
+            return {}
+
+        columns = {}
+        for key in data.files:
+            if key == '__meta__':
+                continue
+            pair, name = key.split('/', 1)
+            columns.setdefault(pair, {})[name] = data[key]
+
+    return {pair: CandleFrame.restore(arrays) for pair, arrays in columns.items() if 'Timestamp' in arrays}
+
+
+def encode_frame(arrays):
+    """Comprime un dict de arrays (CandleFrame.export) a bytes .npz."""
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def decode_frame(blob, capacity=512):
+    """Reconstruye el CandleFrame guardado con `encode_frame`."""
+    with np.load(io.BytesIO(blob)) as data:
+        arrays = {name: data[name] for name in data.files}
+    return CandleFrame.restore(arrays, capacity=capacity)
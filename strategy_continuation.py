@@ -1,10 +1,13 @@
 from strategy_stochastic import Strategy
+from market_structure import UP, DOWN
 
 class StrategyContinuation(Strategy):
+    requires = ('EMA_20', 'EMA_50', 'Pattern_Triangle', 'Pattern_Triangle_Upper', 'Pattern_Triangle_Lower')
+
     def __init__(self):
         super().__init__("Patrones de Continuación (Chartismo)")
         
-    def get_signal(self, df):
+    def get_signal(self, df, context=None):
         if df.empty:
             return 'HOLD', None, 0
             
@@ -27,17 +30,26 @@ class StrategyContinuation(Strategy):
         # Si hay triángulo, operamos SOLO si hay ruptura confirmada
         # Miramos la tendencia de corto plazo (EMA 20 vs 50) como filtro adicional
         trend_up = last['EMA_20'] > last['EMA_50']
+        # La estructura de swings (HH/HL, LH/LL) no debe contradecir la ruptura
+        structure_trend = context.structure.trend if context is not None else None
         
         # Confirmación de Ruptura Alcista
         # 1. Close actual > Resistencia del triángulo
         # 2. Tendencia a favor (opcional pero recomendado)
-        if current_close > tri_upper and trend_up:
+        if current_close > tri_upper and trend_up and structure_trend != DOWN:
+            # La ruptura necesita recorrido: sin resistencia S/R inmediata encima
+            conflict = self.zone_conflict(context, 'BUY', current_close)
+            if conflict:
+                return 'HOLD', conflict, 0
             return 'BUY', f"Ruptura Triángulo Alcista Confirmada (Close {current_close:.5f} > {tri_upper:.5f})", 300
             
         # Confirmación de Ruptura Bajista
         # 1. Close actual < Soporte del triángulo
         # 2. Tendencia a favor
-        elif current_close < tri_lower and not trend_up:
+        elif current_close < tri_lower and not trend_up and structure_trend != UP:
+            conflict = self.zone_conflict(context, 'SELL', current_close)
+            if conflict:
+                return 'HOLD', conflict, 0
             return 'SELL', f"Ruptura Triángulo Bajista Confirmada (Close {current_close:.5f} < {tri_lower:.5f})", 300
             
         return 'HOLD', None, 0
@@ -1,55 +1,60 @@
 from strategy_stochastic import Strategy
-import numpy as np
+from market_structure import UP, DOWN
+from pair_context import PairContext
 
 class StrategyFibonacci(Strategy):
-    def __init__(self):
-        super().__init__("Fibonacci Retracement 61.8%")
-        
-    def get_signal(self, df):
+    requires = ('SMA_200',)
+
+    def __init__(self, levels=(0.618,), tolerance=0.05):
+        """
+        Args:
+            levels: Retrocesos en los que se busca el rebote (de fibonacci.RETRACEMENTS)
+            tolerance: Distancia máxima al nivel, como fracción del impulso
+        """
+        # El nombre identifica los niveles (feedback y estadísticas son por nombre)
+        super().__init__("Fibonacci Retracement " + '/'.join(f"{ratio * 100:.1f}%" for ratio in sorted(levels)))
+        self.levels = levels
+        self.tolerance = tolerance
+
+    def get_signal(self, df, context=None):
         if df.empty or len(df) < 50:
             return 'HOLD', None, 0
-            
-        # Detectar el último impulso grande
-        # Buscamos min y max recientes (window 50)
-        window = df.iloc[-50:]
-        high_price = window['High'].max()
-        low_price = window['Low'].min()
-        
-        current_price = df.iloc[-1]['Close']
-        trend_sma = df.iloc[-1]['SMA_200']
-        
+
+        # El impulso es el último tramo entre swings confirmados (mínimo->máximo o
+        # máximo->mínimo, en ese orden), con los niveles ya calculados por tramo
+        if context is None:
+            context = PairContext.from_dataframe(df)
+        leg = context.fibonacci.leg
+        if leg is None:
+            return 'HOLD', None, 0
+
+        last = df.iloc[-1]
+        current_price = last['Close']
+        trend_sma = last['SMA_200']
+
+        # El retroceso debe seguir dentro del tramo (más allá del 100% el impulso queda invalidado)
+        if not leg.contains(current_price):
+            return 'HOLD', None, 0
+
+        ratio, level = leg.nearest_retracement(current_price)
+        if ratio not in self.levels or abs(current_price - level) > leg.range * self.tolerance:
+            return 'HOLD', None, 0
+
+        impulse = f"impulso {leg.start:.5f}->{leg.end:.5f}"
+
         # Contexto Alcista (Precio > SMA200)
-        # Impulso fue de Low a High. Esperamos retroceso a 61.8%
-        # Nivel 61.8 desde el Low hacia el High = High - (Range * 0.618)
-        price_range = high_price - low_price
-        if price_range == 0: return 'HOLD', None, 0
-        
-        fib_618_bull = high_price - (price_range * 0.618)
-        
-        # Si estamos en tendencia alcista
-        if current_price > trend_sma:
-            # Si el precio toca la zona del 61.8% (con margen de error)
-            dist = abs(current_price - fib_618_bull)
-            threshold = price_range * 0.05 # 5% de tolerancia
-            
-            if dist < threshold:
-                # Verificar señal de giro (ej. martillo o vela verde reciente)
-                # Por simplicidad, entramos si la vela actual es verde (Close > Open)
-                if df.iloc[-1]['Close'] > df.iloc[-1]['Open']:
-                     return 'BUY', "Rebote en Fibonacci 61.8%", 300
+        # Impulso fue de Low a High. Esperamos retroceso al nivel
+        if leg.direction == UP and current_price > trend_sma:
+            # Verificar señal de giro (ej. martillo o vela verde reciente)
+            # Por simplicidad, entramos si la vela actual es verde (Close > Open)
+            if last['Close'] > last['Open']:
+                return 'BUY', f"Rebote en Fibonacci {ratio * 100:.1f}% ({level:.5f}, {impulse})", 300
 
         # Contexto Bajista
-        # Impulso fue de High a Low. Retroceso sube hasta 61.8%
-        # Nivel 61.8 = Low + (Range * 0.618)
-        fib_618_bear = low_price + (price_range * 0.618)
-        
-        if current_price < trend_sma:
-            dist = abs(current_price - fib_618_bear)
-            threshold = price_range * 0.05
-            
-            if dist < threshold:
-                 # Vela roja confirmatoria
-                 if df.iloc[-1]['Close'] < df.iloc[-1]['Open']:
-                     return 'SELL', "Rechazo en Fibonacci 61.8%", 300
-                     
+        # Impulso fue de High a Low. Retroceso sube hasta el nivel
+        if leg.direction == DOWN and current_price < trend_sma:
+            # Vela roja confirmatoria
+            if last['Close'] < last['Open']:
+                return 'SELL', f"Rechazo en Fibonacci {ratio * 100:.1f}% ({level:.5f}, {impulse})", 300
+
         return 'HOLD', None, 0
@@ -0,0 +1,187 @@
+"""
+Registro de estrategias configurable con recarga en caliente.
+
+Descubre las subclases de Strategy en los módulos strategy_*.py y las
+activa/parametriza según strategies.json:
+
+    {
+        "StrategyStochastic": {"enabled": true},
+        "StrategyStructure": {"mode": "shadow"},
+        "StrategyFibonacci": {"params": {"levels": [0.5, 0.618], "tolerance": 0.05}}
+    }
+
+Las clases que no figuran en el archivo quedan activas con sus parámetros
+por defecto. Con "mode": "shadow" la estrategia se evalúa pero sus señales
+solo se registran como operaciones virtuales (ver shadow.py).
+
+El bot llama a reload() al inicio de cada vela: si cambió el archivo de
+configuración o algún módulo de estrategia, se recargan los módulos
+modificados y se reconstruye la lista sin reiniciar el proceso (los buffers
+de velas e indicadores del bot no se tocan). Solo se recargan los
+strategy_*.py; cambios en módulos auxiliares (pair_context.py, ...)
+requieren reiniciar.
+"""
+import logging
+import os
+import sys
+import glob
+import json
+import importlib
+
+log = logging.getLogger(__name__)
+
+BASE_MODULE = 'strategy_stochastic'  # Donde vive la clase base Strategy
+MODULE_PATTERN = 'strategy_*.py'
+
+
+def _directory():
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def _module_files(directory=None):
+    """módulo -> ruta de los strategy_*.py (sin el propio registro)."""
+    files = {}
+    for path in sorted(glob.glob(os.path.join(directory or _directory(), MODULE_PATTERN))):
+        module_name = os.path.splitext(os.path.basename(path))[0]
+        if module_name != 'strategy_registry':
+            files[module_name] = path
+    return files
+
+
+def _strategy_classes(module, base):
+    return [attr for attr in vars(module).values()
+            if isinstance(attr, type) and issubclass(attr, base) and attr is not base
+            and attr.__module__ == module.__name__]
+
+
+def discover_strategies(directory=None):
+    """[(módulo, clase)] de todas las estrategias en strategy_*.py."""
+    base = importlib.import_module(BASE_MODULE).Strategy
+    found = []
+    for module_name in _module_files(directory):
+        module = importlib.import_module(module_name)
+        found.extend((module_name, cls.__name__) for cls in _strategy_classes(module, base))
+    return found
+
+
+class StrategyRegistry:
+    def __init__(self, path='strategies.json', directory=None):
+        """
+        Args:
+            path: Archivo JSON de activación/parámetros por clase
+            directory: Carpeta con los strategy_*.py (por defecto la del bot)
+        """
+        self.path = path
+        self.directory = directory
+        self.strategies = []
+        self.shadow = []  # Estrategias en modo sombra
+        self.config = {}
+        self._mtimes = {}
+        self._instances = {}  # clase -> (parámetros JSON, instancia), se reutilizan si no cambian
+
+    def load(self):
+        """Carga inicial: descubre, configura e instancia. Devuelve las estrategias activas."""
+        self._mtimes = self._snapshot_mtimes()
+        self.config = self._read_config()
+        self.strategies, self.shadow = self._build(self._discover())
+        self._report()
+        return self.strategies
+
+    def reload(self):
+        """
+        Aplica cambios de configuración o de módulos desde la última carga.
+        Si falla (módulo con errores, JSON inválido) se conservan las estrategias actuales.
+
+        Returns:
+            True si la lista de estrategias se reconstruyó
+        """
+        mtimes = self._snapshot_mtimes()
+        if mtimes == self._mtimes:
+            return False
+        changed = {name for name, mtime in mtimes.items()
+                   if name != self.path and self._mtimes.get(name) != mtime}
+        # Se registran los mtimes aunque falle: se reintenta cuando el archivo vuelva a cambiar
+        self._mtimes = mtimes
+
+        try:
+            config = self._read_config(strict=True)
+            if BASE_MODULE in changed:
+                # Con una clase base nueva hay que recargar todas las subclases
+                # (y todas las instancias, incluidas las de las clases del propio módulo base)
+                changed = set(_module_files(self.directory))
+                importlib.reload(importlib.import_module(BASE_MODULE))
+                self._instances.clear()
+            for module_name in sorted(changed - {BASE_MODULE}):
+                if module_name in sys.modules:
+                    importlib.reload(sys.modules[module_name])
+                # Las instancias de clases recargadas se reconstruyen
+                for class_name in [name for name, (_, instance) in self._instances.items()
+                                   if type(instance).__module__ == module_name]:
+                    del self._instances[class_name]
+            strategies, shadow = self._build(self._discover(), config)
+        except Exception as e:
+            log.error(f"[Strategies] Error al recargar ({e}). Se mantienen las estrategias actuales.")
+            return False
+
+        self.config = config
+        self.strategies = strategies
+        self.shadow = shadow
+        log.info(f"[Strategies] Recargadas (módulos: {', '.join(sorted(changed)) or 'ninguno'})")
+        self._report()
+        return True
+
+    def _snapshot_mtimes(self):
+        mtimes = {module_name: os.path.getmtime(path)
+                  for module_name, path in _module_files(self.directory).items()}
+        mtimes[self.path] = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        return mtimes
+
+    def _read_config(self, strict=False):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except ValueError as e:
+            if strict:
+                raise
+            log.warning(f"[Strategies] {self.path} inválido ({e}). Se usan los valores por defecto.")
+            return {}
+
+    def _discover(self):
+        base = importlib.import_module(BASE_MODULE).Strategy
+        classes = []
+        for module_name in _module_files(self.directory):
+            classes.extend(_strategy_classes(importlib.import_module(module_name), base))
+        return classes
+
+    def _build(self, classes, config=None):
+        """(activas, en modo sombra) según la configuración."""
+        config = self.config if config is None else config
+        known = {cls.__name__ for cls in classes}
+        for class_name in config:
+            if class_name not in known:
+                log.warning(f"[Strategies] {class_name} figura en {self.path} pero no existe")
+
+        # Orden: el del archivo de configuración; las no configuradas al final
+        order = {class_name: i for i, class_name in enumerate(config)}
+        strategies = []
+        shadow = []
+        for cls in sorted(classes, key=lambda c: order.get(c.__name__, len(order))):
+            entry = config.get(cls.__name__, {})
+            if not entry.get('enabled', True):
+                self._instances.pop(cls.__name__, None)
+                continue
+            params = entry.get('params', {})
+            key = json.dumps(params, sort_keys=True)
+            cached = self._instances.get(cls.__name__)
+            if cached is None or cached[0] != key:
+                cached = self._instances[cls.__name__] = (key, cls(**params))
+            (shadow if entry.get('mode') == 'shadow' else strategies).append(cached[1])
+        return strategies, shadow
+
+    def _report(self):
+        names = ', '.join(strategy.name for strategy in self.strategies) or 'ninguna'
+        log.info(f"[Strategies] Activas: {names}")
+        if self.shadow:
+            log.info(f"[Strategies] En modo sombra: {', '.join(strategy.name for strategy in self.shadow)}")
@@ -1,12 +1,19 @@
 from abc import ABC, abstractmethod
 
 class Strategy(ABC):
+    # Columnas del CandleFrame que lee get_signal (el analizador calcula solo estas)
+    requires = ()
+
     def __init__(self, name):
         self.name = name
 
     @abstractmethod
-    def get_signal(self, df):
+    def get_signal(self, df, context=None):
         """
+        Args:
+            df: Vista pandas de las velas y features del par
+            context: PairContext del par (estructura de mercado incremental); opcional
+
         Retorna:
         - 'BUY', 'SELL' o 'HOLD'
         - Razón/Detalle
@@ -14,11 +21,26 @@ class Strategy(ABC):
         """
         pass
 
+    @staticmethod
+    def zone_conflict(context, action, price):
+        """
+        Razón para descartar la entrada si hay una zona S/R contraria pegada
+        al precio (resistencia encima en BUY, soporte debajo en SELL), o None.
+        """
+        if context is None:
+            return None
+        zone = context.zones.blocking_zone(action, price)
+        if zone is None:
+            return None
+        return f"zona {'resistencia' if action == 'BUY' else 'soporte'} {zone.center:.5f} ({zone.touches} toques)"
+
 class StrategyStochastic(Strategy):
+    requires = ('SMA_200', 'Stoch_K', 'Stoch_D')
+
     def __init__(self):
         super().__init__("Estocástico + SMA200")
         
-    def get_signal(self, df):
+    def get_signal(self, df, context=None):
         if df.empty or len(df) < 200:
             return 'HOLD', None, 0
             
@@ -33,12 +55,19 @@ class StrategyStochastic(Strategy):
         # Cruce exacto: K anterior < D anterior Y K actual > D actual
         if trend == 'BULL':
             if prev['Stoch_K'] < 20 and prev['Stoch_K'] < prev['Stoch_D'] and last['Stoch_K'] > last['Stoch_D']:
+                 # Sin recorrido si hay una resistencia justo encima
+                 conflict = self.zone_conflict(context, 'BUY', last['Close'])
+                 if conflict:
+                     return 'HOLD', conflict, 0
                  return 'BUY', "Cruce Estocástico en Sobreventa + Tendencia Alcista", 300 # 5 min
                  
         # 3. Señal de Venta (Tendencia Bajista)
         # Estocástico estaba en sobrecompra (>80) y cruza hacia abajo su media
         if trend == 'BEAR':
             if prev['Stoch_K'] > 80 and prev['Stoch_K'] > prev['Stoch_D'] and last['Stoch_K'] < last['Stoch_D']:
+                conflict = self.zone_conflict(context, 'SELL', last['Close'])
+                if conflict:
+                    return 'HOLD', conflict, 0
                 return 'SELL', "Cruce Estocástico en Sobrecompra + Tendencia Bajista", 300
                 
         return 'HOLD', None, 0
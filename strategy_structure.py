@@ -1,49 +1,67 @@
 from strategy_stochastic import Strategy
+from market_structure import DOWN
+from pair_context import PairContext
 
 class StrategyStructure(Strategy):
+    requires = ('MACD', 'MACD_Signal', 'Pattern_DoubleTop', 'Pattern_DoubleTop_Neck',
+                'Pattern_DoubleBottom', 'Pattern_DoubleBottom_Neck')
+
     def __init__(self):
         super().__init__("Cambio de Estructura (MSS)")
-        
-    def get_signal(self, df):
+
+    def get_signal(self, df, context=None):
         if df.empty or len(df) < 20:
             return 'HOLD', None, 0
-            
+
+        # Sin contexto del bot (llamada suelta) se arma desde el DataFrame
+        if context is None:
+            context = PairContext.from_dataframe(df)
+        structure = context.structure
+
         last = df.iloc[-1]
-        
-        # Patrón de Doble Techo o Doble Suelo con confirmación de ruptura de NECKLINE
-        
+
         # Como Pattern_DoubleTop se marca en la última vela analizada de una ventana deslizante,
         # puede que el patrón se detectara hace poco.
         # Buscamos si hubo un patrón en las últimas 5 velas
         recent = df.iloc[-5:]
-        
-        double_top_detected = recent['Pattern_DoubleTop'].max() == 1
-        double_bottom_detected = recent['Pattern_DoubleBottom'].max() == 1
-        
-        # Cambio a Bajista (Doble Techo + Ruptura de Soporte/Neckline)
-        if double_top_detected:
+
+        # La dirección la decide el quiebre de estructura reciente (no el patrón):
+        # un Doble Techo seguido de un quiebre alcista NO es venta.
+        # CHOCH = quiebre contra la tendencia previa (HH/HL o LH/LL) -> cambio de estructura
+        # BOS = quiebre a favor de la tendencia -> continuación
+        brk = structure.recent_break(PairContext.bar_timestamp(df, -5))
+        if brk is None:
+            return 'HOLD', None, 0
+        label_kind = 'Cambio de Estructura' if brk['kind'] == 'CHOCH' else 'Continuación'
+
+        # Bajista (Doble Techo + Ruptura de Soporte/Neckline + quiebre bajista)
+        if brk['direction'] == DOWN:
+            if recent['Pattern_DoubleTop'].max() != 1:
+                return 'HOLD', None, 0
             # Recuperar el nivel del neckline (el último valor no nulo detectado)
             neckline_series = recent['Pattern_DoubleTop_Neck'].dropna()
             if not neckline_series.empty:
                 neckline = neckline_series.iloc[-1]
-                
+
                 # Verificar ruptura: El cierre actual debe estar CLARAMENTE POR DEBAJO del neckline
-                # Estrategia pide "Retesteo", una aproximación simple es que la ruptura ya ocurrió
-                # y el precio actual está cerca del nivel roto pero confirmando la baja.
                 if last['Close'] < neckline:
                      # Confirmación extra: MACD cruzando a la baja (momentum bajista)
-                     if last['MACD'] < last['MACD_Signal']:
-                         return 'SELL', f"Cambio Estructura: Doble Techo + Ruptura confirmada de {neckline:.5f}", 300
-                 
-        # Cambio a Alcista (Doble Suelo + Ruptura de Resistencia/Neckline)
-        if double_bottom_detected:
-            neckline_series = recent['Pattern_DoubleBottom_Neck'].dropna()
-            if not neckline_series.empty:
-                neckline = neckline_series.iloc[-1]
-                
-                # Verificar ruptura: El cierre actual debe estar CLARAMENTE POR ENCIMA del neckline
-                if last['Close'] > neckline:
-                    if last['MACD'] > last['MACD_Signal']:
-                        return 'BUY', f"Cambio Estructura: Doble Suelo + Ruptura confirmada de {neckline:.5f}", 300
-                
+                     if last['MACD'] < last['MACD_Signal'] and not self.zone_conflict(context, 'SELL', last['Close']):
+                         return 'SELL', (f"{label_kind} Bajista: Doble Techo + quiebre de {brk['level']:.5f} "
+                                         f"(neckline {neckline:.5f}, tendencia {structure.trend})"), 300
+            return 'HOLD', None, 0
+
+        # Alcista (Doble Suelo + Ruptura de Resistencia/Neckline + quiebre alcista)
+        if recent['Pattern_DoubleBottom'].max() != 1:
+            return 'HOLD', None, 0
+        neckline_series = recent['Pattern_DoubleBottom_Neck'].dropna()
+        if not neckline_series.empty:
+            neckline = neckline_series.iloc[-1]
+
+            # Verificar ruptura: El cierre actual debe estar CLARAMENTE POR ENCIMA del neckline
+            if last['Close'] > neckline:
+                if last['MACD'] > last['MACD_Signal'] and not self.zone_conflict(context, 'BUY', last['Close']):
+                    return 'BUY', (f"{label_kind} Alcista: Doble Suelo + quiebre de {brk['level']:.5f} "
+                                   f"(neckline {neckline:.5f}, tendencia {structure.trend})"), 300
+
         return 'HOLD', None, 0
@@ -1,7 +1,18 @@
-import aiohttp
+import logging
 import asyncio
+import html
 from pathlib import Path
 
+from image_store import ImageStore
+
+log = logging.getLogger(__name__)
+
+# Listener de updates
+LONG_POLL_TIMEOUT = 30      # Segundos que Telegram mantiene abierto getUpdates
+UPDATE_WORKERS = 4          # Updates procesados en paralelo
+UPDATE_QUEUE_SIZE = 100     # Si se llena, se deja de pedir updates (backpressure)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
 class TelegramNotifier:
     def __init__(self, token, chat_id, feedback_db=None):
         # Sanitize token: remove 'bot' prefix if user included it
@@ -15,15 +26,31 @@ class TelegramNotifier:
         # Verify and log configuration
         if self.token:
             masked = f"{self.token[:4]}...{self.token[-4:]}" if len(self.token) > 8 else "***"
-            print(f"[Telegram] Configurado con token: {masked}")
+            log.info(f"[Telegram] Configurado con token: {masked}")
             self.base_url = f"https://api.telegram.org/bot{self.token}"
         else:
-            print("[Telegram] Token no proporcionado.")
+            log.warning("[Telegram] Token no proporcionado.")
             self.base_url = ""
 
         self.feedback_db = feedback_db
+        self.image_store = ImageStore('feedback_images', feedback_db)
         self.last_update_id = 0
         self.listening = False
+        self._session = None
+        self.commands = {}  # '/comando' -> async handler(args) -> texto de respuesta
+
+    async def _get_session(self):
+        """Sesión HTTP compartida (reutiliza conexiones entre requests)."""
+        import aiohttp
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def close(self):
+        """Cierra la sesión HTTP compartida y el pool de miniaturas."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self.image_store.close()
 
     async def send_message(self, message, reply_to_message_id=None):
         """Envía un mensaje a Telegram de forma asíncrona."""
@@ -41,18 +68,45 @@ class TelegramNotifier:
             payload['reply_to_message_id'] = reply_to_message_id
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.base_url}/sendMessage", json=payload) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get('result', {}).get('message_id')
-                    else:
-                        print(f"[Telegram] Error enviando mensaje: {response.status}")
-                        text = await response.text()
-                        print(f"[Telegram] Respuesta: {text}")
-                        return None
+            session = await self._get_session()
+            async with session.post(f"{self.base_url}/sendMessage", json=payload) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    return data.get('result', {}).get('message_id')
+                else:
+                    log.error(f"[Telegram] Error enviando mensaje: {response.status}")
+                    text = await response.text()
+                    log.warning(f"[Telegram] Respuesta: {text}")
+                    return None
         except Exception as e:
-            print(f"[Telegram] Excepción al enviar: {e}")
+            log.error(f"[Telegram] Excepción al enviar: {e}")
+            return None
+
+    async def send_photo(self, path, caption=None, reply_to_message_id=None):
+        """Sube una imagen (sendPhoto multipart). Devuelve el message_id o None."""
+        if not self.token or not self.chat_id:
+            return None
+        import aiohttp
+        try:
+            data = await asyncio.to_thread(Path(path).read_bytes)
+            form = aiohttp.FormData()
+            form.add_field('chat_id', str(self.chat_id))
+            form.add_field('photo', data, filename=Path(path).name, content_type='image/png')
+            if caption:
+                form.add_field('caption', caption)
+                form.add_field('parse_mode', 'HTML')
+            if reply_to_message_id:
+                form.add_field('reply_to_message_id', str(reply_to_message_id))
+            session = await self._get_session()
+            async with session.post(f"{self.base_url}/sendPhoto", data=form) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    return result.get('result', {}).get('message_id')
+                log.error(f"[Telegram] Error enviando imagen: {response.status}")
+                log.warning(f"[Telegram] Respuesta: {await response.text()}")
+                return None
+        except Exception as e:
+            log.error(f"[Telegram] Excepción al enviar imagen: {e}")
             return None
 
     async def notify_open(self, pair, action, strategy, timeframe, amount):
@@ -69,7 +123,8 @@ class TelegramNotifier:
             f"💵 <b>Monto:</b> ${amount}\n"
             f"🕓 <b>Fecha y hora:</b> {self._get_time()}"
         )
-        await self.send_message(msg)
+        message_id = await self.send_message(msg)
+        return message_id
 
     async def notify_close(self, pair, profit, is_win):
         icon = "✅" if is_win else "❌"
@@ -129,48 +184,96 @@ class TelegramNotifier:
         return datetime.now(tz).strftime('%Y-%m-%d %H:%M:%S')
     
     async def start_listening(self):
-        """Inicia el listener de mensajes de Telegram en background."""
+        """
+        Inicia el listener de mensajes de Telegram en background.
+
+        Encadena long polls sin pausas y reparte los updates en un pool acotado
+        de workers. Si la cola se llena, el poll espera (los updates quedan en
+        Telegram) en lugar de acumularlos en memoria.
+        """
         if not self.token or not self.chat_id:
-            print("[Telegram Listener] No configurado.")
+            log.warning("[Telegram Listener] No configurado.")
             return
         
         self.listening = True
-        print("[Telegram Listener] Iniciado. Esperando feedback...")
+        queue = asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE)
+        workers = [asyncio.create_task(self._update_worker(queue)) for _ in range(UPDATE_WORKERS)]
+        log.info("[Telegram Listener] Iniciado. Esperando feedback...")
         
-        while self.listening:
-            try:
-                await self._poll_updates()
-                await asyncio.sleep(2)  # Poll cada 2 segundos
-            except Exception as e:
-                print(f"[Telegram Listener] Error: {e}")
-                await asyncio.sleep(5)
+        backoff = 1
+        try:
+            while self.listening:
+                try:
+                    updates = await self._poll_updates()
+                    backoff = 1
+                except Exception as e:
+                    # Solo esperamos ante errores (red caída, 5xx), con backoff exponencial
+                    log.error(f"[Telegram Listener] Error: {e}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+                    continue
+                
+                for update in updates:
+                    await queue.put(update)
+                    self.last_update_id = update['update_id']
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await self.close()
     
     def stop_listening(self):
         """Detiene el listener."""
         self.listening = False
     
+    def register_command(self, command, handler):
+        """Registra un comando de chat (p.ej. '/doc'). El handler recibe el texto tras el comando."""
+        self.commands[command.lower()] = handler
+
+    async def _handle_command(self, message, text):
+        """Ejecuta un comando registrado y responde en el chat (texto plano, escapado)."""
+        command, _, args = text.partition(' ')
+        handler = self.commands.get(command.split('@')[0].lower())
+        if handler is None:
+            return False
+        try:
+            reply = await handler(args.strip())
+        except Exception as e:
+            reply = f"Error ejecutando {command}: {e}"
+        if reply:
+            await self.send_message(f"<pre>{html.escape(reply[:3900])}</pre>",
+                                    reply_to_message_id=message.get('message_id'))
+        return True
+
+    async def _update_worker(self, queue):
+        """Procesa updates de la cola de forma independiente del long poll."""
+        while True:
+            update = await queue.get()
+            try:
+                await self._process_update(update)
+            except Exception as e:
+                log.error(f"[Telegram Listener] Error procesando update {update.get('update_id')}: {e}")
+            finally:
+                queue.task_done()
+    
     async def _poll_updates(self):
-        """Obtiene nuevos mensajes de Telegram."""
+        """Obtiene nuevos mensajes de Telegram (long poll). Devuelve la lista de updates."""
+        import aiohttp
         url = f"{self.base_url}/getUpdates"
         params = {
             'offset': self.last_update_id + 1,
-            'timeout': 30
+            'timeout': LONG_POLL_TIMEOUT
         }
         
+        session = await self._get_session()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=35)) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        updates = data.get('result', [])
-                        
-                        for update in updates:
-                            self.last_update_id = update['update_id']
-                            await self._process_update(update)
+            async with session.get(url, params=params,
+                                   timeout=aiohttp.ClientTimeout(total=LONG_POLL_TIMEOUT + 5)) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"getUpdates devolvió {response.status}")
+                data = await response.json()
+                return data.get('result', [])
         except asyncio.TimeoutError:
-            pass  # Normal, solo significa que no hubo mensajes
-        except Exception as e:
-            print(f"[Telegram Listener] Error polling: {e}")
+            return []  # Normal, solo significa que no hubo mensajes
     
     async def _process_update(self, update):
         """Procesa un update de Telegram."""
@@ -182,6 +285,11 @@ class TelegramNotifier:
         if str(message.get('chat', {}).get('id')) != str(self.chat_id):
             return
         
+        # Comandos (/doc, ...)
+        text = message.get('text', '')
+        if text.startswith('/') and await self._handle_command(message, text):
+            return
+        
         # Verificar si es una respuesta a un mensaje del bot
         reply_to = message.get('reply_to_message')
         if not reply_to:
@@ -197,50 +305,56 @@ class TelegramNotifier:
         if 'photo' in message:
             image_path = await self._download_image(message['photo'])
         
-        # Guardar feedback en la base de datos
+        # Guardar feedback en la base de datos (SQLite fuera del event loop)
         if self.feedback_db and (feedback_text or image_path):
-            success = self.feedback_db.add_feedback(replied_message_id, feedback_text, image_path)
+            success = await asyncio.to_thread(
+                self.feedback_db.add_feedback, replied_message_id, feedback_text, image_path
+            )
             if success:
-                print(f"[Feedback] ✅ Guardado para mensaje {replied_message_id}")
+                log.info(f"[Feedback] ✅ Guardado para mensaje {replied_message_id}")
                 await self.send_message("✅ Feedback guardado. ¡Gracias!")
             else:
-                print(f"[Feedback] ⚠️ No se encontró operación para mensaje {replied_message_id}")
+                log.warning(f"[Feedback] ⚠️ No se encontró operación para mensaje {replied_message_id}")
     
     async def _download_image(self, photos):
-        """Descarga la imagen enviada por el usuario."""
+        """
+        Descarga la imagen enviada por el usuario al almacén de imágenes.
+        Si el mismo archivo (file_unique_id) ya se descargó, se reutiliza.
+        """
         # Telegram envía varias resoluciones, tomamos la más grande
         photo = max(photos, key=lambda p: p.get('file_size', 0))
         file_id = photo['file_id']
+        file_unique_id = photo.get('file_unique_id')
         
         try:
+            known_path = await self.image_store.lookup(file_unique_id)
+            if known_path:
+                log.debug(f"[Feedback] Imagen ya conocida: {known_path}")
+                return known_path
+            
+            session = await self._get_session()
+            
             # Obtener ruta del archivo
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}/getFile"
-                params = {'file_id': file_id}
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        file_path = data['result']['file_path']
-                        
-                        # Descargar imagen
-                        download_url = f"https://api.telegram.org/file/bot{self.token}/{file_path}"
-                        async with session.get(download_url) as img_response:
-                            if img_response.status == 200:
-                                # Guardar en carpeta feedback_images
-                                images_dir = Path('feedback_images')
-                                images_dir.mkdir(exist_ok=True)
-                                
-                                # Nombre único basado en timestamp
-                                from datetime import datetime
-                                filename = f"feedback_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file_id[:8]}.jpg"
-                                save_path = images_dir / filename
-                                
-                                with open(save_path, 'wb') as f:
-                                    f.write(await img_response.read())
-                                
-                                print(f"[Feedback] Imagen guardada: {save_path}")
-                                return str(save_path)
+            url = f"{self.base_url}/getFile"
+            params = {'file_id': file_id}
+            async with session.get(url, params=params) as response:
+                if response.status != 200:
+                    return None
+                data = await response.json()
+                file_path = data['result']['file_path']
+            
+            # Descargar imagen en chunks (se hashea mientras se escribe)
+            download_url = f"https://api.telegram.org/file/bot{self.token}/{file_path}"
+            async with session.get(download_url) as img_response:
+                if img_response.status != 200:
+                    return None
+                
+                save_path = await self.image_store.save_stream(
+                    img_response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE), file_unique_id
+                )
+                log.info(f"[Feedback] Imagen guardada: {save_path}")
+                return save_path
         except Exception as e:
-            print(f"[Feedback] Error descargando imagen: {e}")
+            log.error(f"[Feedback] Error descargando imagen: {e}")
         
         return None
@@ -0,0 +1,18 @@
+"""Paridad de kernels.py sobre un histórico sintético corto (las comparaciones de benchmark_kernels.py)."""
+import benchmark_kernels
+import kernels
+
+
+def test_loop_matches_numpy_fallback():
+    candles = benchmark_kernels.synthetic_candles(1500, seed=0)
+    assert benchmark_kernels.check_backends(candles, f"1500 velas, {kernels.BACKEND}") == []
+
+
+def test_indicators_match_ta():
+    candles = benchmark_kernels.synthetic_candles(1500, seed=1)
+    assert benchmark_kernels.check_ta(candles) == []
+
+
+def test_local_extremes_match_pandas():
+    candles = benchmark_kernels.synthetic_candles(1500, seed=2)
+    assert benchmark_kernels.check_local_extremes(candles) == []
@@ -0,0 +1,44 @@
+"""Patrones chartistas: visibles en la vista de velas cerradas (vela en formación al final)."""
+import numpy as np
+
+from candle_frame import CandleFrame
+from patterns import PatternRecognizer
+
+PATTERN_COLUMNS = ('Pattern_Triangle', 'Pattern_Triangle_Upper', 'Pattern_Triangle_Lower',
+                   'Pattern_DoubleTop', 'Pattern_DoubleTop_Neck',
+                   'Pattern_DoubleBottom', 'Pattern_DoubleBottom_Neck')
+
+
+def converging_candles(bars):
+    """Zigzag que se contrae: máximos decrecientes y mínimos crecientes (triángulo)."""
+    t = np.arange(bars)
+    close = 1 + 0.01 * np.exp(-t / 40) * np.sin(2 * np.pi * t / 12)
+    return {'Timestamp': 1_700_000_000 + t * 300, 'Open': close,
+            'High': close + 1e-4, 'Low': close - 1e-4, 'Close': close}
+
+
+def chart_patterns(candles):
+    frame = CandleFrame.restore(candles, capacity=len(candles['Close']) + 16)
+    PatternRecognizer().find_chart_patterns(frame)
+    return frame
+
+
+def test_closed_bar_pattern_visible_in_confirmed_view():
+    candles = converging_candles(45)
+    closed = chart_patterns({name: values[:-1] for name, values in candles.items()})
+    assert closed['Pattern_Triangle'][-1] == 1
+
+    # Se agrega la vela en formación: la vista 'confirmed' (df.iloc[:-1]) termina en la fila -2
+    frame = chart_patterns(candles)
+    confirmed = frame.to_pandas().iloc[:-1]
+    assert confirmed['Pattern_Triangle'].iloc[-1] == 1
+    assert confirmed['Pattern_Triangle_Upper'].iloc[-1] < closed['High'].max()
+
+
+def test_closed_row_ignores_forming_bar():
+    # La fila -2 se calcula igual que sin la vela en formación (sin mirar el futuro)
+    candles = converging_candles(45)
+    closed = chart_patterns({name: values[:-1] for name, values in candles.items()})
+    frame = chart_patterns(candles)
+    for name in PATTERN_COLUMNS:
+        np.testing.assert_array_equal(frame[name][-2], closed[name][-1], err_msg=name)
@@ -0,0 +1,252 @@
+"""
+Ingesta de precios en tiempo real.
+
+Se suscribe al stream de precios del broker (si el SDK lo expone) y agrega
+los ticks en velas OHLC localmente, en un ring buffer por par. El bot
+completa su CandleFrame desde acá en lugar de pedir `get_candles`; el
+polling queda como respaldo para rellenar huecos (arranque, reconexiones).
+
+Para pruebas locales sin broker se puede usar SyntheticTickGenerator como
+fuente de ticks.
+"""
+import logging
+import asyncio
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def _tick_time(value):
+    """Convierte el timestamp del tick (epoch o ISO 8601) a epoch en segundos."""
+    if isinstance(value, (int, float)):
+        # Algunos feeds mandan milisegundos
+        return value / 1000.0 if value > 1e11 else float(value)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+
+
+def _parse_tick(tick):
+    """Extrae (timestamp, precio, máximo, mínimo) de un tick o vela parcial del SDK."""
+    keys = {k.lower(): k for k in tick}
+    ts = _tick_time(tick[keys['time']]) if 'time' in keys else time.time()
+    price_key = keys.get('price') or keys.get('close')
+    price = float(tick[price_key])
+    high = float(tick[keys['high']]) if 'high' in keys else price
+    low = float(tick[keys['low']]) if 'low' in keys else price
+    return ts, price, high, low
+
+
+class CandleRing:
+    """Ring buffer de velas cerradas + la vela en formación de un par."""
+
+    def __init__(self, interval, capacity=64):
+        self.interval = interval
+        self.capacity = capacity
+        self._data = np.zeros((capacity, 5), dtype=np.float64)  # ts, open, high, low, close
+        self._count = 0
+        self.current = None  # [ts, open, high, low, close] de la vela en formación
+        self.last_tick = 0.0
+        # Primera vela cuya apertura vio el ring: la del primer tick (o la primera
+        # después de un hueco) puede ser parcial y no debe pisar una vela del polling
+        self.complete_from = None
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def add_tick(self, ts, price, high=None, low=None):
+        """
+        Agrega un tick. Devuelve la vela que se cerró (si el tick abrió una nueva).
+        Los ticks atrasados respecto de la vela en formación se ignoran.
+        """
+        high = price if high is None else high
+        low = price if low is None else low
+        bucket = int(ts // self.interval) * self.interval
+        closed = None
+
+        current = self.current
+        if current is None or bucket > current[0]:
+            if current is not None:
+                closed = self._push(current)
+            if current is None or bucket > current[0] + self.interval:
+                # Arranque o hueco (velas sin ticks: stream cortado): esta vela es completa
+                # solo si el tick cae justo en su apertura
+                self.complete_from = bucket if ts == bucket else bucket + self.interval
+            self.current = [bucket, price, high, low, price]
+        elif bucket == current[0]:
+            if high > current[2]:
+                current[2] = high
+            if low < current[3]:
+                current[3] = low
+            current[4] = price
+
+        self.last_tick = max(self.last_tick, ts)
+        return closed
+
+    def _push(self, candle):
+        self._data[self._count % self.capacity] = candle
+        self._count += 1
+        return candle
+
+    def _closed(self):
+        """Velas cerradas en orden cronológico (copia)."""
+        n = len(self)
+        start = self._count - n
+        idx = np.arange(start, self._count) % self.capacity
+        return self._data[idx]
+
+    @property
+    def first_timestamp(self):
+        """Timestamp de la vela más vieja disponible (cerrada o en formación)."""
+        if len(self):
+            return int(self._data[(self._count - len(self)) % self.capacity, 0])
+        if self.current is not None:
+            return int(self.current[0])
+        return None
+
+    def candles_since(self, timestamp, include_forming=True):
+        """
+        Velas con ts >= timestamp, en el formato de la API (lista de dicts).
+        Devuelve [] si el ring no cubre desde `timestamp` (hay un hueco o la vela
+        de `timestamp` es parcial porque el stream arrancó con ella ya abierta).
+        """
+        first = self.first_timestamp
+        if first is None or self.complete_from is None:
+            return []
+        start = max(first, self.complete_from)
+        if timestamp is not None:
+            if start > timestamp:
+                return []
+            start = timestamp
+
+        rows = self._closed()
+        rows = rows[rows[:, 0] >= start]
+        candles = [{'time': int(r[0]), 'open': r[1], 'high': r[2], 'low': r[3], 'close': r[4]}
+                   for r in rows]
+        if include_forming and self.current is not None and self.current[0] >= start:
+            ts, o, h, l, c = self.current
+            candles.append({'time': int(ts), 'open': o, 'high': h, 'low': l, 'close': c})
+        return candles
+
+
+class TickStream:
+    """Suscripciones por par al stream del broker, agregadas en CandleRings."""
+
+    def __init__(self, api, interval, stale_after=15, capacity=64):
+        self.api = api
+        self.interval = interval
+        self.stale_after = stale_after
+        self.capacity = capacity
+        self.rings = {}
+        self._tasks = {}
+        self._candle_closed = asyncio.Event()
+
+    @staticmethod
+    def supported(api):
+        """True si el SDK expone un stream de precios en tiempo real."""
+        return callable(getattr(api, 'subscribe_symbol', None))
+
+    def start(self, pairs, subscribe=None):
+        """
+        Lanza una tarea de suscripción por par.
+
+        Args:
+            pairs: Pares a seguir
+            subscribe: Fuente de ticks `async subscribe(pair) -> async iterator`
+                       (por defecto `api.subscribe_symbol`)
+        """
+        subscribe = subscribe or self.api.subscribe_symbol
+        for pair in pairs:
+            if pair in self._tasks:
+                continue
+            self.rings[pair] = CandleRing(self.interval, self.capacity)
+            self._tasks[pair] = asyncio.create_task(self._consume(pair, subscribe))
+        log.info(f"[Stream] Suscrito a {len(self._tasks)} pares")
+
+    async def _consume(self, pair, subscribe):
+        ring = self.rings[pair]
+        backoff = 1
+        while True:
+            try:
+                subscription = await subscribe(pair)
+                async for tick in subscription:
+                    ts, price, high, low = _parse_tick(tick)
+                    if ring.add_tick(ts, price, high, low) is not None:
+                        self._candle_closed.set()
+                    backoff = 1
+                log.warning(f"[Stream] Suscripción de {pair} finalizada. Reconectando...")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f"[Stream] Error en {pair}: {e}. Reintentando en {backoff}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def is_live(self, pair, now=None):
+        """True si llegaron ticks del par recientemente."""
+        ring = self.rings.get(pair)
+        if ring is None or ring.current is None:
+            return False
+        now = now if now is not None else time.time()
+        return now - ring.last_tick <= self.stale_after
+
+    def candles_since(self, pair, timestamp):
+        ring = self.rings.get(pair)
+        if ring is None:
+            return []
+        return ring.candles_since(timestamp)
+
+    async def wait_candle_close(self, timeout):
+        """Espera hasta que cierre una vela en cualquier par (o hasta `timeout`)."""
+        self._candle_closed.clear()
+        try:
+            await asyncio.wait_for(self._candle_closed.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+
+class SyntheticTickGenerator:
+    """
+    Fuente local de ticks (random walk) con la misma interfaz que
+    `api.subscribe_symbol`, para pruebas sin conexión al broker.
+
+    Con `realtime=False` los timestamps avanzan `tick_seconds` por tick sin
+    esperar, útil para simular muchas velas en poco tiempo.
+    """
+
+    def __init__(self, start_price=1.0, volatility=0.0002, tick_seconds=1.0,
+                 realtime=True, max_ticks=None, start_time=None, seed=None):
+        self.start_price = start_price
+        self.volatility = volatility
+        self.tick_seconds = tick_seconds
+        self.realtime = realtime
+        self.max_ticks = max_ticks
+        self.start_time = start_time
+        self._random = random.Random(seed)
+
+    async def subscribe(self, pair):
+        return self._ticks()
+
+    async def _ticks(self):
+        price = self.start_price
+        ts = self.start_time if self.start_time is not None else time.time()
+        count = 0
+        while self.max_ticks is None or count < self.max_ticks:
+            price *= 1 + self._random.gauss(0, self.volatility)
+            yield {'time': ts, 'price': price}
+            count += 1
+            if self.realtime:
+                await asyncio.sleep(self.tick_seconds)
+                ts = time.time()
+            else:
+                ts += self.tick_seconds
+                await asyncio.sleep(0)